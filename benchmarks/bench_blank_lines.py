@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+bench_blank_lines.py — Check that long runs of blank lines convert in linear time.
+
+Some quiz generators (and tools that re-export text2qti files) pad prompts with thousands
+of blank lines. This times, for N blank lines with N doubling each round:
+- md2t2qti.strip_surrounding_blank and t2qti2md._dedent_lines on N blanks + one line;
+- a full Markdown -> text2qti conversion of an essay whose prompt starts with N blanks;
+- t2qti2md.parse_text2qti on a quiz description, Text: region, stem, and MC choice whose
+  continuation lines are separated by N blank lines.
+
+Linear code roughly doubles its time per round; trimming with list.pop(0), or scanning
+ahead to the next non-blank line from every blank line, quadruples it.
+
+Usage:
+    python benchmarks/bench_blank_lines.py [--min-blanks N] [--max-blanks N] [--repeat R] [--limit X]
+
+Exits non-zero if a case grows by more than --limit (default 3.0) per doubling of N, judged
+from the first to the last size (that is, against limit ** doublings): single-doubling
+ratios of sub-millisecond timings are too noisy to decide on their own.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import md2t2qti  # noqa: E402
+import t2qti2md  # noqa: E402
+
+
+def best_time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def cases(n: int):
+    lines = [""] * n + ["content"]
+    cont = [""] * n + ["    content"]
+    md = "# Quiz\n\n## 1. Padded {type=essay}\n" + "\n" * n + "Explain.\n"
+    gap = [""] * n
+    desc = ["Quiz title: Padded", "Quiz description: First."] + gap + ["    Second."]
+    text = ["Text title: Padded", "Text: First."] + gap + ["    Second."]
+    stem = ["1. First."] + gap + ["    Second.", "____"]
+    choice = ["1. Pick one.", "*a) First."] + gap + ["    Second.", "b) Other."]
+    return {
+        "strip_surrounding_blank": lambda: md2t2qti.strip_surrounding_blank(lines),
+        "_dedent_lines": lambda: t2qti2md._dedent_lines(cont),
+        "md2t2qti essay prompt": lambda: md2t2qti.emit_text2qti(md2t2qti.parse_quiz(md)),
+        "t2qti2md description": lambda: t2qti2md.parse_text2qti(desc),
+        "t2qti2md Text: region": lambda: t2qti2md.parse_text2qti(text),
+        "t2qti2md stem": lambda: t2qti2md.parse_text2qti(stem),
+        "t2qti2md choice": lambda: t2qti2md.parse_text2qti(choice),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Time blank-line trimming as the number of blank lines doubles.")
+    ap.add_argument("--min-blanks", type=int, default=2000)
+    ap.add_argument("--max-blanks", type=int, default=64000)
+    ap.add_argument("--repeat", type=int, default=5, help="Best-of repetitions per measurement")
+    ap.add_argument("--limit", type=float, default=3.0, help="Maximum allowed time ratio per doubling")
+    args = ap.parse_args()
+
+    sizes = []
+    n = args.min_blanks
+    while n <= args.max_blanks:
+        sizes.append(n)
+        n *= 2
+
+    names = list(cases(1))
+    times = {name: [] for name in names}
+    for n in sizes:
+        for name, fn in cases(n).items():
+            times[name].append(best_time(fn, args.repeat))
+
+    print(f"{'case':<26}" + "".join(f"{n:>11}" for n in sizes) + f"{'per 2x N':>11}")
+    failed = False
+    for name in names:
+        ts = times[name]
+        # mean growth per doubling over the whole range; one noisy step cannot fail it
+        growth = (ts[-1] / ts[0]) ** (1 / (len(ts) - 1)) if len(ts) > 1 else 1.0
+        failed |= growth > args.limit
+        print(f"{name:<26}" + "".join(f"{t * 1000:>9.2f}ms" for t in ts) + f"{growth:>10.2f}x")
+    if failed:
+        print(f"FAIL: time grew more than {args.limit}x per doubling (superlinear)", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
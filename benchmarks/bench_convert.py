@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+bench_convert.py — Throughput and peak-memory benchmark for both converters.
+
+Generates synthetic Markdown quizzes (and the matching text2qti files) with a chosen
+mix of question types, per-choice feedback, and HTML comments, then times each phase
+separately:
+- md2t2qti.parse_quiz     (Markdown -> Quiz)
+- md2t2qti.emit_text2qti  (Quiz -> text2qti)
+- t2qti2md.parse_text2qti (text2qti -> Quiz)
+- t2qti2md.emit_markdown  (Quiz -> Markdown)
+
+Times are the best of --repeat runs. Peak memory is measured in a separate run under
+tracemalloc (so tracing does not skew the timings) and counts Python allocations only.
+
+Usage:
+    python benchmarks/bench_convert.py [--sizes 10,100,1000,10000] [--mix mc=3,ma=2,num=1,...]
+                                       [--repeat R] [--seed S] [--json results.json]
+                                       [--write-corpus DIR]
+
+Example (compare before/after an upgrade):
+    python benchmarks/bench_convert.py --sizes 1000,100000 --json before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import md2t2qti  # noqa: E402
+import t2qti2md  # noqa: E402
+
+QTYPES = ("mc", "ma", "num", "fill", "essay", "file", "text")
+DEFAULT_MIX = "mc=4,ma=2,num=1,fill=1,essay=1,file=1,text=1"
+DEFAULT_SIZES = "10,100,1000,10000"
+
+
+# ---------------------------
+# Synthetic quiz generation
+# ---------------------------
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in QTYPES:
+            raise ValueError(f"Unknown question type in --mix: {name!r} (expected one of {', '.join(QTYPES)})")
+        mix[name] = float(weight) if weight else 1.0
+    if not any(mix.values()):
+        raise ValueError("--mix needs at least one type with a positive weight")
+    return mix
+
+
+def synth_markdown(n: int, mix: Dict[str, float], seed: int = 1) -> str:
+    """Markdown quiz with n items drawn from mix; deterministic for a given seed."""
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    out = ["# Synthetic quiz", "", "Generated for benchmarking.", "",
+           "> shuffle answers: true", "> show correct answers: false", ""]
+    qnum = 0
+    for k in rng.choices(kinds, weights, k=n):
+        if k == "text":
+            out += [f"## Instructions {qnum + 1} {{type=text}}", "",
+                    "Read the following carefully.", "", "* $p + q = 1$", ""]
+            continue
+        qnum += 1
+        out += [f"## {qnum}. Question {qnum} (points: {rng.choice(('1', '2', '0.5'))}) {{type={k}}}", "",
+                f"What is the value of $x_{{{qnum}}}$ in **case {qnum}**?", ""]
+        if rng.random() < 0.3:
+            out += ["A second prompt paragraph with `code` and _emphasis_.", ""]
+        if k in ("mc", "ma"):
+            nchoice = rng.randint(3, 5)
+            right = rng.randrange(nchoice)
+            for j in range(nchoice):
+                ok = j == right or (k == "ma" and rng.random() < 0.3)
+                out.append(f"- [{'x' if ok else ' '}] Choice {j} for question {qnum}")
+                if rng.random() < 0.5:
+                    out.append(f"  > Feedback for choice {j}.")
+        elif k == "num":
+            out += ["### Answer", "", f"= {qnum}.5 +- 0.01"]
+        elif k == "fill":
+            out += ["### Answers", ""] + [f"- answer {j}" for j in range(rng.randint(1, 3))]
+        if rng.random() < 0.5:
+            out += ["", "> Correct: Well done!", "> Incorrect: Review the notes."]
+        if k not in ("essay", "file") and rng.random() < 0.2:
+            # essay/file prompts run to the next header, so a trailing comment would join the prompt
+            out += ["", f"<!-- reviewer note {qnum} -->"]
+        out.append("")
+    return "\n".join(out)
+
+
+def synth_corpus(n: int, mix: Dict[str, float], seed: int = 1) -> Tuple[str, str]:
+    """(markdown, text2qti) pair describing the same quiz."""
+    md = synth_markdown(n, mix, seed)
+    return md, md2t2qti.emit_text2qti(md2t2qti.parse_quiz(md))
+
+
+# ---------------------------
+# Measurement
+# ---------------------------
+
+def best_time(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def peak_bytes(fn: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_size(n: int, mix: Dict[str, float], seed: int, repeat: int) -> Dict[str, object]:
+    md, txt = synth_corpus(n, mix, seed)
+    quiz_md = md2t2qti.parse_quiz(md)
+    txt_lines = txt.splitlines()
+    quiz_txt = t2qti2md.parse_text2qti(txt_lines)
+    md_lines = md.count("\n") + 1
+    nitems = len(quiz_md.items)
+    md_bytes, txt_bytes = len(md.encode()), len(txt.encode())
+    phases = [
+        ("parse_quiz", lambda: md2t2qti.parse_quiz(md), md_bytes),
+        ("emit_text2qti", lambda: md2t2qti.emit_text2qti(quiz_md), txt_bytes),
+        ("parse_text2qti", lambda: t2qti2md.parse_text2qti(txt.splitlines()), txt_bytes),
+        ("emit_markdown", lambda: t2qti2md.emit_markdown(quiz_txt), md_bytes),
+    ]
+    result = {"questions": n, "items": nitems, "md_bytes": md_bytes, "md_lines": md_lines,
+              "t2qti_bytes": txt_bytes, "t2qti_lines": len(txt_lines), "phases": {}}
+    for name, fn, nbytes in phases:
+        secs = best_time(fn, repeat)
+        result["phases"][name] = {
+            "seconds": secs,
+            "questions_per_s": nitems / secs if secs else None,
+            "mb_per_s": nbytes / 1e6 / secs if secs else None,
+            "peak_bytes": peak_bytes(fn),
+        }
+    return result
+
+
+def print_table(results: List[Dict[str, object]]) -> None:
+    print(f"{'questions':>9}  {'phase':<15}{'time':>11}{'q/s':>12}{'MB/s':>9}{'peak MB':>10}")
+    for r in results:
+        for name, p in r["phases"].items():
+            print(f"{r['questions']:>9}  {name:<15}{p['seconds'] * 1000:>9.2f}ms"
+                  f"{p['questions_per_s']:>12,.0f}{p['mb_per_s']:>9.2f}{p['peak_bytes'] / 1e6:>10.2f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark md2t2qti and t2qti2md on synthetic quizzes.")
+    ap.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Comma-separated question counts (default: {DEFAULT_SIZES})")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help=f"Relative weights per question type (default: {DEFAULT_MIX})")
+    ap.add_argument("--repeat", type=int, default=3, help="Best-of repetitions per phase (default: 3)")
+    ap.add_argument("--seed", type=int, default=1, help="Random seed for the generator")
+    ap.add_argument("--json", metavar="PATH", help="Write results as JSON to PATH")
+    ap.add_argument("--write-corpus", metavar="DIR", help="Also save the generated quiz-N.md/quiz-N.txt files to DIR")
+    args = ap.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+        sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    except ValueError as e:
+        ap.error(str(e))
+
+    if args.write_corpus:
+        os.makedirs(args.write_corpus, exist_ok=True)
+        for n in sizes:
+            md, txt = synth_corpus(n, mix, args.seed)
+            for ext, text in ((".md", md), (".txt", txt)):
+                with open(os.path.join(args.write_corpus, f"quiz-{n}{ext}"), "w", encoding="utf-8") as f:
+                    f.write(text)
+
+    results = []
+    for n in sizes:
+        results.append(bench_size(n, mix, args.seed, args.repeat))
+    print_table(results)
+
+    if args.json:
+        record = {
+            "md2t2qti_version": md2t2qti.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "mix": mix,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "results": results,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
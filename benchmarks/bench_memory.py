@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+bench_memory.py — Memory held by a parsed quiz bank (as loaded for analysis).
+
+Generates a synthetic bank (via bench_convert) and parses it with md2t2qti.parse_quiz
+(with and without spans=True) and t2qti2md.parse_text2qti, keeping the Quiz alive. For each parser it reports:
+- retained: memory still allocated once parsing is done (the model itself);
+- per item: retained / number of questions;
+- peak: the high-water mark while parsing;
+- objects: Python objects reachable from the Quiz (lists, model instances, strings, ...).
+
+Memory is measured with tracemalloc and counts Python allocations only. The source text
+is not counted: it is generated before tracing starts.
+
+Usage:
+    python benchmarks/bench_memory.py [--items 100000] [--mix mc=4,ma=2,...] [--json out.json]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import md2t2qti  # noqa: E402
+import t2qti2md  # noqa: E402
+from bench_convert import DEFAULT_MIX, parse_mix, synth_corpus  # noqa: E402
+
+
+def count_objects(root: object) -> int:
+    """Distinct objects reachable from `root` (each shared string or tuple counts once)."""
+    seen = set()
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif hasattr(obj, "__dict__") or hasattr(type(obj), "__slots__"):
+            stack.extend(getattr(obj, "__dict__", {}).values())
+            stack.extend(getattr(obj, k) for k in getattr(type(obj), "__slots__", ()) if hasattr(obj, k))
+    return len(seen)
+
+
+def measure(parse: Callable[[], object], n_items: int) -> Dict[str, float]:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        t0 = time.perf_counter()
+        quiz = parse()
+        elapsed = time.perf_counter() - t0
+        gc.collect()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"retained_mb": retained / 1e6, "bytes_per_item": retained / n_items,
+            "peak_mb": peak / 1e6, "objects": count_objects(quiz), "seconds": elapsed}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure the memory held by a parsed quiz bank.")
+    ap.add_argument("--items", type=int, default=100000, help="Number of questions in the bank")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="Question-type weights, as for bench_convert.py")
+    ap.add_argument("--json", metavar="PATH", help="Also write the results as JSON")
+    args = ap.parse_args()
+
+    md, txt = synth_corpus(args.items, parse_mix(args.mix))
+    txt_lines = txt.splitlines()
+    results = {
+        "md2t2qti.parse_quiz": measure(lambda: md2t2qti.parse_quiz(md), args.items),
+        "md2t2qti.parse_quiz spans": measure(lambda: md2t2qti.parse_quiz(md, spans=True), args.items),
+        "t2qti2md.parse_text2qti": measure(lambda: t2qti2md.parse_text2qti(txt_lines), args.items),
+    }
+
+    print(f"{args.items} items, {len(md) / 1e6:.1f} MB Markdown, {len(txt) / 1e6:.1f} MB text2qti")
+    print(f"{'parser':<28}{'retained':>11}{'per item':>10}{'peak':>11}{'objects':>11}{'time':>9}")
+    for name, r in results.items():
+        print(f"{name:<28}{r['retained_mb']:>9.1f}MB{r['bytes_per_item']:>9.0f}B{r['peak_mb']:>9.1f}MB"
+              f"{r['objects']:>11,}{r['seconds']:>8.2f}s")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"items": args.items, "mix": args.mix, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
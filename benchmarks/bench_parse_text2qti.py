@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+bench_parse_text2qti.py — Check that t2qti2md.parse_text2qti scales linearly to 100k+ lines.
+
+Generates text2qti files (via bench_convert's synthetic quizzes) whose item count doubles
+each round, then reports for each size:
+- the best-of-R parse time and lines/s;
+- the number of parser state-machine steps per line, which is bounded by a constant
+  (each step either consumes lines or moves on to a later section of the item).
+
+Usage:
+    python benchmarks/bench_parse_text2qti.py [--items 1250,2500,5000,10000,20000]
+                                              [--mix mc=4,ma=2,...] [--repeat R] [--limit X]
+
+Exits non-zero if parse time grows by more than --limit (default 3.0) per doubling, or if
+any size needs more than MAX_STEPS_PER_LINE steps per line.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import t2qti2md  # noqa: E402
+from bench_convert import DEFAULT_MIX, best_time, parse_mix, synth_corpus  # noqa: E402
+
+# A question takes six steps (between, head, stem, qfb, body, trailing) over at least two
+# lines, a text region three over two, and each choice two over one, so no input needs more
+# (besides the one step that finds the end of the input).
+MAX_STEPS_PER_LINE = 3.0
+
+
+def count_steps(lines) -> int:
+    parser = t2qti2md.Text2QTIParser(lines)
+    steps = 0
+
+    def counted(handler):
+        def step(i):
+            nonlocal steps
+            steps += 1
+            return handler(i)
+        return step
+
+    parser.handlers = {state: counted(h) for state, h in parser.handlers.items()}
+    parser.parse()
+    return steps
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Time parse_text2qti as the input size doubles.")
+    ap.add_argument("--items", default="1250,2500,5000,10000,20000", help="Comma-separated item counts")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="Question-type weights, as for bench_convert.py")
+    ap.add_argument("--repeat", type=int, default=3, help="Best-of repetitions per measurement")
+    ap.add_argument("--limit", type=float, default=3.0, help="Maximum allowed time ratio per doubling")
+    args = ap.parse_args()
+    mix = parse_mix(args.mix)
+
+    print(f"{'items':>8}{'lines':>10}{'parse':>11}{'lines/s':>12}{'steps/line':>12}")
+    times, per_line = [], []
+    for n in (int(x) for x in args.items.split(",")):
+        lines = synth_corpus(n, mix)[1].splitlines()
+        t = best_time(lambda: t2qti2md.parse_text2qti(lines), args.repeat)
+        spl = count_steps(lines) / len(lines)
+        times.append(t)
+        per_line.append(spl)
+        print(f"{n:>8}{len(lines):>10}{t * 1000:>9.1f}ms{len(lines) / t:>12,.0f}{spl:>12.3f}")
+
+    worst = max((b / a for a, b in zip(times, times[1:])), default=1.0)
+    print(f"max time ratio per doubling: {worst:.2f}x")
+    failed = False
+    if worst > args.limit:
+        print(f"FAIL: time grew more than {args.limit}x per doubling (superlinear)", file=sys.stderr)
+        failed = True
+    if max(per_line) > MAX_STEPS_PER_LINE:
+        print(f"FAIL: more than {MAX_STEPS_PER_LINE} parser steps per line", file=sys.stderr)
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
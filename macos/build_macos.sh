@@ -126,8 +126,8 @@ build_icon "$ROOT_DIR/macos/Text2QTItoMD/resources/icon.png" \
             "$BUILD_DIR/Text2QTItoMD.app/Contents/Resources/dropleticon.icns"
 
 # Update Plist files
-patch_plist "$BUILD_DIR/MDtoText2QTI.app" "com.tedpavlic.md2qti.MDtoText2QTI" "MDtoText2QTI" "0.1.0" "100"
-patch_plist "$BUILD_DIR/Text2QTItoMD.app" "com.tedpavlic.md2qti.Text2QTItoMD" "Text2QTItoMD" "0.1.0" "100"
+patch_plist "$BUILD_DIR/MDtoText2QTI.app" "com.tedpavlic.md2qti.MDtoText2QTI" "MDtoText2QTI" "0.2.0" "100"
+patch_plist "$BUILD_DIR/Text2QTItoMD.app" "com.tedpavlic.md2qti.Text2QTItoMD" "Text2QTItoMD" "0.2.0" "100"
 
 # Delete the stock droplet icons provided by osascript
 rm "$BUILD_DIR/MDtoText2QTI.app/Contents/Resources/droplet.icns"
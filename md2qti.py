@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+"""
+md2qti.py — Library API for converting quizzes in-process.
+
+Wraps md2t2qti.py (Markdown -> text2qti) and t2qti2md.py (text2qti -> Markdown) so
+services can convert without spawning a Python process per request:
+
+    import md2qti
+
+    txt = md2qti.markdown_to_text2qti(md_text)       # or an open text file
+    md = md2qti.text2qti_to_markdown(open("quiz.txt", encoding="utf-8"))
+
+Both functions return the same text the command-line scripts write with -o;
+markdown_to_qti_zip(src, "quiz.zip") writes a QTI ZIP directly (like --zip).
+Malformed input raises MarkdownError or Text2QTIError; both derive from
+ConversionError (itself a ValueError), and carry the source line when known.
+
+Pass `timer=PhaseTimer()` to any conversion to collect per-phase wall/CPU time,
+item counts, and sizes (as the scripts' --timings does); `timer.record()` returns
+them as a JSON-ready dict.
+
+The conversion functions honor MD2QTI_PROFILE=cpu|mem like the scripts do.
+
+In asyncio code, `await md2qti.convert_markdown(text_or_stream)` / `convert_text2qti()` and
+`async for item in md2qti.aiter_items(stream)` run the parsing in a process pool instead
+of blocking the event loop; they accept `timeout=` and can be cancelled.
+
+Run `python md2qti.py serve --socket PATH` (or `--port N`) to keep the converters loaded in
+a resident process answering JSON-RPC convert/validate requests; see serve().
+"""
+import argparse
+import asyncio
+import atexit
+import codecs
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
+import http.server
+import json
+import os
+import re
+import signal
+import socketserver
+import stat
+import sys
+import threading
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, List, Optional, TextIO, Tuple, Union
+
+import md2t2qti
+import t2qti2md
+from md2t2qti import PhaseTimer
+from md2t2qti import Quiz as MarkdownQuiz
+from t2qti2md import Quiz as Text2QTIQuiz
+
+__version__ = md2t2qti.__version__
+
+__all__ = [
+    "ConversionError", "MarkdownError", "Text2QTIError",
+    "parse_markdown", "parse_text2qti", "markdown_to_text2qti", "text2qti_to_markdown",
+    "markdown_to_qti_zip", "PhaseTimer", "ConversionService", "serve",
+    "convert_markdown", "convert_text2qti", "aiter_items", "aread", "conversion_executor",
+    "shutdown_executor",
+]
+
+Source = Union[str, TextIO]
+
+LINE_RE = re.compile(r'\bline (\d+)\b')
+
+
+class ConversionError(ValueError):
+    """A quiz could not be converted. `line` is the 1-based source line, if known."""
+
+    def __init__(self, message: str, line: Optional[int] = None):
+        super().__init__(message)
+        self.message = message
+        self.line = line
+
+    def __reduce__(self):
+        # keep `line` when raised in a worker process (see conversion_executor)
+        return type(self), (self.message, self.line)
+
+    @classmethod
+    def wrap(cls, err: ValueError) -> "ConversionError":
+        msg = str(err)
+        m = LINE_RE.search(msg)
+        return cls(msg, int(m.group(1)) if m else None)
+
+
+class MarkdownError(ConversionError):
+    """The Markdown quiz does not follow the authoring schema."""
+
+
+class Text2QTIError(ConversionError):
+    """The text2qti plaintext is malformed."""
+
+
+def _read(src: Source, timer: Optional[PhaseTimer]) -> str:
+    if isinstance(src, str):
+        return src
+    with (timer or md2t2qti.NO_TIMER).phase("read"):
+        return src.read()
+
+
+def _count_in(src: Source, timer: Optional[PhaseTimer]) -> None:
+    if timer is not None and isinstance(src, str):
+        timer.add_bytes(bytes_in=len(src.encode("utf-8")))
+
+
+def parse_markdown(src: Source, timer: Optional[PhaseTimer] = None, spans: bool = False) -> MarkdownQuiz:
+    """Parse a Markdown quiz (str or text file) into md2t2qti's Quiz model.
+    With `spans`, prompts, choice texts, and per-choice feedback are read from the source
+    text only when used (see md2t2qti.LineSpan); suited to read-only analysis."""
+    try:
+        return md2t2qti.parse_quiz(_read(src, timer), timer, spans)
+    except ValueError as e:
+        raise MarkdownError.wrap(e) from e
+
+
+def parse_text2qti(src: Source, timer: Optional[PhaseTimer] = None) -> Text2QTIQuiz:
+    """Parse text2qti plaintext (str or text file) into t2qti2md's Quiz model."""
+    try:
+        text = _read(src, timer)
+        with (timer or md2t2qti.NO_TIMER).phase("parse_text2qti"):
+            return t2qti2md.parse_text2qti(text.splitlines())
+    except ValueError as e:
+        raise Text2QTIError.wrap(e) from e
+
+
+def markdown_to_text2qti(src: Source, timer: Optional[PhaseTimer] = None) -> str:
+    """Convert a Markdown quiz to text2qti plaintext.
+    File objects are read one question at a time, like `md2t2qti.py -o`."""
+    _count_in(src, timer)
+    try:
+        with md2t2qti.profiling("md2qti"):
+            if isinstance(src, str):
+                out = md2t2qti.emit_text2qti(md2t2qti.parse_quiz(src, timer), timer)
+            else:
+                quiz, items = md2t2qti.stream_quiz(src, timer)
+                out = "".join(md2t2qti.iter_text2qti(quiz, items, timer))
+    except ValueError as e:
+        raise MarkdownError.wrap(e) from e
+    if timer is not None:
+        timer.add_bytes(bytes_out=len(out.encode("utf-8")))
+    return out
+
+
+def markdown_to_qti_zip(src: Source, dst: str, timer: Optional[PhaseTimer] = None,
+                        base_dir: Optional[str] = None) -> None:
+    """Convert a Markdown quiz straight to a Canvas QTI ZIP file at `dst` (no text2qti).
+    Local images are packaged from `base_dir`: by default the directory of an open file's
+    name, else the current directory."""
+    _count_in(src, timer)
+    name = getattr(src, "name", None)
+    path = name if isinstance(name, str) and os.path.isfile(name) else None
+    if base_dir is None and path is not None:
+        base_dir = os.path.dirname(os.path.abspath(path))
+    try:
+        with md2t2qti.profiling("md2qti"):
+            if isinstance(src, str):
+                md2t2qti.write_qti_zip(md2t2qti.parse_quiz(src, timer), dst, None, timer,
+                                       md2t2qti.content_digest(src), base_dir)
+            else:
+                quiz, items = md2t2qti.stream_quiz(src, timer)
+                md2t2qti.write_qti_zip(quiz, dst, items, timer,
+                                       md2t2qti.file_digest(path) if path is not None else None, base_dir)
+    except ValueError as e:
+        raise MarkdownError.wrap(e) from e
+    if timer is not None:
+        timer.add_bytes(bytes_out=os.path.getsize(dst))
+
+
+def text2qti_to_markdown(src: Source, timer: Optional[PhaseTimer] = None) -> str:
+    """Convert text2qti plaintext to a Markdown quiz."""
+    _count_in(src, timer)
+    try:
+        with t2qti2md.profiling("md2qti"):
+            out = t2qti2md.convert_text(_read(src, timer), timer)
+    except ValueError as e:
+        raise Text2QTIError.wrap(e) from e
+    if timer is not None:
+        timer.add_bytes(bytes_out=len(out.encode("utf-8")))
+    return out
+
+
+# ---------- asyncio API ----------
+# The coroutines below run the converters in a bounded executor so a service's event loop
+# keeps answering while large banks are parsed. Inputs may be str/bytes or an async stream:
+# anything with an async read() (asyncio.StreamReader, aiofiles) or an async iterable of
+# str/bytes chunks (request bodies).
+
+AsyncSource = Union[str, bytes, AsyncIterable[Union[str, bytes]]]
+
+_executor: Optional[concurrent.futures.Executor] = None
+_executor_lock = threading.Lock()
+
+
+def conversion_executor() -> concurrent.futures.Executor:
+    """The pool the coroutines use when not given one: one process per CPU, so any number
+    of concurrent conversions share the cores instead of oversubscribing them. Created on
+    first use; see shutdown_executor()."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+        return _executor
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    """Shut down the shared pool and its worker processes, if it was created. The next
+    conversion that needs it starts a new one. Also runs at interpreter exit."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+atexit.register(shutdown_executor)
+
+
+async def _offload(executor: Optional[concurrent.futures.Executor], timeout: Optional[float],
+                   fn: Callable, *args: object):
+    # Cancelling the awaiting task (or hitting `timeout`, which raises asyncio.TimeoutError)
+    # drops a job that has not started; one already running finishes in its worker and its
+    # result is discarded.
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(loop.run_in_executor(executor or conversion_executor(), fn, *args), timeout)
+
+
+def _decode(chunk: Union[str, bytes], decoder: "codecs.IncrementalDecoder") -> str:
+    return decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+
+
+async def _achunks(src: AsyncSource) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    if isinstance(src, (str, bytes)):
+        yield _decode(src, decoder)
+    elif hasattr(src, "read"):
+        while True:
+            chunk = await src.read(md2t2qti.READ_BLOCK)
+            if not chunk:
+                break
+            yield _decode(chunk, decoder)
+    else:
+        async for chunk in src:
+            yield _decode(chunk, decoder)
+    yield decoder.decode(b"", final=True)
+
+
+async def aread(src: AsyncSource) -> str:
+    """All text of an async source (bytes are decoded as UTF-8)."""
+    return "".join([chunk async for chunk in _achunks(src)])
+
+
+async def _alines(src: AsyncSource) -> AsyncIterator[str]:
+    # Lines without endings, split exactly like str.splitlines() (see md2t2qti.file_lines).
+    carry = ''
+    async for chunk in _achunks(src):
+        lines = (carry + chunk).splitlines(True)
+        carry = lines.pop() if lines else ''
+        for ln in "".join(lines).splitlines():
+            yield ln
+    for ln in carry.splitlines():
+        yield ln
+
+
+async def convert_markdown(src: AsyncSource, timeout: Optional[float] = None,
+                           executor: Optional[concurrent.futures.Executor] = None) -> str:
+    """Async markdown_to_text2qti: read `src`, then convert it in `executor` (default:
+    conversion_executor()). Raises MarkdownError, or asyncio.TimeoutError after `timeout` s."""
+    return await _offload(executor, timeout, markdown_to_text2qti, await aread(src))
+
+
+async def convert_text2qti(src: AsyncSource, timeout: Optional[float] = None,
+                           executor: Optional[concurrent.futures.Executor] = None) -> str:
+    """Async text2qti_to_markdown, like convert_markdown."""
+    return await _offload(executor, timeout, text2qti_to_markdown, await aread(src))
+
+
+def _parse_head(head: List[str]) -> None:
+    try:
+        md2t2qti.split_sections(md2t2qti.tokenize(head))
+    except ValueError as e:
+        raise MarkdownError.wrap(e) from e
+
+
+def _parse_section(header: str, body: List[str], line: int) -> md2t2qti.Item:
+    try:
+        return md2t2qti.parse_section(md2t2qti.H2_RE.match(header).group(1).strip(),
+                                      md2t2qti.tokenize(body), line)
+    except ValueError as e:
+        raise MarkdownError.wrap(e) from e
+
+
+async def aiter_items(src: AsyncSource, timeout: Optional[float] = None,
+                      executor: Optional[concurrent.futures.Executor] = None) -> AsyncIterator[md2t2qti.Item]:
+    """Yield validated Items from a Markdown quiz as its questions arrive (async
+    md2t2qti.iter_quiz_items). Each question is parsed in `executor` while the next one is
+    read; `timeout` applies per question. Memory stays bounded by the largest question."""
+    lines = _alines(src)
+    head: List[str] = []
+    header: Optional[str] = None
+    async for ln in lines:  # the title and description, as in md2t2qti.iter_raw_sections
+        if md2t2qti.is_h2(ln) and any(h.strip() for h in head):
+            header = ln
+            break
+        head.append(ln)
+    await _offload(executor, timeout, _parse_head, head)
+    if header is None:
+        return
+    line = len(head) + 1  # of `header`
+    body: List[str] = []
+    pending: Optional[asyncio.Future] = None
+    try:
+        async for ln in lines:
+            if not md2t2qti.is_h2(ln):
+                body.append(ln)
+                continue
+            if pending is not None:
+                yield await pending
+            pending = asyncio.ensure_future(_offload(executor, timeout, _parse_section, header, body, line))
+            header, body, line = ln, [], line + 1 + len(body)
+        if pending is not None:
+            yield await pending
+        pending = None
+        yield await _offload(executor, timeout, _parse_section, header, body, line)
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+# ---------- Conversion server ----------
+# `python md2qti.py serve` keeps both converters loaded and answers JSON-RPC 2.0 requests:
+#   {"jsonrpc": "2.0", "id": 1, "method": "convert", "params": {"from": "markdown", "text": "..."}}
+# Methods: convert and validate (params: "from" = "markdown" | "text2qti", "text"), and stats.
+
+FROM_FORMATS = {"markdown": markdown_to_text2qti, "text2qti": text2qti_to_markdown}
+
+RPC_PARSE_ERROR = -32700
+RPC_INVALID_REQUEST = -32600
+RPC_METHOD_NOT_FOUND = -32601
+RPC_INVALID_PARAMS = -32602
+RPC_INTERNAL_ERROR = -32603
+
+DEFAULT_MAX_REQUEST_MB = 16
+CACHE_ENTRY_OVERHEAD = 400  # bytes held per cache entry besides its text: key, digest, dicts
+
+
+class RPCError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class ConversionService:
+    """The methods behind `serve`, with an in-memory LRU of recent results keyed by the
+    source format and a SHA-256 of the text. Entries are evicted least-recently-used first
+    once the results they hold exceed `max_bytes`; messages larger than `max_request_bytes`
+    are refused by the transports. Safe to share between threads."""
+
+    def __init__(self, max_bytes: int = md2t2qti.DEFAULT_CACHE_MB * 1024 * 1024,
+                 max_request_bytes: int = DEFAULT_MAX_REQUEST_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_request_bytes = max_request_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries: "collections.OrderedDict[Tuple[str, str], Dict[str, object]]" = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def outcome(self, source_format: str, text: str) -> Dict[str, object]:
+        """{"ok", "output", "diagnostics"} for converting `text`, from the cache when possible."""
+        convert = FROM_FORMATS.get(source_format)
+        if convert is None:
+            raise RPCError(RPC_INVALID_PARAMS, f"'from' must be one of: {', '.join(FROM_FORMATS)}")
+        key = (source_format, hashlib.sha256(text.encode("utf-8")).hexdigest())
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        try:
+            output = convert(text)
+            entry = {"ok": True, "output": output, "diagnostics": []}
+        except ConversionError as e:
+            entry = {"ok": False, "output": None, "diagnostics": [{"line": e.line, "message": e.message}]}
+        # the source is not kept: charge what the entry holds
+        size = (CACHE_ENTRY_OVERHEAD + sys.getsizeof(entry["output"])
+                + sum(sys.getsizeof(d["message"]) for d in entry["diagnostics"]))
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = entry
+                entry["size"] = size
+                self.size += size
+                while self.size > self.max_bytes and self.entries:
+                    _, old = self.entries.popitem(last=False)
+                    self.size -= old["size"]
+        return entry
+
+    def convert(self, params: Dict[str, object]) -> Dict[str, object]:
+        entry = self.outcome(*self._source(params))
+        return {"ok": entry["ok"], "output": entry["output"], "diagnostics": entry["diagnostics"]}
+
+    def validate(self, params: Dict[str, object]) -> Dict[str, object]:
+        entry = self.outcome(*self._source(params))
+        return {"ok": entry["ok"], "diagnostics": entry["diagnostics"]}
+
+    def stats(self, params: Dict[str, object]) -> Dict[str, object]:
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "version": __version__}
+
+    @staticmethod
+    def _source(params: Dict[str, object]) -> Tuple[str, str]:
+        if not isinstance(params, dict) or not isinstance(params.get("text"), str):
+            raise RPCError(RPC_INVALID_PARAMS, "params must be an object with a string 'text'")
+        return params.get("from", "markdown"), params["text"]
+
+    def call(self, request: object) -> Optional[Dict[str, object]]:
+        """Answer one JSON-RPC request object; None for a notification (no "id"), which
+        is never answered, not even with an error. A malformed request is answered."""
+        valid = (isinstance(request, dict) and request.get("jsonrpc") == "2.0"
+                 and isinstance(request.get("method"), str))
+        notification = valid and "id" not in request
+        req_id = request.get("id") if isinstance(request, dict) else None
+        try:
+            if not valid:
+                raise RPCError(RPC_INVALID_REQUEST, "expected a JSON-RPC 2.0 request object")
+            method = request["method"]
+            if method not in ("convert", "validate", "stats"):
+                raise RPCError(RPC_METHOD_NOT_FOUND, f"unknown method {method!r}")
+            result = getattr(self, method)(request.get("params", {}))
+        except RPCError as e:
+            error = {"code": e.code, "message": e.message}
+        except Exception as e:  # a converter bug must not take the server down
+            error = {"code": RPC_INTERNAL_ERROR, "message": f"{type(e).__name__}: {e}"}
+        else:
+            return None if notification else {"jsonrpc": "2.0", "id": req_id, "result": result}
+        return None if notification else {"jsonrpc": "2.0", "id": req_id, "error": error}
+
+    def handle(self, payload: bytes) -> Optional[bytes]:
+        """Answer a JSON-RPC message (a request or a batch array) as JSON bytes, or None
+        when it held only notifications."""
+        try:
+            message = json.loads(payload)
+        except ValueError as e:
+            reply: object = {"jsonrpc": "2.0", "id": None, "error": {"code": RPC_PARSE_ERROR, "message": str(e)}}
+        else:
+            if isinstance(message, list) and message:
+                reply = [r for r in map(self.call, message) if r is not None] or None
+            else:
+                reply = self.call(message)
+        return None if reply is None else json.dumps(reply).encode("utf-8")
+
+    def too_large(self) -> bytes:
+        """The error reply for a message over max_request_bytes."""
+        return json.dumps({"jsonrpc": "2.0", "id": None, "error": {
+            "code": RPC_INVALID_REQUEST,
+            "message": f"request larger than {self.max_request_bytes} bytes"}}).encode("utf-8")
+
+
+class _UnixHandler(socketserver.StreamRequestHandler):
+    # One JSON-RPC message per line; the connection stays open for any number of requests.
+    # A line over the size limit is answered with an error and the connection is closed.
+    def handle(self) -> None:
+        service = self.server.service
+        limit = service.max_request_bytes
+        while True:
+            line = self.rfile.readline(limit + 1)
+            if not line:
+                return
+            if len(line) > limit and not line.endswith(b"\n"):
+                self.wfile.write(service.too_large() + b"\n")
+                return
+            if not line.strip():
+                continue
+            reply = service.handle(line)
+            if reply is not None:
+                self.wfile.write(reply + b"\n")
+                self.wfile.flush()
+
+
+class _HTTPHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def do_POST(self) -> None:
+        service = self.server.service
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if not 0 <= length <= service.max_request_bytes:
+            reply = service.too_large() if length > 0 else b""
+            self.close_connection = True  # the body is left unread
+            self.send_response(413 if length > 0 else 400)
+        else:
+            reply = service.handle(self.rfile.read(length)) or b""
+            self.send_response(200 if reply else 204)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass  # one line per request is noise for editor plugins
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path: Optional[str] = None, port: Optional[int] = None,
+          service: Optional[ConversionService] = None) -> None:
+    """Answer JSON-RPC requests on a Unix socket (one message per line) or on an HTTP port
+    bound to 127.0.0.1 (one message per POST), until interrupted."""
+    service = service or ConversionService()
+    if socket_path:
+        if os.path.exists(socket_path):
+            if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+                raise OSError(f"{socket_path} exists and is not a socket")
+            os.unlink(socket_path)  # left behind by a previous server
+        server: socketserver.BaseServer = _UnixServer(socket_path, _UnixHandler)
+        where = socket_path
+    else:
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", port or 0), _HTTPHandler)
+        where = "http://127.0.0.1:%d/" % server.server_address[1]
+    server.service = service
+    print(f"md2qti: serving on {where}; press Ctrl-C to stop.", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path:
+            with contextlib.suppress(OSError):
+                os.unlink(socket_path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Quiz conversion service for editors and build tools.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    sp = sub.add_parser("serve", help="Answer JSON-RPC convert/validate requests from a resident process")
+    where = sp.add_mutually_exclusive_group(required=True)
+    where.add_argument("--socket", metavar="PATH", help="Listen on this Unix socket (one JSON message per line)")
+    where.add_argument("--port", type=int, help="Listen for HTTP POSTs on 127.0.0.1:PORT")
+    sp.add_argument("--cache-size", type=float, default=md2t2qti.DEFAULT_CACHE_MB,
+                    help="Maximum cached results in MB (default: %(default)s)")
+    sp.add_argument("--max-request-size", type=float, default=DEFAULT_MAX_REQUEST_MB,
+                    help="Refuse JSON-RPC messages larger than this many MB (default: %(default)s)")
+    args = ap.parse_args()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # still remove the socket
+    serve(args.socket, args.port, ConversionService(int(args.cache_size * 1024 * 1024),
+                                                    int(args.max_request_size * 1024 * 1024)))
+
+
+if __name__ == "__main__":
+    main()
@@ -22,53 +22,124 @@ Authoring schema (summary):
 
 Usage:
     python md2t2qti.py input.md [-o output.txt]
+    python md2t2qti.py quizzes/ 'more/**/*.md' [--outdir DIR] [-j N] [--summary summary.json]
+    python md2t2qti.py input.md -o output.txt --watch [--text2qti]
+    python md2t2qti.py input.md --zip [-o quiz.zip]
+    python md2t2qti.py quizzes/ --qti [--outdir DIR]
+    python md2t2qti.py input.md -o output.txt --timings [timings.json]
 
 Writes text2qti plaintext to stdout unless -o is specified.
+Batch mode (several inputs, directories, or globs) converts every .md file in a
+process pool, writing each .txt next to its input or under --outdir. Unchanged
+inputs are skipped using a content-hash cache manifest (see --cache, --no-cache).
+--watch keeps running and reconverts inputs as they are saved; --text2qti also
+runs text2qti on every output. --zip writes Canvas QTI 1.2 ZIPs directly instead
+of text2qti plaintext (install the `markdown` package for full Markdown rendering);
+--qti builds them with the text2qti package in-process instead. --timings reports
+per-phase wall/CPU time, item counts, and sizes as JSON (aggregated in batch mode).
+Set MD2QTI_PROFILE=cpu or MD2QTI_PROFILE=mem to write a cProfile .prof file or a
+tracemalloc snapshot of each conversion (to MD2QTI_PROFILE_DIR, default: the
+current directory), with a short summary on stderr.
 """
 
 import argparse
+import array
+import collections.abc
+import concurrent.futures
+import contextlib
+import cProfile
+import functools
+import glob
+import hashlib
+import html
+import io
+import json
+import linecache
+import os
+import pstats
 import re
-from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Tuple
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.parse
+import zipfile
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Dict, Sequence, TextIO, Tuple, Union
 
-# ------------------------------ Data models ------------------------------
-
-@dataclass
-class FeedbackBlock:
-    kind: str  # 'general', 'correct', 'incorrect', 'information'
-    lines: List[str]
-
-@dataclass
-class Choice:
-    text_lines: List[str]         # markdown lines for the choice text
-    correct: bool
-    feedback_lines: List[str] = field(default_factory=list)  # per-choice
-
-@dataclass
-class Item:
-    kind: str  # mc, ma, num, fill, essay, file, text
-    title: str
-    points: Optional[float]
-    attrs: Dict[str, str]
-    prompt_lines: List[str]
-
-    # mc/ma
-    choices: List[Choice] = field(default_factory=list)
-
-    # num
-    numeric_spec: Optional[str] = None
-
-    # fill
-    fill_answers: List[str] = field(default_factory=list)
+__version__ = "0.2.0"
 
-    # question-level feedback (mc, ma, num, fill)
-    q_feedback: List[FeedbackBlock] = field(default_factory=list)
+# Blocks between "# shared:begin NAME" and "# shared:end NAME" also appear in t2qti2md.py,
+# as each script ships on its own; tools/check_shared.py fails if the two copies differ.
 
-    # original Markdown header number (e.g., "12."), if present
-    qnum: Optional[int] = None
+# ------------------------------ Data models ------------------------------
 
-    # comments that appear after the question content in Markdown (emit top-level after question)
-    trailing_comments: List[str] = field(default_factory=list)
+# The per-question classes keep their fields in __slots__ (no per-instance __dict__), and
+# list fields left empty all share the EMPTY tuple instead of each holding a new list:
+# assign a list to such a field before appending to it. Short strings repeated across a
+# bank (types, attribute names and values, choice texts, fill answers) are interned.
+
+# shared:begin records
+EMPTY: tuple = ()
+INTERN_MAX = 16
+
+def intern_short(text: str) -> str:
+    """`text`, interned if at most INTERN_MAX characters long."""
+    return sys.intern(text) if len(text) <= INTERN_MAX else text
+
+class Record:
+    """Base for the slotted model classes: dataclass-style repr and equality."""
+    __slots__ = ()
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{k}={getattr(self, k)!r}" for k in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+# shared:end records
+
+class FeedbackBlock(Record):
+    __slots__ = ("kind", "lines")
+
+    def __init__(self, kind: str, lines: List[str]):
+        self.kind = kind  # 'general', 'correct', 'incorrect', 'information'
+        self.lines = lines
+
+class Choice(Record):
+    __slots__ = ("text_lines", "correct", "feedback_lines")
+
+    def __init__(self, text_lines: List[str], correct: bool, feedback_lines: Sequence[str] = EMPTY):
+        self.text_lines = text_lines               # markdown lines for the choice text
+        self.correct = correct
+        self.feedback_lines = feedback_lines or EMPTY  # per-choice
+
+class Item(Record):
+    __slots__ = ("kind", "title", "points", "attrs", "prompt_lines", "choices", "numeric_spec",
+                 "fill_answers", "q_feedback", "qnum", "trailing_comments")
+
+    def __init__(self, kind: str, title: str, points: Optional[float], attrs: Dict[str, str],
+                 prompt_lines: Sequence[str], choices: Sequence[Choice] = EMPTY,
+                 numeric_spec: Optional[str] = None, fill_answers: Sequence[str] = EMPTY,
+                 q_feedback: Sequence[FeedbackBlock] = EMPTY, qnum: Optional[int] = None,
+                 trailing_comments: Sequence[str] = EMPTY):
+        self.kind = kind  # mc, ma, num, fill, essay, file, text
+        self.title = title
+        self.points = points
+        self.attrs = attrs
+        self.prompt_lines = prompt_lines
+        self.choices = choices or EMPTY                # mc/ma
+        self.numeric_spec = numeric_spec               # num
+        self.fill_answers = fill_answers or EMPTY      # fill
+        self.q_feedback = q_feedback or EMPTY          # question-level feedback (mc, ma, num, fill)
+        # original Markdown header number (e.g., "12."), if present
+        self.qnum = qnum
+        # comments that appear after the question content in Markdown (emit top-level after question)
+        self.trailing_comments = trailing_comments or EMPTY
 
 @dataclass
 class Quiz:
@@ -82,59 +153,51 @@ class Quiz:
     show_correct_answers: Optional[bool] = None
     one_question_at_a_time: Optional[bool] = None
     cant_go_back: Optional[bool] = None
-# ------------------------------ Helpers ------------------------------
 
-OPT_LINE_RE = re.compile(r'^(?:\s*>\s*)?\s*(feedback is solution|solutions sample groups|solutions randomize groups|shuffle answers|show correct answers|one question at a time|can\'?t go back)\s*:\s*(true|false)\s*$', re.IGNORECASE)
-OPT_HTML_RE = re.compile(r'^\s*<!\-\-#\s*(feedback is solution|solutions sample groups|solutions randomize groups|shuffle answers|show correct answers|one question at a time|can\'?t go back)\s*:\s*(true|false)\s*\-\->\s*$', re.IGNORECASE)
-def parse_options_from_desc(desc_lines: List[str]):
-    fis = ssg = srg = shuffle = show = one = cant = None
+# ------------------------------ Quiz options ------------------------------
+
+# Quiz-level options: text2qti label -> Quiz field, in emission order.
+# shared:begin quiz-options
+QUIZ_OPTIONS = (
+    ("feedback is solution", "feedback_is_solution"),
+    ("solutions sample groups", "solutions_sample_groups"),
+    ("solutions randomize groups", "solutions_randomize_groups"),
+    ("shuffle answers", "shuffle_answers"),
+    ("show correct answers", "show_correct_answers"),
+    ("one question at a time", "one_question_at_a_time"),
+    ("can't go back", "cant_go_back"),
+)
+OPTION_FIELDS = {label.replace("'", ""): fld for label, fld in QUIZ_OPTIONS}  # keys without apostrophes
+# shared:end quiz-options
+OPT_KEYS = "|".join(label.replace("'", "'?") for label, _ in QUIZ_OPTIONS)
+# "<!--# key: val -->", or "key: val" optionally blockquoted ("> key: val")
+OPT_RE = re.compile(r'^\s*(?:<!--#\s*(?P<hkey>' + OPT_KEYS + r')\s*:\s*(?P<hval>true|false)\s*-->'
+                    r'|(?:>\s*)?(?P<key>' + OPT_KEYS + r')\s*:\s*(?P<val>true|false))\s*$', re.IGNORECASE)
+
+def option_field(key: str) -> str:
+    """Quiz field for an option label as written (any case, with or without the apostrophe)."""
+    return OPTION_FIELDS[key.lower().replace("'", "")]
+
+def parse_options_from_desc(desc_lines: List[str]) -> Tuple[Dict[str, bool], List[str]]:
+    """Split description lines into ({Quiz field: value} for option lines, remaining lines)."""
+    options: Dict[str, bool] = {}
     keep: List[str] = []
     for ln in desc_lines:
-        m1 = OPT_HTML_RE.match(ln)
-        if m1:
-            key, val = m1.group(1).lower(), m1.group(2).lower()
-            v = (val == 'true')
-            if key == 'feedback is solution':
-                fis = v
-            elif key == 'solutions sample groups':
-                ssg = v
-            elif key == 'solutions randomize groups':
-                srg = v
-            elif key == 'shuffle answers':
-                shuffle = v
-            elif key == 'show correct answers':
-                show = v
-            elif key == 'one question at a time':
-                one = v
-            elif key.startswith('can'):
-                cant = v
-            continue
-        m2 = OPT_LINE_RE.match(ln)
-        if m2:
-            key, val = m2.group(1).lower(), m2.group(2).lower()
-            v = (val == 'true')
-            if key == 'feedback is solution':
-                fis = v
-            elif key == 'solutions sample groups':
-                ssg = v
-            elif key == 'solutions randomize groups':
-                srg = v
-            elif key == 'shuffle answers':
-                shuffle = v
-            elif key == 'show correct answers':
-                show = v
-            elif key == 'one question at a time':
-                one = v
-            elif key.startswith('can'):
-                cant = v
+        m = OPT_RE.match(ln)
+        if m:
+            key = m.group('hkey') or m.group('key')
+            val = m.group('hval') or m.group('val')
+            options[option_field(key)] = (val.lower() == 'true')
             continue
         keep.append(ln)
-    return (fis, ssg, srg, shuffle, show, one, cant, keep)
+    return options, keep
 
 # ------------------------------ Helpers ------------------------------
 
 H1_RE = re.compile(r'^\s*#\s+(.*)\s*$')
 H2_RE = re.compile(r'^\s*##\s+(.*)\s*$')
+HDR_NUM_RE = re.compile(r'^\s*(\d+)\.\s+(.*)$')
+TITLE_NUM_RE = re.compile(r'^\s*\d+\.\s+')
 POINTS_PAREN_RE = re.compile(r'\(points:\s*([0-9]+(?:\.5)?)\)', re.IGNORECASE)
 ATTRS_RE = re.compile(r'\{([^}]*)\}\s*$')
 ATTR_PAIR_RE = re.compile(r'\s*([a-zA-Z_]+)\s*=\s*([^,]+)\s*')
@@ -145,6 +208,10 @@ NUM_SPEC_RE = re.compile(r'^\s*=\s*(.+?)\s*$')
 BULLET_RE = re.compile(r'^\s*-\s+(.*)$')
 PREFIX_RE = re.compile(r'^\s*(Correct|Incorrect|General|Information|Important)\s*:\s*(.*)$', re.IGNORECASE)
 
+NUM_INTERVAL_RE = re.compile(r'^\[.*?,.*?\]$')
+NUM_TOLERANCE_RE = re.compile(r'\+\-\s*[\d.]+(%?)$')
+NUM_PLAIN_RE = re.compile(r'^-?\d+(\.\d+)?$')
+
 HTML_SINGLE_RE = re.compile(r'^\s*<!--\s*(.*?)\s*-->\s*$')
 HTML_OPEN_RE   = re.compile(r'^\s*<!--\s*$')
 HTML_CLOSE_RE  = re.compile(r'^\s*-->\s*$')
@@ -210,20 +277,31 @@ def add_feedback_line(q_feedback: List[FeedbackBlock], raw_text: str) -> None:
         else:
             q_feedback.append(FeedbackBlock(kind='general', lines=[text if text != '' else '']))
 
+# Blank trimming scans indices and takes one slice, so k blank lines cost O(k), not O(k^2).
+def nonblank_bounds(lines: List[str]) -> Tuple[int, int]:
+    """(start, end) such that lines[start:end] drops the leading and trailing blank lines."""
+    start, end = 0, len(lines)
+    while start < end and lines[start].strip() == '':
+        start += 1
+    while end > start and lines[end-1].strip() == '':
+        end -= 1
+    return start, end
+
 def strip_trailing_blank(lines: List[str]) -> List[str]:
-    out = list(lines)
-    while out and out[-1].strip() == '':
-        out.pop()
-    return out
+    end = len(lines)
+    while end and lines[end-1].strip() == '':
+        end -= 1
+    return lines[:end]
 
 def strip_leading_blank(lines: List[str]) -> List[str]:
-    out = list(lines)
-    while out and out and out[0].strip() == '':
-        out.pop(0)
-    return out
+    start, n = 0, len(lines)
+    while start < n and lines[start].strip() == '':
+        start += 1
+    return lines[start:]
 
 def strip_surrounding_blank(lines: List[str]) -> List[str]:
-    return strip_trailing_blank(strip_leading_blank(lines))
+    start, end = nonblank_bounds(lines)
+    return lines[start:end]
 
 def parse_attrs(title_text: str) -> Tuple[str, Optional[float], Dict[str, str]]:
     """Extract points and {attrs} from the H2 text, return clean title, points, attrs."""
@@ -256,7 +334,7 @@ def parse_attrs(title_text: str) -> Tuple[str, Optional[float], Dict[str, str]]:
             # strip optional quotes around value
             if (len(v) >= 2) and ((v[0] == v[-1]) and v[0] in ("'", '"')):
                 v = v[1:-1]
-            attrs[k] = v
+            attrs[sys.intern(k)] = intern_short(v)
 
         # {points=N} overrides parenthetical
         if 'points' in attrs:
@@ -267,61 +345,550 @@ def parse_attrs(title_text: str) -> Tuple[str, Optional[float], Dict[str, str]]:
 
     return title_text.strip(), points, attrs
 
-def split_sections(lines: List[str]) -> Tuple[str, List[str], List[Tuple[str, List[str]]]]:
-    """Return (quiz_title, description_lines, list of (h2_header_text, body_lines))."""
+# ------------------------------ Timings ------------------------------
+
+# shared:begin timings
+class PhaseTimer:
+    """Wall-clock and CPU seconds per conversion phase, item counts, and sizes (--timings).
+
+    Use `with timer.phase(name):` around each phase. Phases may nest; time spent in an
+    inner phase is charged to it alone, so the phase totals never double count."""
+
+    def __init__(self):
+        self.started = (time.perf_counter(), time.process_time())
+        self.phases: Dict[str, List[float]] = {}  # name -> [wall, cpu]
+        self.items: Dict[str, int] = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._stack: List[list] = []  # [name, wall mark, cpu mark] of open phases
+        self._next = ''
+
+    def phase(self, name: str) -> "PhaseTimer":
+        self._next = name
+        return self
+
+    def __enter__(self) -> None:
+        wall, cpu = time.perf_counter(), time.process_time()
+        if self._stack:
+            self._charge(self._stack[-1], wall, cpu)
+        self._stack.append([self._next, wall, cpu])
+
+    def __exit__(self, *exc) -> None:
+        wall, cpu = time.perf_counter(), time.process_time()
+        self._charge(self._stack.pop(), wall, cpu)
+        if self._stack:
+            self._stack[-1][1:] = (wall, cpu)
+
+    def _charge(self, frame: list, wall: float, cpu: float) -> None:
+        acc = self.phases.setdefault(frame[0], [0.0, 0.0])
+        acc[0] += wall - frame[1]
+        acc[1] += cpu - frame[2]
+        frame[1:] = (wall, cpu)
+
+    def count(self, kind: str) -> None:
+        self.items[kind] = self.items.get(kind, 0) + 1
+
+    def add_bytes(self, bytes_in: int = 0, bytes_out: int = 0) -> None:
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+
+    def record(self) -> Dict[str, object]:
+        """JSON-ready summary: totals and per-phase seconds since the timer was created."""
+        return {
+            "wall_s": round(time.perf_counter() - self.started[0], 6),
+            "cpu_s": round(time.process_time() - self.started[1], 6),
+            "phases": {name: {"wall_s": round(w, 6), "cpu_s": round(c, 6)} for name, (w, c) in self.phases.items()},
+            "items": dict(self.items),
+            "questions": sum(n for kind, n in self.items.items() if kind != 'text'),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+class NullTimer:
+    """PhaseTimer stand-in used when timings are off; every call is a no-op."""
+
+    def phase(self, name: str) -> "NullTimer":
+        return self
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+    def count(self, kind: str) -> None:
+        pass
+
+    def add_bytes(self, bytes_in: int = 0, bytes_out: int = 0) -> None:
+        pass
+
+NO_TIMER = NullTimer()
+
+def aggregate_timings(records: List[Dict[str, object]], top: int = 10) -> Dict[str, object]:
+    """Combine per-file batch records (those carrying "timings") into phase and item totals,
+    plus the `top` slowest files with their slowest phase. Files resolved from a cache
+    (timed for reading and hashing them) and failed files (timed up to the failure) are
+    included, and counted under "cached" and "failed"."""
+    files = [dict(input=r["input"], ok=r["ok"], cached=bool(r.get("cached")), **r["timings"])
+             for r in records if r.get("timings")]
+    phases: Dict[str, Dict[str, float]] = {}
+    items: Dict[str, int] = {}
+    for f in files:
+        for name, p in f["phases"].items():
+            acc = phases.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0})
+            acc["wall_s"] = round(acc["wall_s"] + p["wall_s"], 6)
+            acc["cpu_s"] = round(acc["cpu_s"] + p["cpu_s"], 6)
+        for kind, n in f["items"].items():
+            items[kind] = items.get(kind, 0) + n
+    slowest = sorted(files, key=lambda f: f["wall_s"], reverse=True)[:top]
+    return {
+        "files": len(files),
+        "cached": sum(1 for f in files if f["cached"]),
+        "failed": sum(1 for f in files if not f["ok"]),
+        "wall_s": round(sum(f["wall_s"] for f in files), 6),
+        "cpu_s": round(sum(f["cpu_s"] for f in files), 6),
+        "phases": phases,
+        "items": items,
+        "questions": sum(f["questions"] for f in files),
+        "bytes_in": sum(f["bytes_in"] for f in files),
+        "bytes_out": sum(f["bytes_out"] for f in files),
+        "slowest": [{"input": f["input"], "wall_s": f["wall_s"],
+                     "slowest_phase": max(f["phases"], key=lambda n: f["phases"][n]["wall_s"], default=None)}
+                    for f in slowest],
+        "per_file": files,
+    }
+
+def write_timings(record: Dict[str, object], dest: str) -> None:
+    """Write a timings record as one JSON line on stderr (dest "-") or as a JSON file."""
+    if dest == "-":
+        print(json.dumps(record), file=sys.stderr)
+        return
+    with open(dest, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+        f.write("\n")
+# shared:end timings
+
+# ------------------------------ Profiling ------------------------------
+
+# Allocation groups in the MD2QTI_PROFILE=mem summary (see profile_checkpoint): what was
+# allocated under these functions. A streamed conversion parses in stream_quiz's generator
+# and emits through iter_text2qti (or write_qti_assessment for --zip), not emit_text2qti.
+PROFILE_FOCUS = {
+    "parse": ("parse_question", "parse_quiz", "stream_quiz"),
+    "emit": ("emit_text2qti", "iter_text2qti", "emit_item", "write_qti_assessment", "qti_item_xml"),
+}
+
+# shared:begin profiling
+PROFILE_ENV = "MD2QTI_PROFILE"          # "cpu" (cProfile .prof) or "mem" (tracemalloc snapshot)
+PROFILE_DIR_ENV = "MD2QTI_PROFILE_DIR"  # where profiles are written (default: current directory)
+PROFILE_FRAMES = 25                     # traceback depth kept by tracemalloc
+PROFILE_TOP = 10                        # functions (cpu) or sites per group (mem) listed on stderr
+PROFILE_GROWTH = 1.1                    # profile_checkpoint() re-snapshots on this much growth
+_profile_lock = threading.Lock()        # cProfile and tracemalloc are process-wide: one profile at a time
+_profile_snapshots: Optional[Dict[str, list]] = None  # group -> [traced bytes, Snapshot] during "mem"
+
+def profile_checkpoint(group: str) -> None:
+    """While a "mem" profile runs, keep a snapshot for PROFILE_FOCUS `group` if traced memory
+    grew by PROFILE_GROWTH since that group's last one. The parser calls this after each
+    question ("parse") and the emitters after each item ("emit"), while that item and its
+    output are alive: a streamed conversion has released nearly everything by its end."""
+    snaps = _profile_snapshots
+    if snaps is not None:
+        current = tracemalloc.get_traced_memory()[0]
+        last = snaps.get(group)
+        if last is None or current > last[0] * PROFILE_GROWTH:
+            snaps[group] = [current, tracemalloc.take_snapshot()]
+
+def profile_sites(snap: "tracemalloc.Snapshot") -> Dict[str, Dict[Tuple[str, int], List[int]]]:
+    """PROFILE_FOCUS group -> {(focus function, line of this file): [bytes, blocks]} for the
+    allocations in `snap`. Each allocation goes to the innermost focus function on its
+    traceback, at the newest line of this file; allocations under none of them go to the
+    group "elsewhere" (function ""). The checkpoints' own snapshots are left out."""
+    code = profile_checkpoint.__code__
+    here = code.co_filename  # as tracemalloc records it (the path may not be normalized)
+    own = range(code.co_firstlineno, max(ln for _, _, ln in code.co_lines() if ln) + 1)
+    ranges = []
+    for group, names in PROFILE_FOCUS.items():
+        for name in names:
+            code = globals()[name].__code__
+            ranges.append((group, name, code.co_firstlineno, max(ln for _, _, ln in code.co_lines() if ln)))
+    sites: Dict[str, Dict[Tuple[str, int], List[int]]] = {}
+    for stat in snap.statistics("traceback"):
+        lines = [f.lineno for f in stat.traceback if f.filename == here]  # oldest first
+        if not lines or lines[-1] in own:
+            continue
+        group, name = next(((g, fn) for ln in reversed(lines) for g, fn, lo, hi in ranges if lo <= ln <= hi),
+                           ("elsewhere", ""))
+        site = sites.setdefault(group, {}).setdefault((name, lines[-1]), [0, 0])
+        site[0] += stat.size
+        site[1] += stat.count
+    return sites
+
+def print_mem_summary(group: str, size: int, snap: "tracemalloc.Snapshot") -> None:
+    """The largest allocation sites of `group` in `snap` (taken at `size` traced bytes)."""
+    here = profile_checkpoint.__code__.co_filename
+    by_site = profile_sites(snap).get(group, {})
+    names = ", ".join(PROFILE_FOCUS.get(group, ()))
+    print(f"  {group}{f' ({names})' if names else ''}: {sum(s[0] for s in by_site.values()) / 1e6:.2f} MB "
+          f"live, snapshot at {size / 1e6:.1f} MB", file=sys.stderr)
+    if not by_site:
+        print("    (nothing live in the snapshot)", file=sys.stderr)
+    for (name, ln), (nbytes, count) in sorted(by_site.items(), key=lambda kv: kv[1][0], reverse=True)[:PROFILE_TOP]:
+        under = f" (under {name})" if name else ""
+        print(f"    {nbytes / 1e6:8.3f} MB {count:>9,} blocks  {os.path.basename(here)}:{ln}{under}  "
+              f"{linecache.getline(here, ln).strip()}", file=sys.stderr)
+
+@contextlib.contextmanager
+def profiling(label: str) -> Iterator[None]:
+    """Profile the enclosed conversion when MD2QTI_PROFILE is set, without touching the code
+    path otherwise. "cpu" writes a cProfile .prof file and lists this script's busiest
+    functions on stderr. "mem" writes the largest tracemalloc snapshot (.tracemalloc) of
+    this script's allocations, from a profile_checkpoint() or the end, and lists the peak
+    and each PROFILE_FOCUS group's largest sites, as of that group's largest checkpoint.
+    A call made while another profile is running (nested, or in another thread) is not
+    profiled."""
+    global _profile_snapshots
+    mode = os.environ.get(PROFILE_ENV, "").strip().lower()
+    if not mode:
+        yield
+        return
+    if mode not in ("cpu", "mem"):
+        print(f"profile: ignoring {PROFILE_ENV}={mode!r} (expected 'cpu' or 'mem')", file=sys.stderr)
+        yield
+        return
+    if not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    try:
+        here = profile_checkpoint.__code__.co_filename  # as cProfile and tracemalloc record it
+        script = os.path.splitext(os.path.basename(here))[0]
+        stem = os.path.splitext(os.path.basename(label))[0] or "quiz"
+        base = os.path.join(os.environ.get(PROFILE_DIR_ENV) or os.curdir,
+                            f"{script}-{stem}-{os.getpid()}-{time.time_ns() // 1000000}")
+        if mode == "cpu":
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except ValueError:  # another profiler is active
+                yield
+                return
+            try:
+                yield
+            finally:
+                prof.disable()
+                prof.dump_stats(base + ".prof")
+                print(f"profile: wrote {base}.prof (cpu)", file=sys.stderr)
+                pstats.Stats(prof, stream=sys.stderr).sort_stats("tottime").print_stats(
+                    re.escape(os.path.basename(here)), PROFILE_TOP)
+        elif tracemalloc.is_tracing():  # someone else's trace; stopping it would break theirs
+            yield
+        else:
+            tracemalloc.start(PROFILE_FRAMES)
+            _profile_snapshots = {}
+            try:
+                yield
+            finally:
+                snaps, _profile_snapshots = _profile_snapshots, None
+                current, peak = tracemalloc.get_traced_memory()
+                end = [current, tracemalloc.take_snapshot()]
+                tracemalloc.stop()
+                ours = [tracemalloc.Filter(True, here, all_frames=True)]
+                snaps = {group: [size, snap.filter_traces(ours)] for group, (size, snap) in snaps.items()}
+                end[1] = end[1].filter_traces(ours)
+                size, snap = max([end, *snaps.values()], key=lambda s: s[0])
+                snap.dump(base + ".tracemalloc")
+                print(f"profile: wrote {base}.tracemalloc (mem, snapshot at {size / 1e6:.1f} MB, "
+                      f"peak {peak / 1e6:.1f} MB)", file=sys.stderr)
+                for group in PROFILE_FOCUS:
+                    print_mem_summary(group, *snaps.get(group, end))
+                print_mem_summary("elsewhere", size, snap)
+    finally:
+        _profile_lock.release()
+# shared:end profiling
+
+# ------------------------------ Tokenizer ------------------------------
+
+# Line kinds. Every Markdown line is classified exactly once by tokenize();
+# section splitting and question parsing only look at the resulting tokens.
+T_BLANK = 'blank'
+T_TEXT = 'text'                    # anything not listed below
+T_H1 = 'h1'                        # "# Title"
+T_H2 = 'h2'                        # "## Question header"
+T_ANS_HDR = 'ans_hdr'              # "### Answer(s):"
+T_TASK = 'task'                    # "- [ ] choice" / "- [x] choice"
+T_BULLET = 'bullet'                # "- item"
+T_QUOTE = 'quote'                  # "> text" (top-level or indented)
+T_NUM_SPEC = 'num_spec'            # "= 1.5 +- 0.1"
+T_COMMENT = 'comment'              # "<!-- text -->"
+T_COMMENT_OPEN = 'comment_open'    # "<!--"
+T_COMMENT_CLOSE = 'comment_close'  # "-->"
+
+class Token(NamedTuple):
+    kind: str                      # one of the T_* kinds above
+    raw: str                       # original Markdown line
+    text: str = ''                 # payload captured by the line's pattern
+    indented: bool = False         # raw line starts with whitespace
+    checked: bool = False          # task items: marked [x]
+    bullet: Optional[str] = None   # payload when the line reads as a "- item" bullet
+
+def tokenize(lines: List[str]) -> List[Token]:
+    """Classify each Markdown line once, dispatching on its first non-blank character."""
+    toks: List[Token] = []
+    append = toks.append
+    tok = Token._make
+    for ln in lines:
+        s = ln.lstrip()
+        if not s:
+            append(tok((T_BLANK, ln, '', s != ln, False, None)))
+            continue
+        indented = len(s) != len(ln)
+        c = s[0]
+        if c == '#':
+            m = H2_RE.match(ln)
+            if m:
+                append(tok((T_H2, ln, m.group(1), indented, False, None)))
+                continue
+            m = H1_RE.match(ln)
+            if m:
+                append(tok((T_H1, ln, m.group(1), indented, False, None)))
+                continue
+            if ANS_HDR_RE.match(ln):
+                append(tok((T_ANS_HDR, ln, '', indented, False, None)))
+                continue
+        elif c == '-':
+            m = TASK_RE.match(ln)
+            m_b = BULLET_RE.match(ln)
+            bullet = m_b.group(1) if m_b else None
+            if m:
+                append(tok((T_TASK, ln, m.group(2), indented, m.group(1) in 'xX', bullet)))
+                continue
+            if m_b:
+                append(tok((T_BULLET, ln, bullet, indented, False, bullet)))
+                continue
+            if HTML_CLOSE_RE.match(ln):
+                append(tok((T_COMMENT_CLOSE, ln, '', indented, False, None)))
+                continue
+        elif c == '>':
+            m = BLOCKQUOTE_RE.match(ln)
+            append(tok((T_QUOTE, ln, m.group(1), indented, False, None)))
+            continue
+        elif c == '=':
+            m = NUM_SPEC_RE.match(ln)
+            if m:
+                append(tok((T_NUM_SPEC, ln, m.group(1), indented, False, None)))
+                continue
+        elif c == '<':
+            m = HTML_SINGLE_RE.match(ln)
+            if m:
+                append(tok((T_COMMENT, ln, m.group(1), indented, False, None)))
+                continue
+            if HTML_OPEN_RE.match(ln):
+                append(tok((T_COMMENT_OPEN, ln, '', indented, False, None)))
+                continue
+        append(tok((T_TEXT, ln, '', indented, False, None)))
+    return toks
+
+def token_bounds(body: List[Token], start: int = 0, end: Optional[int] = None) -> Tuple[int, int]:
+    """(start, end) narrowed so that body[start:end] drops surrounding blank lines."""
+    if end is None:
+        end = len(body)
+    while start < end and body[start].kind == T_BLANK:
+        start += 1
+    while end > start and body[end - 1].kind == T_BLANK:
+        end -= 1
+    return start, end
+
+def token_lines(body: List[Token], start: int = 0, end: Optional[int] = None) -> List[str]:
+    """Raw lines of body[start:end] with surrounding blank lines trimmed."""
+    start, end = token_bounds(body, start, end)
+    return [body[k].raw for k in range(start, end)]
+
+# ------------------------------ Source spans ------------------------------
+
+LINE_BREAKS = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"  # what str.splitlines() splits at
+LINE_BREAK_RE = re.compile(r'\r\n|[' + LINE_BREAKS + ']')
+
+class TextLines(collections.abc.Sequence):
+    """text.splitlines() without holding a string per line: line i is sliced out of
+    `text` when read, using an array of line start offsets found in one regex pass."""
+    __slots__ = ("text", "starts")
+
+    def __init__(self, text: str):
+        self.text = text
+        # starts[i] is where line i begins; starts[-1] == len(text)
+        self.starts = array.array('Q', [0])
+        self.starts.extend(m.end() for m in LINE_BREAK_RE.finditer(text))
+        if self.starts[-1] != len(text):
+            self.starts.append(len(text))
+
+    def __len__(self) -> int:
+        return len(self.starts) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self.starts) - 1))]
+        if i < 0:
+            i += len(self.starts) - 1
+        if not 0 <= i < len(self.starts) - 1:
+            raise IndexError("TextLines index out of range")
+        text, start, end = self.text, self.starts[i], self.starts[i + 1]
+        if end > start and text[end - 1] in LINE_BREAKS:
+            end -= 2 if end - 2 >= start and text[end - 2:end] == "\r\n" else 1
+        return text[start:end]
+
+    def __iter__(self) -> Iterator[str]:
+        return map(self.__getitem__, range(len(self.starts) - 1))
+
+def quote_payload(ln: str) -> str:
+    """The text of a blockquote line after its '>' marker; '' for any other line."""
+    m = BLOCKQUOTE_RE.match(ln)
+    return m.group(1) if m else ''
+
+def task_text(ln: str) -> str:
+    """The choice text of a task-list line ("- [x] text")."""
+    return TASK_RE.match(ln).group(2)
+
+class LineSpan(collections.abc.Sequence):
+    """Lines source[start:end] of a shared source, read only when used.
+
+    parse_quiz(..., spans=True) stores prompts, choice texts, and per-choice feedback as
+    spans instead of copied line lists. `read`, if given, maps each source line to the
+    text it stands for (quote_payload, task_text). Spans compare equal to lists of the
+    same lines."""
+    __slots__ = ("source", "start", "end", "read")
+
+    def __init__(self, source: Sequence[str], start: int, end: int,
+                 read: Optional[Callable[[str], str]] = None):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.read = read
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self[j] for j in range(*k.indices(self.end - self.start))]
+        if k < 0:
+            k += self.end - self.start
+        if not 0 <= k < self.end - self.start:
+            raise IndexError("LineSpan index out of range")
+        ln = self.source[self.start + k]
+        return ln if self.read is None else self.read(ln)
+
+    def __iter__(self) -> Iterator[str]:
+        source = self.source
+        lines = (source[j] for j in range(self.start, self.end))
+        return lines if self.read is None else map(self.read, lines)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (list, tuple, LineSpan)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        read = f", {self.read.__name__}" if self.read is not None else ""
+        return f"LineSpan({self.start}, {self.end}{read})"
+
+def split_sections(toks: List[Token]) -> Tuple[str, List[str], List[Tuple[str, List[Token], int]]]:
+    """Return (quiz_title, description_lines, list of (h2_header_text, body_tokens, body_start)),
+    where body_start is the index of the body's first token in `toks`."""
     i = 0
+    n = len(toks)
     title = None
     # find H1
-    while i < len(lines):
-        m = H1_RE.match(lines[i])
-        if m:
-            title = m.group(1).strip()
+    while i < n:
+        tok = toks[i]
+        if tok.kind == T_H1:
+            title = tok.text.strip()
             i += 1
             break
-        elif lines[i].strip() == '':
+        elif tok.kind == T_BLANK:
             i += 1
         else:
             # if no H1, treat first nonblank as title anyway
-            title = lines[i].strip()
+            title = tok.raw.strip()
             i += 1
             break
     if title is None:
         title = "Untitled Quiz"
 
     # capture description until first H2
-    desc = []
-    while i < len(lines) and not H2_RE.match(lines[i]):
-        desc.append(lines[i])
+    start = i
+    while i < n and toks[i].kind != T_H2:
         i += 1
-    desc = strip_surrounding_blank(desc)
+    desc = token_lines(toks, start, i)
 
-    # gather H2 sections
+    # gather H2 sections; toks[i] is always an H2 here
     sections = []
-    while i < len(lines):
-        m = H2_RE.match(lines[i])
-        if not m:
-            i += 1
-            continue
-        header = m.group(1).strip()
+    while i < n:
+        header = toks[i].text.strip()
         i += 1
         start = i
-        while i < len(lines) and not H2_RE.match(lines[i]):
+        while i < n and toks[i].kind != T_H2:
             i += 1
-        body = lines[start:i]
-        sections.append((header, body))
+        sections.append((header, toks[start:i], start))
 
     return title, desc, sections
 
 
-def parse_question(header_text: str, body_lines: List[str]) -> Item:
+def consume_trailing(body: List[Token], i: int, q_feedback: Optional[List[FeedbackBlock]], where: str) -> List[str]:
+    """Convert HTML comments from body[i:] into top-level text2qti comments.
+    - A blank line before a comment in the source is preserved as a single ''.
+    - Top-level blockquotes are added to q_feedback, unless it is None.
+    - Any other non-blank content raises ValueError naming `where`."""
+    trailing: List[str] = []
+    n = len(body)
+    while i < n:
+        tok = body[i]
+        kind = tok.kind
+        # Question-level feedback (top-level blockquotes)
+        if kind == T_QUOTE and q_feedback is not None:
+            add_feedback_line(q_feedback, tok.text)
+            i += 1
+            continue
+        # HTML comments (single or block)
+        if kind == T_COMMENT or kind == T_COMMENT_OPEN:
+            # If there was a blank line immediately before this comment, preserve one
+            had_blank = (i > 0 and body[i-1].kind == T_BLANK)
+            if had_blank and (not trailing or trailing[-1] != ''):
+                trailing.append('')
+            i += 1
+            if kind == T_COMMENT:
+                trailing.append(f"% {tok.text}")
+                continue
+            trailing.append('COMMENT')
+            while i < n and body[i].kind != T_COMMENT_CLOSE:
+                trailing.append(body[i].raw)
+                i += 1
+            if i < n:
+                i += 1
+            trailing.append('END_COMMENT')
+            continue
+        # ignore pure blanks; otherwise raise on stray content
+        if kind == T_BLANK:
+            i += 1
+            continue
+        raise ValueError(f"Unrecognized content after {where}: " + tok.raw.strip())
+    return trailing
+
+
+def parse_question(header_text: str, body: List[Token], source: Optional[Sequence[str]] = None,
+                   base: int = 0) -> Item:
+    """Parse one H2 section. When `source` (the lines the tokens were read from, body[0]
+    being source[base]) is given, the prompt, choice texts, and per-choice feedback are
+    LineSpans into it rather than copied lists."""
     # Extract optional leading number from the H2 header (e.g., "12. Title text")
-    m_hdrnum = re.match(r'^\s*(\d+)\.\s+(.*)$', header_text)
+    m_hdrnum = HDR_NUM_RE.match(header_text)
     qnum: Optional[int] = None
     if m_hdrnum:
         qnum = int(m_hdrnum.group(1))
         header_text = m_hdrnum.group(2)
     title, points, attrs = parse_attrs(header_text)
-    qtype = attrs.get('type', '').lower()
+    qtype = sys.intern(attrs.get('type', '').lower())
     if not qtype:
         raise ValueError(f"Missing required attribute 'type' in header: '{header_text}'")
     if qtype not in {'mc', 'ma', 'num', 'fill', 'essay', 'file', 'text'}:
@@ -335,15 +902,31 @@ def parse_question(header_text: str, body_lines: List[str]) -> Item:
     # For mc/ma: find first task list line
     # For num: find "### Answer:" then collect NUM_SPEC line
     # For fill: find "### Answers:" then collect bullets
-    body = list(body_lines)
+    n = len(body)
 
-    def first_match_idx(pattern):
-        for idx, line in enumerate(body):
-            if pattern(line):
+    def first_kind_idx(kind):
+        for idx, tok in enumerate(body):
+            if tok.kind == kind:
                 return idx
         return None
 
-    prompt_lines: List[str] = []
+    # body[start:end] as raw lines (prompts) or as blockquote payloads (per-choice feedback)
+    def prompt(start: int = 0, end: Optional[int] = None) -> Sequence[str]:
+        start, end = token_bounds(body, start, end)
+        if start == end:
+            return EMPTY
+        if source is None:
+            return [body[k].raw for k in range(start, end)]
+        return LineSpan(source, base + start, base + end)
+
+    def quoted(start: int, end: int) -> Sequence[str]:
+        if start == end:
+            return EMPTY
+        if source is None:
+            return [body[k].text for k in range(start, end)]
+        return LineSpan(source, base + start, base + end, quote_payload)
+
+    prompt_lines: Sequence[str] = EMPTY
     choices: List[Choice] = []
     q_feedback: List[FeedbackBlock] = []
     numeric_spec: Optional[str] = None
@@ -352,226 +935,137 @@ def parse_question(header_text: str, body_lines: List[str]) -> Item:
 
     if qtype in {'mc', 'ma'}:
         # find first task line
-        first_task = first_match_idx(lambda ln: TASK_RE.match(ln) is not None)
+        first_task = first_kind_idx(T_TASK)
         if first_task is None:
             # no choices — everything is prompt (will fail validation later)
-            prompt_lines = strip_surrounding_blank(body)
+            prompt_lines = prompt()
         else:
-            prompt_lines = strip_surrounding_blank(body[:first_task])
+            prompt_lines = prompt(0, first_task)
             # parse choice blocks
             i = first_task
-            while i < len(body):
-                m_task = TASK_RE.match(body[i])
-                if not m_task:
+            while i < n:
+                task = body[i]
+                if task.kind != T_TASK:
                     # could be question-level feedback or trailing blank
                     break
-                checked = (m_task.group(1).lower() == 'x')
-                first_text = m_task.group(2)
-                choice_lines = [first_text]
-                per_choice_fb: List[str] = []
                 i += 1
+                fb_start = i
                 # consume indented blockquotes as per-choice feedback
-                while i < len(body):
-                    line = body[i]
-                    if BLOCKQUOTE_RE.match(line) and (len(line) - len(line.lstrip())) > 0:
+                while i < n:
+                    tok = body[i]
+                    if tok.kind == T_QUOTE and tok.indented:
                         # indented blockquote => per-choice
-                        m_bq = BLOCKQUOTE_RE.match(line)
-                        per_choice_fb.append(m_bq.group(1))
                         i += 1
                         continue
                     # empty lines under choice are allowed; keep them in feedback as blank lines
-                    if line.strip() == '' and (i < len(body)-1):
-                        if per_choice_fb:
-                            per_choice_fb.append('')
+                    if tok.kind == T_BLANK and (i < n-1):
+                        if i > fb_start:
                             i += 1
                             continue
                     # If we see an indented non-blockquote line here, it's ambiguous — raise
-                    if (len(line) - len(line.lstrip())) > 0 and not BLOCKQUOTE_RE.match(line):
+                    if tok.indented and tok.kind != T_QUOTE:
                         raise ValueError(
                             "Unexpected indented non-blockquote under a choice. "
                             "Use an indented blockquote ('> ') for per-choice feedback, "
-                            "or keep the choice text to a single line. Offending line: " + line.strip()
+                            "or keep the choice text to a single line. Offending line: " + tok.raw.strip()
                         )
                     break
-                choices.append(Choice(text_lines=[first_text], correct=checked, feedback_lines=strip_trailing_blank(per_choice_fb)))
-            # after choices and question-level feedback, capture any trailing HTML comments
-            trailing: List[str] = []
-            while i < len(body):
-                ln = body[i]
-                # Question-level feedback (top-level blockquotes)
-                m_bq = BLOCKQUOTE_RE.match(ln)
-                if m_bq:
-                    add_feedback_line(q_feedback, m_bq.group(1))
-                    i += 1
-                    continue
-                # HTML comments (single or block)
-                if HTML_SINGLE_RE.match(ln):
-                    # If there was a blank line immediately before this comment, preserve one
-                    had_blank = (i > 0 and body[i-1].strip() == '')
-                    if had_blank and (not trailing or trailing[-1] != ''):
-                        trailing.append('')
-                    m = HTML_SINGLE_RE.match(ln)
-                    trailing.append(f"% {m.group(1)}")
-                    i += 1
-                    continue
-                if HTML_OPEN_RE.match(ln):
-                    had_blank = (i > 0 and body[i-1].strip() == '')
-                    if had_blank and (not trailing or trailing[-1] != ''):
-                        trailing.append('')
-                    trailing.append('COMMENT')
-                    i += 1
-                    while i < len(body) and not HTML_CLOSE_RE.match(body[i]):
-                        trailing.append(body[i])
-                        i += 1
-                    if i < len(body) and HTML_CLOSE_RE.match(body[i]):
-                        i += 1
-                    trailing.append('END_COMMENT')
-                    continue
-                # ignore pure blanks; otherwise raise on stray content
-                if ln.strip() == '':
-                    i += 1
-                    continue
-                raise ValueError("Unrecognized content after answers/feedback in MC/MA question: " + ln.strip())
-            trailing_comments = trailing
+                # per-choice feedback is body[fb_start:i] (quote payloads, '' for blank lines)
+                fb_end = i
+                while fb_end > fb_start and body[fb_end - 1].text.strip() == '':
+                    fb_end -= 1
+                if source is None:
+                    text_lines: Sequence[str] = [intern_short(task.text)]
+                else:
+                    text_lines = LineSpan(source, base + fb_start - 1, base + fb_start, task_text)
+                choices.append(Choice(text_lines=text_lines, correct=task.checked,
+                                      feedback_lines=quoted(fb_start, fb_end)))
+            # after choices: question-level feedback and any trailing HTML comments
+            trailing_comments = consume_trailing(body, i, q_feedback, "answers/feedback in MC/MA question")
 
     elif qtype == 'num':
         # find "### Answer:"
-        ans_hdr_idx = first_match_idx(lambda ln: ANS_HDR_RE.match(ln) is not None)
+        ans_hdr_idx = first_kind_idx(T_ANS_HDR)
         if ans_hdr_idx is None:
-            prompt_lines = strip_surrounding_blank(body)
+            prompt_lines = prompt()
         else:
-            prompt_lines = strip_surrounding_blank(body[:ans_hdr_idx])
+            prompt_lines = prompt(0, ans_hdr_idx)
             # next nonblank after header should be NUM_SPEC
             i = ans_hdr_idx + 1
             # skip any blank lines before the numeric spec
-            while i < len(body) and body[i].strip() == '':
+            while i < n and body[i].kind == T_BLANK:
                 i += 1
-            if i < len(body):
-                m_num = NUM_SPEC_RE.match(body[i])
-                if m_num:
-                    numeric_spec = m_num.group(1).strip()
+            if i < n:
+                if body[i].kind == T_NUM_SPEC:
+                    numeric_spec = body[i].text.strip()
                     i += 1
                 # skip any blank lines before question-level feedback
-                while i < len(body) and body[i].strip() == '':
+                while i < n and body[i].kind == T_BLANK:
                     i += 1
                 # gather question-level feedback blockquotes
-                while i < len(body):
+                while i < n:
                     # allow and skip intervening blank lines between feedback lines
-                    if body[i].strip() == '':
+                    if body[i].kind == T_BLANK:
                         i += 1
                         continue
-                    m_bq = BLOCKQUOTE_RE.match(body[i])
-                    if m_bq:
-                        add_feedback_line(q_feedback, m_bq.group(1))
+                    if body[i].kind == T_QUOTE:
+                        add_feedback_line(q_feedback, body[i].text)
                         i += 1
                     else:
                         # stop here so trailing pass can process comments or raise on stray content
                         break
             # capture trailing HTML comments
-            trailing: List[str] = []
-            while i < len(body):
-                ln = body[i]
-                if HTML_SINGLE_RE.match(ln):
-                    had_blank = (i > 0 and body[i-1].strip() == '')
-                    if had_blank and (not trailing or trailing[-1] != ''):
-                        trailing.append('')
-                    m = HTML_SINGLE_RE.match(ln)
-                    trailing.append(f"% {m.group(1)}")
-                    i += 1
-                    continue
-                if HTML_OPEN_RE.match(ln):
-                    had_blank = (i > 0 and body[i-1].strip() == '')
-                    if had_blank and (not trailing or trailing[-1] != ''):
-                        trailing.append('')
-                    trailing.append('COMMENT')
-                    i += 1
-                    while i < len(body) and not HTML_CLOSE_RE.match(body[i]):
-                        trailing.append(body[i])
-                        i += 1
-                    if i < len(body) and HTML_CLOSE_RE.match(body[i]):
-                        i += 1
-                    trailing.append('END_COMMENT')
-                    continue
-                if ln.strip() == '':
-                    i += 1
-                    continue
-                raise ValueError("Unrecognized content after numeric spec/feedback in NUM question: " + ln.strip())
-            trailing_comments = trailing
+            trailing_comments = consume_trailing(body, i, None, "numeric spec/feedback in NUM question")
 
     elif qtype == 'fill':
-        ans_hdr_idx = first_match_idx(lambda ln: re.match(r'^\s*###\s*Answers?\s*:?\s*$', ln, re.IGNORECASE) is not None)
+        ans_hdr_idx = first_kind_idx(T_ANS_HDR)
         if ans_hdr_idx is None:
-            prompt_lines = strip_surrounding_blank(body)
+            prompt_lines = prompt()
         else:
-            prompt_lines = strip_surrounding_blank(body[:ans_hdr_idx])
+            prompt_lines = prompt(0, ans_hdr_idx)
             i = ans_hdr_idx + 1
             # gather bullets
-            while i < len(body):
-                if body[i].strip() == '':
+            while i < n:
+                if body[i].kind == T_BLANK:
                     i += 1
                     continue
-                m_b = BULLET_RE.match(body[i])
-                if not m_b:
+                bullet = body[i].bullet
+                if bullet is None:
                     break
-                fill_answers.append(m_b.group(1).strip())
+                fill_answers.append(intern_short(bullet.strip()))
                 i += 1
             # question-level feedback
-            while i < len(body):
-                m_bq = BLOCKQUOTE_RE.match(body[i])
-                if m_bq:
-                    add_feedback_line(q_feedback, m_bq.group(1))
-                    i += 1
-                else:
-                    # stop so trailing pass can process comments or raise on stray content
-                    break
-            # capture trailing HTML comments
-            trailing: List[str] = []
-            while i < len(body):
-                ln = body[i]
-                if HTML_SINGLE_RE.match(ln):
-                    had_blank = (i > 0 and body[i-1].strip() == '')
-                    if had_blank and (not trailing or trailing[-1] != ''):
-                        trailing.append('')
-                    m = HTML_SINGLE_RE.match(ln)
-                    trailing.append(f"% {m.group(1)}")
-                    i += 1
-                    continue
-                if HTML_OPEN_RE.match(ln):
-                    had_blank = (i > 0 and body[i-1].strip() == '')
-                    if had_blank and (not trailing or trailing[-1] != ''):
-                        trailing.append('')
-                    trailing.append('COMMENT')
-                    i += 1
-                    while i < len(body) and not HTML_CLOSE_RE.match(body[i]):
-                        trailing.append(body[i])
-                        i += 1
-                    if i < len(body) and HTML_CLOSE_RE.match(body[i]):
-                        i += 1
-                    trailing.append('END_COMMENT')
-                    continue
-                if ln.strip() == '':
-                    i += 1
-                    continue
-                raise ValueError("Unrecognized content after answers/feedback in FILL question: " + ln.strip())
-            trailing_comments = trailing
+            while i < n and body[i].kind == T_QUOTE:
+                add_feedback_line(q_feedback, body[i].text)
+                i += 1
+            # capture trailing HTML comments; stray content raises
+            trailing_comments = consume_trailing(body, i, None, "answers/feedback in FILL question")
 
     else:
         # essay/file/text
         # - no choices or answers sections allowed
         # - allow top-level blockquotes as question-level feedback (including Information)
-        q_feedback = []
-        cleaned_prompt = []
-        for ln in body:
-            if TASK_RE.match(ln):
-                raise ValueError("Task list (choices) found in a non-choice question (essay/file/text): " + ln.strip())
-            if ANS_HDR_RE.match(ln):
+        # the prompt is every other line: body[first:last + 1] (its first to last nonblank
+        # line), unless a blockquote lies in between
+        first = last = quote_at = -1
+        split = False
+        for k, tok in enumerate(body):
+            if tok.kind == T_TASK:
+                raise ValueError("Task list (choices) found in a non-choice question (essay/file/text): " + tok.raw.strip())
+            if tok.kind == T_ANS_HDR:
                 raise ValueError("'### Answers:' section found in a non-fill question (essay/file/text).")
-            m_bq = BLOCKQUOTE_RE.match(ln)
-            if m_bq:
-                add_feedback_line(q_feedback, m_bq.group(1))
-            else:
-                cleaned_prompt.append(ln)
-        prompt_lines = strip_surrounding_blank(cleaned_prompt)
+            if tok.kind == T_QUOTE:
+                add_feedback_line(q_feedback, tok.text)
+                quote_at = k
+            elif tok.kind != T_BLANK:
+                if first < 0:
+                    first = k
+                split = split or quote_at > first
+                last = k
+        if split:
+            prompt_lines = strip_surrounding_blank([tok.raw for tok in body if tok.kind != T_QUOTE])
+        elif first >= 0:
+            prompt_lines = prompt(first, last + 1)
 
     q = Item(
         title=title, kind=qtype, points=points, attrs=attrs,
@@ -607,11 +1101,11 @@ def validate_question(q: Item):
         # basic sanity check for allowed formats
         spec = q.numeric_spec.strip()
         ok = False
-        if re.match(r'^\[.*?,.*?\]$', spec):  # interval
+        if NUM_INTERVAL_RE.match(spec):  # interval
             ok = True
-        elif re.search(r'\+\-\s*[\d.]+(%?)$', spec):  # tolerance with +-
+        elif NUM_TOLERANCE_RE.search(spec):  # tolerance with +-
             ok = True
-        elif re.match(r'^-?\d+(\.\d+)?$', spec):  # plain number
+        elif NUM_PLAIN_RE.match(spec):  # plain number
             ok = True
         if not ok:
             # Still allow text2qti to parse; only warn would be better, but we raise to keep spec strict.
@@ -634,20 +1128,139 @@ def validate_question(q: Item):
                 )
             seen_fb_kinds.add(kind)
 
-def parse_quiz(md_text: str) -> Quiz:
-    lines = md_text.splitlines()
-    title, desc_lines, sections = split_sections(lines)
+def parse_section(header_text: str, body: List[Token], line: int, timer: Optional[PhaseTimer] = None,
+                  source: Optional[Sequence[str]] = None, base: int = 0) -> Item:
+    """Parse and validate the H2 section whose heading is on (1-based) source line `line`;
+    a ValueError from either step is raised again naming that line."""
+    t = timer or NO_TIMER
+    try:
+        with t.phase("parse_question"):
+            q = parse_question(header_text, body, source, base)
+        with t.phase("validate_question"):
+            validate_question(q)
+    except ValueError as e:
+        raise ValueError(f"Question at line {line}: {e}") from e
+    t.count(q.kind)
+    profile_checkpoint("parse")
+    return q
+
+def source_sections(raw_sections: Iterable[Tuple[str, List[str]]], start: int,
+                    t: PhaseTimer) -> Iterator[Tuple[str, List[Token], int]]:
+    """split_sections' (header, body_tokens, body_start) for the (h2_line, body_lines) pairs
+    of iter_raw_sections, tokenizing each section only when it is reached. `start` is the
+    line index of the first H2."""
+    for header, body in raw_sections:
+        with t.phase("split_sections"):
+            toks = tokenize(body)
+        yield H2_RE.match(header).group(1).strip(), toks, start + 1
+        start += 1 + len(body)
+
+def build_quiz(title: str, desc_lines: List[str], items: List[Item]) -> Quiz:
+    """Assemble a Quiz, lifting option lines out of the description."""
+    options, cleaned = parse_options_from_desc(strip_surrounding_blank(desc_lines))
+    return Quiz(title=title, description_lines=cleaned, items=items, **options)
+
+def parse_quiz(md_text: str, timer: Optional[PhaseTimer] = None, spans: bool = False) -> Quiz:
+    """Parse a Markdown quiz. With `spans`, prompts, choice texts, and per-choice feedback
+    are LineSpans into `md_text` itself (through TextLines) instead of copied line lists,
+    and the text is tokenized one H2 section at a time: a lower parse peak and a smaller
+    model for read-only consumers (validators, indexers, statistics), which never need the
+    text. Emission reads spans as lines."""
+    t = timer or NO_TIMER
+    with t.phase("split_sections"):
+        if spans:
+            # tokenize one H2 section at a time, so no line copies outlive their section
+            source = TextLines(md_text)
+            raw_sections = iter_raw_sections(source)
+            _, head = next(raw_sections)
+            title, desc_lines, _ = split_sections(tokenize(head))
+            sections = source_sections(raw_sections, len(head), t)
+        else:
+            source = None
+            title, desc_lines, sections = split_sections(tokenize(md_text.splitlines()))
     questions: List[Item] = []
-    for hdr, body in sections:
-        q = parse_question(hdr, body)
-        validate_question(q)
-        questions.append(q)
-    fis, ssg, srg, shuffle, show, one, cant, cleaned = parse_options_from_desc(strip_surrounding_blank(desc_lines))
-    return Quiz(title=title, description_lines=cleaned, items=questions,
-                feedback_is_solution=fis, solutions_sample_groups=ssg,
-                solutions_randomize_groups=srg,
-                shuffle_answers=shuffle, show_correct_answers=show,
-                one_question_at_a_time=one, cant_go_back=cant)
+    for hdr, body, start in sections:
+        # body starts right after its H2, so `start` (0-based) is the H2's 1-based line
+        questions.append(parse_section(hdr, body, start, t, source, start))
+    return build_quiz(title, desc_lines, questions)
+
+# ------------------------------ Streaming parse ------------------------------
+
+def is_h2(ln: str) -> bool:
+    return ln.lstrip().startswith('##') and H2_RE.match(ln) is not None
+
+def iter_raw_sections(lines: Iterable[str]) -> Iterator[Tuple[Optional[str], List[str]]]:
+    """Split Markdown lines at H2 headings without tokenizing them, holding one section at a time.
+    Yields (None, head_lines) first (everything before the first H2; the first nonblank
+    line is always the title, even if it looks like an H2), then (h2_line, body_lines)."""
+    it = iter(lines)
+    head: List[str] = []
+    header: Optional[str] = None
+    for ln in it:
+        if is_h2(ln) and any(h.strip() for h in head):
+            header = ln
+            break
+        head.append(ln)
+    yield None, head
+    if header is None:
+        return
+    body: List[str] = []
+    for ln in it:
+        if is_h2(ln):
+            yield header, body
+            header, body = ln, []
+        else:
+            body.append(ln)
+    yield header, body
+
+READ_BLOCK = 1 << 16  # characters per read when timing, so "read" is timed per block, not per line
+
+def file_lines(fp: Iterable[str], timer: Optional[PhaseTimer] = None) -> Iterator[str]:
+    """Lines of a text stream without line endings, split exactly like str.splitlines()."""
+    if timer is None or not hasattr(fp, "read"):
+        for chunk in fp:
+            yield from chunk.splitlines()
+        return
+    carry = ''
+    while True:
+        with timer.phase("read"):
+            block = fp.read(READ_BLOCK)
+        if not block:
+            break
+        # hold back the last line: it may be incomplete, or a "\r" whose "\n" is in the next block
+        lines = (carry + block).splitlines(True)
+        carry = lines.pop()
+        yield from "".join(lines).splitlines()
+    yield from carry.splitlines()
+
+def stream_quiz(fp: Iterable[str], timer: Optional[PhaseTimer] = None) -> Tuple[Quiz, Iterator[Item]]:
+    """Read the quiz title, description, and options from `fp`, and return them as a Quiz
+    (with no items) together with a generator that parses and validates the remaining
+    questions one H2 section at a time. Memory stays bounded by the largest section."""
+    t = timer or NO_TIMER
+    sections = iter_raw_sections(file_lines(fp, timer))
+    with t.phase("split_sections"):
+        _, head = next(sections)
+        title, desc_lines, _ = split_sections(tokenize(head))
+    quiz = build_quiz(title, desc_lines, [])
+
+    def items() -> Iterator[Item]:
+        line = len(head) + 1  # of the next H2
+        while True:
+            with t.phase("split_sections"):
+                section = next(sections, None)
+                if section is None:
+                    return
+                header, body = section
+                toks = tokenize(body)
+            yield parse_section(H2_RE.match(header).group(1).strip(), toks, line, t)
+            line += 1 + len(body)
+
+    return quiz, items()
+
+def iter_quiz_items(fp: Iterable[str]) -> Iterator[Item]:
+    """Yield validated Items from a Markdown quiz stream one at a time (see stream_quiz)."""
+    return stream_quiz(fp)[1]
 
 # ------------------------------ Emission ------------------------------
 
@@ -669,7 +1282,20 @@ def emit_wrapped(prefix: str, text: str) -> List[str]:
 def md_join(lines: List[str]) -> str:
     return "\n".join(lines).rstrip()
 
-def emit_text2qti(quiz: Quiz) -> str:
+FEEDBACK_MARKERS = {'correct': '+', 'incorrect': '-', 'information': '!'}  # anything else: '...'
+
+def emit_q_feedback(out: List[str], q: Item) -> None:
+    """Emit question-level feedback blocks, each as one marker line plus indented continuation."""
+    for fb in q.q_feedback:
+        marker = FEEDBACK_MARKERS.get(fb.kind, '...')
+        text = md_join(fb.lines)
+        out.extend(emit_wrapped(f"{marker} ", text))
+
+def is_t2qti_comment(ln: str) -> bool:
+    return ln == 'COMMENT' or ln == 'END_COMMENT' or ln.lstrip().startswith('%')
+
+def emit_preamble(quiz: Quiz) -> List[str]:
+    """Quiz title, description, and option lines, followed by one blank line."""
     out = []
     # Quiz title & description
     out.append(f"Quiz title: {quiz.title}")
@@ -680,7 +1306,7 @@ def emit_text2qti(quiz: Quiz) -> str:
         conv = html_comments_to_t2qti(quiz.description_lines)
         started = False
         for ln in conv:
-            if ln == 'COMMENT' or ln == 'END_COMMENT' or ln.lstrip().startswith('%'):
+            if is_t2qti_comment(ln):
                 # Emit comments at top-level, preserving order
                 out.append(ln)
                 continue
@@ -694,214 +1320,1253 @@ def emit_text2qti(quiz: Quiz) -> str:
             out.append("Quiz description: ")
 
     # Emit option lines right after description (no indent), if present
-    if quiz.feedback_is_solution is not None:
-        out.append(f"feedback is solution: {'true' if quiz.feedback_is_solution else 'false'}")
-    if quiz.solutions_sample_groups is not None:
-        out.append(f"solutions sample groups: {'true' if quiz.solutions_sample_groups else 'false'}")
-    if quiz.solutions_randomize_groups is not None:
-        out.append(f"solutions randomize groups: {'true' if quiz.solutions_randomize_groups else 'false'}")
-    if quiz.shuffle_answers is not None:
-        out.append(f"shuffle answers: {'true' if quiz.shuffle_answers else 'false'}")
-    if quiz.show_correct_answers is not None:
-        out.append(f"show correct answers: {'true' if quiz.show_correct_answers else 'false'}")
-    if quiz.one_question_at_a_time is not None:
-        out.append(f"one question at a time: {'true' if quiz.one_question_at_a_time else 'false'}")
-    if quiz.cant_go_back is not None:
-        out.append(f"can't go back: {'true' if quiz.cant_go_back else 'false'}")
+    for label, fld in QUIZ_OPTIONS:
+        val = getattr(quiz, fld)
+        if val is not None:
+            out.append(f"{label}: {'true' if val else 'false'}")
     out.append("")
+    return out
 
-    for idx, q in enumerate(quiz.items, 1):
-        if q.kind == 'text':
-            # Text region
-            out.append(f"Text title: {q.title}")
-            prompt = md_join(q.prompt_lines)
-            lines = (prompt.splitlines() if prompt.strip() != "" else [""])
-            conv = html_comments_to_t2qti(lines)
-            # We emit non-comment lines as part of Text: block; comments at top-level
-            text_started = False
-            for idx_line, ln in enumerate(conv):
-                if ln == 'COMMENT' or ln == 'END_COMMENT' or ln.lstrip().startswith('%'):
-                    out.append(ln)
-                    continue
-                if not text_started:
-                    out.append(f"Text: {ln}")
-                    text_started = True
-                else:
-                    out.append(f"    {ln}")
-            if not text_started:
-                # Empty text block
-                out.append("Text: ")
-            out.append("")
-            continue
-
-        # Regular question
-        # Remove any accidental number prefix from Title (MD number lives in q.qnum)
-        clean_title = re.sub(r'^\s*\d+\.\s+', '', q.title).strip()
-        if clean_title:
-            out.append(f"Title: {clean_title}")
-        pts = int(q.points) if float(q.points).is_integer() else q.points
-        out.append(f"Points: {pts}")
-        # Stem with comment handling: emit leading comments before the numbered stem,
-        # then first non-comment as the stem line, and remaining lines as continuation
-        stem = md_join(q.prompt_lines)
-        stem_lines = stem.splitlines() or [""]
-        conv_all = html_comments_to_t2qti(stem_lines)
-
-        # Emit leading comments before the numbered stem
-        k = 0
-        while k < len(conv_all):
-            ln = conv_all[k]
-            if ln == 'COMMENT' or ln == 'END_COMMENT' or ln.lstrip().startswith('%'):
+def emit_item(q: Item, idx: int) -> List[str]:
+    """text2qti lines for one item, followed by one blank line.
+    `idx` (1-based position in the quiz) numbers the stem when the Markdown header had no number."""
+    out = []
+    if q.kind == 'text':
+        # Text region
+        out.append(f"Text title: {q.title}")
+        prompt = md_join(q.prompt_lines)
+        lines = (prompt.splitlines() if prompt.strip() != "" else [""])
+        conv = html_comments_to_t2qti(lines)
+        # We emit non-comment lines as part of Text: block; comments at top-level
+        text_started = False
+        for ln in conv:
+            if is_t2qti_comment(ln):
                 out.append(ln)
-                k += 1
                 continue
-            break
-
-        # Use q.qnum if present; else fall back to sequential idx
-        stem_num = q.qnum if q.qnum is not None else idx
-        first_stem = conv_all[k] if k < len(conv_all) and not (conv_all[k] == 'COMMENT' or conv_all[k] == 'END_COMMENT' or conv_all[k].lstrip().startswith('%')) else ''
-        out.append(f"{stem_num}. {first_stem}")
-        k = k + 1 if first_stem != '' else k
-
-        # Emit remaining lines: comments top-level, non-comments as indented continuation
-        while k < len(conv_all):
-            ln = conv_all[k]
-            if ln == 'COMMENT' or ln == 'END_COMMENT' or ln.lstrip().startswith('%'):
-                out.append(ln)
+            if not text_started:
+                out.append(f"Text: {ln}")
+                text_started = True
             else:
                 out.append(f"    {ln}")
-            k += 1
-
-        if q.kind in {'mc', 'ma'}:
-            # Question-level feedback should appear BEFORE the answers
-            if q.q_feedback:
-                for fb in q.q_feedback:
-                    marker = '...'
-                    if fb.kind == 'correct':
-                        marker = '+'
-                    elif fb.kind == 'incorrect':
-                        marker = '-'
-                    elif fb.kind == 'information':
-                        marker = '!'
-                    text = md_join(fb.lines)
-                    out.extend(emit_wrapped(f"{marker} ", text))
-
-            # Emit choices
-            if q.kind == 'mc':
-                letters = "abcdefghijklmnopqrstuvwxyz"
-                for i, ch in enumerate(q.choices):
-                    letter = letters[i] + ")"
-                    prefix = f"*{letter} " if ch.correct else f"{letter} "
-                    # choice text
-                    for j, line in enumerate(ch.text_lines):
-                        if j == 0:
-                            out.append(f"{prefix}{line}")
-                        else:
-                            out.append(f"    {line}")
-                    # per-choice feedback: emit as a single block with continuation lines indented
-                    if ch.feedback_lines:
-                        fb_text = md_join(ch.feedback_lines)
-                        out.extend(emit_wrapped("... ", fb_text))
-            else:
-                # multiple answer: [ ] and [*]
-                for ch in q.choices:
-                    marker = "[*]" if ch.correct else "[ ]"
-                    out.append(f"{marker} {ch.text_lines[0]}")
-                    for ln in ch.text_lines[1:]:
-                        out.append(f"    {ln}")
-                    # per-choice feedback: emit as a single block with continuation lines indented
-                    if ch.feedback_lines:
-                        fb_text = md_join(ch.feedback_lines)
-                        out.extend(emit_wrapped("... ", fb_text))
-
-        elif q.kind == 'num':
-            # Question-level feedback should appear BEFORE the numeric answer spec
-            if q.q_feedback:
-                for fb in q.q_feedback:
-                    marker = '...'
-                    if fb.kind == 'correct':
-                        marker = '+'
-                    elif fb.kind == 'incorrect':
-                        marker = '-'
-                    elif fb.kind == 'information':
-                        marker = '!'
-                    text = md_join(fb.lines)
-                    out.extend(emit_wrapped(f"{marker} ", text))
-            out.append(f"=   {q.numeric_spec}")
-
-        elif q.kind == 'fill':
-            # Question-level feedback should appear BEFORE the acceptable answers
-            if q.q_feedback:
-                for fb in q.q_feedback:
-                    marker = '...'
-                    if fb.kind == 'correct':
-                        marker = '+'
-                    elif fb.kind == 'incorrect':
-                        marker = '-'
-                    elif fb.kind == 'information':
-                        marker = '!'
-                    text = md_join(fb.lines)
-                    out.extend(emit_wrapped(f"{marker} ", text))
-            for ans in q.fill_answers:
-                out.append(f"*   {ans}")
-
-        elif q.kind == 'essay':
-            # Question-level feedback should appear
-            if q.q_feedback:
-                for fb in q.q_feedback:
-                    marker = '...'
-                    if fb.kind == 'correct':
-                        marker = '+'
-                    elif fb.kind == 'incorrect':
-                        marker = '-'
-                    elif fb.kind == 'information':
-                        marker = '!'
-                    text = md_join(fb.lines)
-                    out.extend(emit_wrapped(f"{marker} ", text))
-            out.append("____")
-
-        elif q.kind == 'file':
-            # Question-level feedback should appear
-            if q.q_feedback:
-                for fb in q.q_feedback:
-                    marker = '...'
-                    if fb.kind == 'correct':
-                        marker = '+'
-                    elif fb.kind == 'incorrect':
-                        marker = '-'
-                    elif fb.kind == 'information':
-                        marker = '!'
-                    text = md_join(fb.lines)
-                    out.extend(emit_wrapped(f"{marker} ", text))
-            out.append("^^^^")
-
-        # Emit any trailing top-level comments captured from Markdown
-        if getattr(q, 'trailing_comments', None):
-            for ln in q.trailing_comments:
-                if ln == '':
-                    out.append('')
-                else:
-                    out.append(ln)
+        if not text_started:
+            # Empty text block
+            out.append("Text: ")
         out.append("")
+        return out
+
+    # Regular question
+    # Remove any accidental number prefix from Title (MD number lives in q.qnum)
+    clean_title = TITLE_NUM_RE.sub('', q.title).strip()
+    if clean_title:
+        out.append(f"Title: {clean_title}")
+    pts = int(q.points) if float(q.points).is_integer() else q.points
+    out.append(f"Points: {pts}")
+    # Stem with comment handling: emit leading comments before the numbered stem,
+    # then first non-comment as the stem line, and remaining lines as continuation
+    stem = md_join(q.prompt_lines)
+    stem_lines = stem.splitlines() or [""]
+    conv_all = html_comments_to_t2qti(stem_lines)
+
+    # Emit leading comments before the numbered stem
+    k = 0
+    while k < len(conv_all) and is_t2qti_comment(conv_all[k]):
+        out.append(conv_all[k])
+        k += 1
+
+    # Use q.qnum if present; else fall back to sequential idx
+    stem_num = q.qnum if q.qnum is not None else idx
+    first_stem = conv_all[k] if k < len(conv_all) else ''
+    out.append(f"{stem_num}. {first_stem}")
+    k = k + 1 if first_stem != '' else k
+
+    # Emit remaining lines: comments top-level, non-comments as indented continuation
+    while k < len(conv_all):
+        ln = conv_all[k]
+        if is_t2qti_comment(ln):
+            out.append(ln)
+        else:
+            out.append(f"    {ln}")
+        k += 1
+
+    # Question-level feedback appears BEFORE the answers/spec/terminator
+    emit_q_feedback(out, q)
+
+    if q.kind in {'mc', 'ma'}:
+        # Emit choices
+        if q.kind == 'mc':
+            letters = "abcdefghijklmnopqrstuvwxyz"
+            for i, ch in enumerate(q.choices):
+                letter = letters[i] + ")"
+                prefix = f"*{letter} " if ch.correct else f"{letter} "
+                # choice text
+                for j, line in enumerate(ch.text_lines):
+                    if j == 0:
+                        out.append(f"{prefix}{line}")
+                    else:
+                        out.append(f"    {line}")
+                # per-choice feedback: emit as a single block with continuation lines indented
+                if ch.feedback_lines:
+                    fb_text = md_join(ch.feedback_lines)
+                    out.extend(emit_wrapped("... ", fb_text))
+        else:
+            # multiple answer: [ ] and [*]
+            for ch in q.choices:
+                marker = "[*]" if ch.correct else "[ ]"
+                out.append(f"{marker} {ch.text_lines[0]}")
+                for ln in ch.text_lines[1:]:
+                    out.append(f"    {ln}")
+                # per-choice feedback: emit as a single block with continuation lines indented
+                if ch.feedback_lines:
+                    fb_text = md_join(ch.feedback_lines)
+                    out.extend(emit_wrapped("... ", fb_text))
+
+    elif q.kind == 'num':
+        out.append(f"=   {q.numeric_spec}")
+
+    elif q.kind == 'fill':
+        for ans in q.fill_answers:
+            out.append(f"*   {ans}")
+
+    elif q.kind == 'essay':
+        out.append("____")
+
+    elif q.kind == 'file':
+        out.append("^^^^")
+
+    # Emit any trailing top-level comments captured from Markdown
+    out.extend(q.trailing_comments)
+    out.append("")
+    return out
+
+def iter_text2qti(quiz: Quiz, items: Optional[Iterable[Item]] = None,
+                  timer: Optional[PhaseTimer] = None) -> Iterator[str]:
+    """Yield the text2qti document in chunks (preamble, then one per item) as they are produced.
+    `items` defaults to quiz.items; pass any iterable (e.g. a generator) to stream them.
+    The chunks concatenate to exactly emit_text2qti(quiz): trailing whitespace is held back
+    until more text follows, and the document ends with a single newline."""
+    t = timer or NO_TIMER
+    held = ''
+    with t.phase("emit_text2qti"):
+        chunk = "\n".join(emit_preamble(quiz))
+    for idx, q in enumerate(quiz.items if items is None else items, 1):
+        body = chunk.rstrip()
+        if body:
+            yield held + body
+            held = chunk[len(body):]
+        else:
+            held += chunk
+        with t.phase("emit_text2qti"):
+            chunk = "\n" + "\n".join(emit_item(q, idx))
+        profile_checkpoint("emit")
+    body = chunk.rstrip()
+    yield (held + body if body else '') + "\n"
+
+def write_text2qti(quiz: Quiz, fp: TextIO, items: Optional[Iterable[Item]] = None,
+                   timer: Optional[PhaseTimer] = None) -> None:
+    """Write the text2qti document to a file object one item at a time."""
+    t = timer or NO_TIMER
+    for chunk in iter_text2qti(quiz, items, timer):
+        with t.phase("write"):
+            fp.write(chunk)
+
+def emit_text2qti(quiz: Quiz, timer: Optional[PhaseTimer] = None) -> str:
+    return "".join(iter_text2qti(quiz, None, timer))
+
+# ------------------------------ QTI ZIP emission ------------------------------
+
+try:
+    import markdown as markdown_lib  # optional: full Markdown rendering for --zip output
+except ImportError:
+    markdown_lib = None
+
+QTI_TYPES = {
+    'mc': 'multiple_choice_question',
+    'ma': 'multiple_answers_question',
+    'num': 'numerical_question',
+    'fill': 'short_answer_question',
+    'essay': 'essay_question',
+    'file': 'file_upload_question',
+    'text': 'text_only_question',
+}
+
+HTML_COMMENT_RE = re.compile(r'<!--.*?-->', re.DOTALL)
+# `$...$` outside code: fenced code blocks (group 1) and code spans (group 2) are matched
+# first so that math-like text inside them is left alone; group 3 is the TeX of real math.
+MATH_OR_CODE_RE = re.compile(r'(?m)^[ \t]*(`{3,}|~{3,})(?s:.*?)^[ \t]*\1|(`+)[^\n]+?\2|'
+                             r'(?<![\\$])\$(?=\S)([^$\n]*?\S)\$(?!\d)')
+MATH_SLOT_RE = re.compile(r'MD2QTIMATH(\d+)Z')
+INLINE_MD_RE = re.compile(r'(?P<raw><[A-Za-z/!][^<>]*>|&(?:#\d+|#[xX][0-9a-fA-F]+|[A-Za-z]\w*);)'
+                          r'|!\[(?P<alt>[^\]]*)\]\((?P<src>[^)\s]+)\)'
+                          r'|`(?P<code>[^`]+)`|\*\*(?P<strong>.+?)\*\*|__(?P<strong_u>.+?)__'
+                          r'|\*(?P<em>.+?)\*|\b_(?P<em_u>.+?)_\b')
+IMG_SRC_RE = re.compile(r'(<img\b[^>]*?\bsrc=)(["\'])(.*?)\2', re.IGNORECASE)
+URL_SCHEME_RE = re.compile(r'^[A-Za-z][A-Za-z0-9+.-]*:')
+LIST_ITEM_RE = re.compile(r'^\s*[-*+]\s+(.*)$')
+PARA_SPLIT_RE = re.compile(r'\n\s*\n')
+NUM_RANGE_RE = re.compile(r'^\[\s*([^,\]]+?)\s*,\s*([^,\]]+?)\s*\]$')
+NUM_TOL_RE = re.compile(r'^(\S+)\s*\+-\s*([\d.]+)(%?)$')
+
+def latex_image(tex: str) -> str:
+    """Canvas equation image for inline LaTeX, as text2qti renders `$...$`."""
+    src = urllib.parse.quote(urllib.parse.quote(tex, safe=''), safe='')
+    alt = html.escape(tex)
+    return (f'<img class="equation_image" title="{alt}" src="/equation_images/{src}?scale=1" '
+            f'alt="LaTeX: {alt}" data-equation-content="{alt}" />')
+
+def inline_html(text: str) -> str:
+    """Escape `text`, rendering images, code spans, bold, and italics (built-in renderer only).
+    Raw HTML tags and entities pass through unchanged, as with the `markdown` package."""
+    out: List[str] = []
+    pos = 0
+    for m in INLINE_MD_RE.finditer(text):
+        out.append(html.escape(text[pos:m.start()], quote=False))
+        g = m.groupdict()
+        if g["raw"] is not None:
+            out.append(g["raw"])
+        elif g["src"] is not None:
+            out.append(f'<img src="{html.escape(g["src"])}" alt="{html.escape(g["alt"])}" />')
+        elif g["code"] is not None:
+            out.append(f"<code>{html.escape(g['code'], quote=False)}</code>")
+        elif g["strong"] is not None or g["strong_u"] is not None:
+            out.append(f"<strong>{inline_html(g['strong'] if g['strong'] is not None else g['strong_u'])}</strong>")
+        else:
+            out.append(f"<em>{inline_html(g['em'] if g['em'] is not None else g['em_u'])}</em>")
+        pos = m.end()
+    out.append(html.escape(text[pos:], quote=False))
+    return "".join(out)
+
+def basic_html(text: str) -> str:
+    """Paragraphs and bullet lists for when the `markdown` package is not installed."""
+    blocks = []
+    for para in PARA_SPLIT_RE.split(text):
+        lines = para.strip('\n').splitlines()
+        if all(LIST_ITEM_RE.match(ln) for ln in lines):
+            blocks.append("<ul>" + "".join(f"<li>{inline_html(LIST_ITEM_RE.match(ln).group(1))}</li>"
+                                           for ln in lines) + "</ul>")
+        else:
+            blocks.append("<p>" + "\n".join(inline_html(ln.strip()) for ln in lines) + "</p>")
+    return "\n".join(blocks)
+
+class QTIImages:
+    """Local images referenced by a quiz, to be packaged into its QTI ZIP as text2qti does.
+    rewrite() points each relative <img src> (resolved against `base_dir`) at its copy in the
+    ZIP; `files` maps those ZIP paths to the files to store. A missing image raises ValueError."""
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        self.files: Dict[str, str] = {}
+        self.names: Dict[str, str] = {}  # resolved file path -> ZIP path
+
+    def zip_path(self, src: str) -> str:
+        path = os.path.normpath(os.path.join(self.base_dir, urllib.parse.unquote(src)))
+        name = self.names.get(path)
+        if name is None:
+            if not os.path.isfile(path):
+                raise ValueError(f"Image '{src}' not found (looked for {path}).")
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()[:16]
+            name = f"images/{digest}{os.path.splitext(path)[1].lower()}"
+            self.names[path] = name
+            self.files[name] = path
+        return name
+
+    def rewrite(self, body: str) -> str:
+        def sub(m: "re.Match[str]") -> str:
+            src = html.unescape(m.group(3))
+            if not src or URL_SCHEME_RE.match(src) or src.startswith(("/", "#")):
+                return m.group(0)  # remote, absolute, or data: URL
+            new = "%24IMS-CC-FILEBASE%24/" + urllib.parse.quote(self.zip_path(src))
+            return f"{m.group(1)}{m.group(2)}{new}{m.group(2)}"
+        return IMG_SRC_RE.sub(sub, body)
+
+def md_to_html(lines: List[str], images: Optional[QTIImages] = None) -> str:
+    """HTML for a block of Markdown lines: comments dropped, `$...$` (outside code) as Canvas
+    equation images, and local images pointed into the ZIP when `images` is given.
+    Uses the `markdown` package when installed, else basic_html."""
+    text = HTML_COMMENT_RE.sub('', "\n".join(lines)).strip()
+    if not text:
+        return ''
+    maths: List[str] = []
+
+    def stash(m: "re.Match[str]") -> str:
+        if m.group(3) is None:
+            return m.group(0)  # code
+        maths.append(m.group(3))
+        return f"MD2QTIMATH{len(maths) - 1}Z"
+
+    text = MATH_OR_CODE_RE.sub(stash, text)
+    body = markdown_lib.markdown(text) if markdown_lib is not None else basic_html(text)
+    if images is not None:
+        body = images.rewrite(body)
+    return MATH_SLOT_RE.sub(lambda m: latex_image(maths[int(m.group(1))]), body) if maths else body
+
+def numeric_bounds(spec: str) -> Tuple[Optional[float], float, float]:
+    """(exact value or None, minimum, maximum) accepted by a num question's answer spec."""
+    spec = spec.strip()
+    try:
+        m = NUM_RANGE_RE.match(spec)
+        if m:
+            return None, float(m.group(1)), float(m.group(2))
+        m = NUM_TOL_RE.match(spec)
+        if m:
+            val, tol = float(m.group(1)), float(m.group(2))
+            if m.group(3):
+                tol = abs(val) * tol / 100
+            return val, val - tol, val + tol
+        val = float(spec)
+        return val, val, val
+    except ValueError:
+        raise ValueError(f"Unsupported numeric answer '{spec}' for a QTI ZIP "
+                         "(use 'x', 'x +- tol', 'x +- p%', or '[min, max]').") from None
+
+def qti_ident(*parts: str) -> str:
+    """Stable QTI identifier, so rebuilding an unchanged quiz yields identical XML."""
+    return "g" + hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+def _mattext(html_text: str) -> str:
+    return f'<material><mattext texttype="text/html">{html.escape(html_text, quote=False)}</mattext></material>'
+
+def _meta_field(label: str, entry: str) -> str:
+    return f"<qtimetadatafield><fieldlabel>{label}</fieldlabel><fieldentry>{entry}</fieldentry></qtimetadatafield>"
+
+def _respcondition(cond: str, cont: str, feedback: Optional[str] = None, score: bool = False) -> str:
+    out = f'<respcondition continue="{cont}"><conditionvar>{cond}</conditionvar>'
+    if score:
+        out += '<setvar action="Set" varname="SCORE">100</setvar>'
+    if feedback:
+        out += f'<displayfeedback feedbacktype="Response" linkrefid="{feedback}"/>'
+    return out + '</respcondition>'
+
+def _itemfeedback(ident: str, html_text: str) -> str:
+    return f'<itemfeedback ident="{ident}"><flow_mat>{_mattext(html_text)}</flow_mat></itemfeedback>'
+
+def _correct_condition(q: Item, choice_ids: List[str]) -> str:
+    """QTI condition matching a fully correct response to an mc/ma/num/fill item."""
+    if q.kind == 'mc':
+        cid = next(cid for cid, ch in zip(choice_ids, q.choices) if ch.correct)
+        return f'<varequal respident="response1">{cid}</varequal>'
+    if q.kind == 'ma':
+        conds = [f'<varequal respident="response1">{cid}</varequal>' if ch.correct
+                 else f'<not><varequal respident="response1">{cid}</varequal></not>'
+                 for cid, ch in zip(choice_ids, q.choices)]
+        return "<and>" + "".join(conds) + "</and>"
+    if q.kind == 'num':
+        exact, lo, hi = numeric_bounds(q.numeric_spec)
+        rng = f'<and><vargte respident="response1">{lo!r}</vargte><varlte respident="response1">{hi!r}</varlte></and>'
+        if exact is None:
+            return rng
+        return f'<or><varequal respident="response1">{exact!r}</varequal>{rng}</or>'
+    return "".join(f'<varequal respident="response1">{html.escape(ans, quote=False)}</varequal>'
+                   for ans in q.fill_answers)
+
+def qti_item_xml(q: Item, ident: str, idx: int, images: Optional[QTIImages] = None) -> str:
+    """One <item> element of the QTI assessment for `q`."""
+    if q.kind == 'text':
+        title, points = q.title, 0.0
+    else:
+        title, points = TITLE_NUM_RE.sub('', q.title).strip() or f"Question {idx}", q.points
+    choice_ids = [f"{ident}_{i}" for i in range(len(q.choices))]
+    out = [f'<item ident="{ident}" title="{html.escape(title)}">',
+           "<itemmetadata><qtimetadata>",
+           _meta_field("question_type", QTI_TYPES[q.kind]),
+           _meta_field("points_possible", repr(float(points)))]
+    if choice_ids:
+        out.append(_meta_field("original_answer_ids", ",".join(choice_ids)))
+    out.append("</qtimetadata></itemmetadata>")
+    out.append("<presentation>" + _mattext(md_to_html(q.prompt_lines, images)))
+    if q.kind in ('mc', 'ma'):
+        card = "Single" if q.kind == 'mc' else "Multiple"
+        out.append(f'<response_lid ident="response1" rcardinality="{card}"><render_choice>')
+        for cid, ch in zip(choice_ids, q.choices):
+            out.append(f'<response_label ident="{cid}">{_mattext(md_to_html(ch.text_lines, images))}</response_label>')
+        out.append("</render_choice></response_lid>")
+    elif q.kind == 'num':
+        out.append('<response_str ident="response1" rcardinality="Single"><render_fib fibtype="Decimal">'
+                   '<response_label ident="answer1"/></render_fib></response_str>')
+    elif q.kind in ('fill', 'essay'):
+        out.append('<response_str ident="response1" rcardinality="Single"><render_fib>'
+                   '<response_label ident="answer1" rshuffle="No"/></render_fib></response_str>')
+    out.append("</presentation>")
+    if q.kind == 'text':
+        out.append("</item>")
+        return "\n".join(out)
+
+    # Question-level feedback; information blocks are shown with the general feedback
+    fb: Dict[str, str] = {}
+    for block in q.q_feedback:
+        kind = 'general' if block.kind == 'information' else block.kind
+        fb[kind] = "\n".join(filter(None, (fb.get(kind), md_to_html(block.lines, images))))
+    choice_fb = [(cid, md_to_html(ch.feedback_lines, images)) for cid, ch in zip(choice_ids, q.choices)
+                 if ch.feedback_lines]
+
+    out.append('<resprocessing><outcomes><decvar maxvalue="100" minvalue="0" varname="SCORE" vartype="Decimal"/></outcomes>')
+    if fb.get('general'):
+        out.append(_respcondition("<other/>", "Yes", "general_fb"))
+    for cid, _ in choice_fb:
+        out.append(_respcondition(f'<varequal respident="response1">{cid}</varequal>', "Yes", f"{cid}_fb"))
+    if q.kind in ('mc', 'ma', 'num', 'fill'):
+        out.append(_respcondition(_correct_condition(q, choice_ids), "No",
+                                  "correct_fb" if fb.get('correct') else None, score=True))
+        if fb.get('incorrect'):
+            out.append(_respcondition("<other/>", "Yes", "general_incorrect_fb"))
+    out.append("</resprocessing>")
+    for kind, fb_ident in (('general', 'general_fb'), ('correct', 'correct_fb'), ('incorrect', 'general_incorrect_fb')):
+        if fb.get(kind):
+            out.append(_itemfeedback(fb_ident, fb[kind]))
+    for cid, html_text in choice_fb:
+        out.append(_itemfeedback(f"{cid}_fb", html_text))
+    out.append("</item>")
+    return "\n".join(out)
+
+QTI_ASSESSMENT_HEAD = """<?xml version="1.0" encoding="UTF-8"?>
+<questestinterop xmlns="http://www.imsglobal.org/xsd/ims_qtiasiv1p2" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://www.imsglobal.org/xsd/ims_qtiasiv1p2 http://www.imsglobal.org/xsd/ims_qtiasiv1p2p1.xsd">
+<assessment ident="{ident}" title="{title}">
+<qtimetadata>{maxattempts}</qtimetadata>
+<section ident="root_section">
+"""
+
+QTI_ASSESSMENT_TAIL = """</section>
+</assessment>
+</questestinterop>
+"""
+
+QTI_META = """<?xml version="1.0" encoding="UTF-8"?>
+<quiz identifier="{ident}" xmlns="http://canvas.instructure.com/xsd/cccv1p0" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://canvas.instructure.com/xsd/cccv1p0 https://canvas.instructure.com/xsd/cccv1p0.xsd">
+<title>{title}</title>
+<description>{description}</description>
+<shuffle_answers>{shuffle_answers}</shuffle_answers>
+<scoring_policy>keep_highest</scoring_policy>
+<hide_results></hide_results>
+<quiz_type>assignment</quiz_type>
+<points_possible>{points}</points_possible>
+<require_lockdown_browser>false</require_lockdown_browser>
+<require_lockdown_browser_for_results>false</require_lockdown_browser_for_results>
+<require_lockdown_browser_monitor>false</require_lockdown_browser_monitor>
+<lockdown_browser_monitor_data/>
+<show_correct_answers>{show_correct_answers}</show_correct_answers>
+<anonymous_submissions>false</anonymous_submissions>
+<could_be_locked>false</could_be_locked>
+<allowed_attempts>1</allowed_attempts>
+<one_question_at_a_time>{one_question_at_a_time}</one_question_at_a_time>
+<cant_go_back>{cant_go_back}</cant_go_back>
+<available>false</available>
+<one_time_results>false</one_time_results>
+<show_correct_answers_last_attempt>false</show_correct_answers_last_attempt>
+<only_visible_to_overrides>false</only_visible_to_overrides>
+<module_locked>false</module_locked>
+<assignment_overrides>
+</assignment_overrides>
+</quiz>
+"""
+
+QTI_MANIFEST = """<?xml version="1.0" encoding="UTF-8"?>
+<manifest identifier="{manifest}" xmlns="http://www.imsglobal.org/xsd/imsccv1p1/imscp_v1p1" xmlns:lom="http://ltsc.ieee.org/xsd/imsccv1p1/LOM/resource" xmlns:imsmd="http://www.imsglobal.org/xsd/imsmd_v1p2" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://www.imsglobal.org/xsd/imsccv1p1/imscp_v1p1 http://www.imsglobal.org/xsd/imscp_v1p1.xsd http://ltsc.ieee.org/xsd/imsccv1p1/LOM/resource http://www.imsglobal.org/profile/cc/ccv1p1/LOM/ccv1p1_lomresource_v1p0.xsd http://www.imsglobal.org/xsd/imsmd_v1p2 http://www.imsglobal.org/xsd/imsmd_v1p2p2.xsd">
+<metadata>
+<schema>IMS Content</schema>
+<schemaversion>1.1.3</schemaversion>
+</metadata>
+<organizations/>
+<resources>
+<resource identifier="{ident}" type="imsqti_xmlv1p2">
+<file href="{ident}/{ident}.xml"/>
+<dependency identifierref="{meta}"/>
+</resource>
+<resource identifier="{meta}" type="associatedcontent/imscc_xmlv1p1/learning-application-resource" href="{ident}/assessment_meta.xml">
+<file href="{ident}/assessment_meta.xml"/>
+</resource>
+{images}</resources>
+</manifest>
+"""
 
-    return "\n".join(out).rstrip() + "\n"
+def _xml_bool(val: Optional[bool], default: bool) -> str:
+    return "true" if (default if val is None else val) else "false"
 
+QTI_IMAGE_RESOURCE = """<resource identifier="{ident}" type="webcontent" href="{path}">
+<file href="{path}"/>
+</resource>
+"""
+
+def write_qti_assessment(quiz: Quiz, fp: TextIO, ident: str, items: Iterable[Item],
+                         timer: Optional[PhaseTimer] = None, images: Optional[QTIImages] = None) -> float:
+    """Write the QTI assessment XML one item at a time; return the total points."""
+    t = timer or NO_TIMER
+    fp.write(QTI_ASSESSMENT_HEAD.format(ident=ident, title=html.escape(quiz.title),
+                                        maxattempts=_meta_field("cc_maxattempts", "1")))
+    total = 0.0
+    for idx, q in enumerate(items, 1):
+        if q.kind != 'text':
+            total += q.points
+        with t.phase("emit_qti"):
+            xml = qti_item_xml(q, qti_ident(ident, str(idx)), idx, images)
+        profile_checkpoint("emit")
+        with t.phase("write"):
+            fp.write(xml)
+            fp.write("\n")
+    fp.write(QTI_ASSESSMENT_TAIL)
+    return total
+
+def _zip_entry(name: str) -> zipfile.ZipInfo:
+    # fixed timestamp: rebuilding an unchanged quiz gives a byte-identical ZIP
+    info = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+def content_digest(data: Union[str, bytes]) -> str:
+    return hashlib.sha256(data.encode("utf-8") if isinstance(data, str) else data).hexdigest()
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def write_qti_zip(quiz: Quiz, dst: str, items: Optional[Iterable[Item]] = None,
+                  timer: Optional[PhaseTimer] = None, seed: Optional[str] = None,
+                  base_dir: Optional[str] = None) -> None:
+    """Write `quiz` as a Canvas QTI 1.2 ZIP, bypassing text2qti.
+    Items (default quiz.items; any iterable streams them) are rendered and compressed one at
+    a time. The ZIP is built under a temporary name and renamed over `dst` on success.
+    The assessment identifier is derived from `seed` (the source's content_digest or
+    file_digest; default: the absolute path of `dst`), so quizzes that share a title still
+    import as distinct quizzes. Local images are resolved against `base_dir` (default: the
+    current directory) and stored in the ZIP."""
+    ident = qti_ident("assessment", quiz.title, seed if seed is not None else os.path.abspath(dst))
+    meta = qti_ident("assessment_meta", ident)
+    images = QTIImages(base_dir if base_dir is not None else os.curdir)
+    with atomic_output(dst) as tmp:
+        with zipfile.ZipFile(tmp, "w") as zf:
+            with io.TextIOWrapper(zf.open(_zip_entry(f"{ident}/{ident}.xml"), "w"), encoding="utf-8") as fp:
+                total = write_qti_assessment(quiz, fp, ident, quiz.items if items is None else items,
+                                             timer, images)
+            zf.writestr(_zip_entry(f"{ident}/assessment_meta.xml"), QTI_META.format(
+                ident=ident, title=html.escape(quiz.title),
+                description=html.escape(md_to_html(quiz.description_lines, images), quote=False),
+                points=repr(total),
+                shuffle_answers=_xml_bool(quiz.shuffle_answers, False),
+                show_correct_answers=_xml_bool(quiz.show_correct_answers, True),
+                one_question_at_a_time=_xml_bool(quiz.one_question_at_a_time, False),
+                cant_go_back=_xml_bool(quiz.cant_go_back, False)))
+            for name, path in sorted(images.files.items()):
+                with open(path, "rb") as f:
+                    zf.writestr(_zip_entry(name), f.read())
+            zf.writestr(_zip_entry("imsmanifest.xml"), QTI_MANIFEST.format(
+                manifest=qti_ident("manifest", ident), ident=ident, meta=meta,
+                images="".join(QTI_IMAGE_RESOURCE.format(ident=qti_ident("image", ident, name), path=name)
+                               for name in sorted(images.files))))
+
+# ------------------------------ Incremental conversion ------------------------------
+
+class IncrementalConverter:
+    """Convert successive versions of one Markdown quiz, redoing only the H2 sections that changed.
+
+    Each section is keyed by a hash of its raw text (H2 line plus body). An unchanged section
+    reuses its parsed Item and emitted text2qti block; only tokenizing, parsing, and emitting
+    of edited sections is repeated. A reused item numbered by position (no number in its
+    header) is re-emitted only if its position moved. Sections that disappear from the file
+    are forgotten after each conversion. `quiz` holds the Quiz from the latest conversion."""
+
+    def __init__(self):
+        self.sections: Dict[bytes, Tuple[Item, int, str]] = {}
+        self.quiz: Optional[Quiz] = None
+        self.reparsed = 0
+        self.reused = 0
+
+    @staticmethod
+    def section_key(header: str, body: List[str]) -> bytes:
+        # lines never contain "\n", so joining header and body with it is unambiguous
+        return hashlib.blake2b("\n".join([header, *body]).encode("utf-8"), digest_size=16).digest()
+
+    def convert(self, md_text: str) -> str:
+        raw_sections = iter_raw_sections(md_text.splitlines())
+        _, head = next(raw_sections)
+        title, desc_lines, _ = split_sections(tokenize(head))
+
+        sections: Dict[bytes, Tuple[Item, int, str]] = {}
+        items: List[Item] = []
+        blocks: List[str] = []
+        self.reparsed = self.reused = 0
+        line = len(head) + 1  # of the next H2
+        for idx, (header, body) in enumerate(raw_sections, 1):
+            key = self.section_key(header, body)
+            cached = self.sections.get(key) or sections.get(key)
+            if cached is not None:
+                q, emitted_idx, block = cached
+                if emitted_idx != idx and q.kind != 'text' and q.qnum is None:
+                    block = "\n".join(emit_item(q, idx))
+                self.reused += 1
+            else:
+                q = parse_section(H2_RE.match(header).group(1).strip(), tokenize(body), line)
+                block = "\n".join(emit_item(q, idx))
+                self.reparsed += 1
+            sections[key] = (q, idx, block)
+            items.append(q)
+            blocks.append(block)
+            line += 1 + len(body)
+        self.sections = sections
+
+        self.quiz = build_quiz(title, desc_lines, items)
+        return "\n".join(["\n".join(emit_preamble(self.quiz))] + blocks).rstrip() + "\n"
+
+# ------------------------------ Conversion ------------------------------
+
+def write_output(dst: str, text: str) -> None:
+    parent = os.path.dirname(dst)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with open(dst, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def convert_file(src: str, dst: str, keep_text: bool = False, timer: Optional[PhaseTimer] = None) -> Optional[str]:
+    """Convert one Markdown quiz file into a text2qti plaintext file.
+    The conversion is streamed (see stream_file); with `keep_text`, the output is built
+    as one string instead and returned (the rebuild cache stores it)."""
+    if not keep_text:
+        stream_file(src, dst, timer)
+        return None
+    t = timer or NO_TIMER
+    with t.phase("read"):
+        with open(src, "r", encoding="utf-8") as f:
+            md = f.read()
+    out = emit_text2qti(parse_quiz(md, timer), timer)
+    with t.phase("write"):
+        write_output(dst, out)
+    t.add_bytes(os.path.getsize(src), os.path.getsize(dst))
+    return out
+
+@contextlib.contextmanager
+def atomic_output(dst: str) -> Iterator[str]:
+    """Yield a temporary path to write instead of `dst`; it is renamed over `dst` if the
+    block succeeds and removed otherwise, so a failed conversion leaves no partial output."""
+    parent = os.path.dirname(dst)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    tmp = dst + ".part"
+    try:
+        yield tmp
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def stream_file(src: str, dst: str, timer: Optional[PhaseTimer] = None) -> None:
+    """Convert `src` to `dst` one question at a time, never holding the whole quiz in memory.
+    Output goes to a temporary file renamed over `dst` on success, so a quiz that fails
+    validation part-way leaves no partial output behind."""
+    with atomic_output(dst) as tmp:
+        with open(src, "r", encoding="utf-8") as fin, open(tmp, "w", encoding="utf-8") as fout:
+            quiz, items = stream_quiz(fin, timer)
+            write_text2qti(quiz, fout, items, timer)
+    (timer or NO_TIMER).add_bytes(os.path.getsize(src), os.path.getsize(dst))
+
+def zip_file(src: str, dst: str, timer: Optional[PhaseTimer] = None) -> None:
+    """Convert `src` straight to a QTI ZIP at `dst`, streaming questions as stream_file does."""
+    with open(src, "r", encoding="utf-8") as fin:
+        quiz, items = stream_quiz(fin, timer)
+        write_qti_zip(quiz, dst, items, timer, file_digest(src), os.path.dirname(os.path.abspath(src)))
+    (timer or NO_TIMER).add_bytes(os.path.getsize(src), os.path.getsize(dst))
+
+# ------------------------------ text2qti ------------------------------
+
+# Output formats: text2qti plaintext, QTI ZIP from the built-in emitter (--zip),
+# or QTI ZIP built by the text2qti package in-process (--qti).
+OUT_TEXT = "text"
+OUT_ZIP = "zip"
+OUT_QTI = "qti"
+
+@functools.lru_cache(maxsize=None)
+def text2qti_api() -> Optional[Tuple[object, type, type]]:
+    """text2qti's loaded Config plus its Quiz and QTI classes, or None if the package is not
+    installed. Imported once per process, so batch workers pay text2qti's startup only once."""
+    try:
+        from text2qti.config import Config
+        from text2qti.qti import QTI
+        from text2qti.quiz import Quiz as T2Quiz
+    except ImportError:
+        return None
+    config = Config()
+    config.load()
+    return config, T2Quiz, QTI
+
+# Markdown image links outside code (groups 3-4); code blocks and spans (groups 1-2) are skipped
+T2Q_IMAGE_RE = re.compile(r'(?m)^[ \t]*(`{3,}|~{3,})(?s:.*?)^[ \t]*\1|(`+)[^\n]+?\2|'
+                          r'(!\[[^\]\n]*\]\()(<[^>\n]+>|[^)\s]+)')
+
+def absolute_images(text: str, base_dir: str) -> str:
+    """`text` with relative image paths made absolute against `base_dir`. text2qti reads
+    images relative to the working directory; this lets it find them without os.chdir()."""
+    def sub(m: "re.Match[str]") -> str:
+        if m.group(3) is None:
+            return m.group(0)
+        path = m.group(4)
+        if path.startswith("<"):
+            path = path[1:-1]
+        if URL_SCHEME_RE.match(path) or path.startswith("~") or os.path.isabs(path):
+            return m.group(0)
+        path = os.path.join(base_dir, path).replace(os.sep, "/")
+        return m.group(3) + (f"<{path}>" if " " in path else path)
+    return T2Q_IMAGE_RE.sub(sub, text)
+
+def build_qti(text: str, zip_path: str, source_name: str) -> None:
+    """Build a QTI ZIP from text2qti plaintext held in memory, with the text2qti package.
+    Relative image paths are resolved against the source's directory, as the text2qti
+    command does, but without changing the working directory, so this is safe to call
+    from several threads."""
+    config, T2Quiz, QTI = text2qti_api()
+    text = absolute_images(text, os.path.dirname(os.path.abspath(source_name)))
+    try:
+        QTI(T2Quiz(text, config=config, source_name=source_name)).save(os.path.abspath(zip_path))
+    except Exception as e:  # text2qti's own error types; report them like the executable's
+        raise RuntimeError(str(e) or type(e).__name__) from e
+
+def run_text2qti(path: str, text: Optional[str] = None) -> None:
+    """Build the QTI ZIP next to a text2qti file, as the droplet does with the `text2qti` executable.
+    Uses the text2qti package in-process when it is importable (`text`, if given, saves rereading
+    the file); otherwise runs the executable."""
+    if text2qti_api() is not None:
+        if text is None:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        build_qti(text, os.path.splitext(path)[0] + ".zip", path)
+        return
+    proc = subprocess.run(["text2qti", path], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError((proc.stderr or proc.stdout).strip() or f"text2qti exited with status {proc.returncode}")
+
+def qti_file(src: str, dst: str, timer: Optional[PhaseTimer] = None) -> None:
+    """Convert `src` to text2qti plaintext in memory and build the QTI ZIP at `dst` from it
+    with the text2qti package; no intermediate .txt file is written."""
+    t = timer or NO_TIMER
+    with t.phase("read"):
+        with open(src, "r", encoding="utf-8") as f:
+            md = f.read()
+    text = emit_text2qti(parse_quiz(md, timer), timer)
+    with t.phase("text2qti"):
+        with atomic_output(dst) as tmp:
+            build_qti(text, tmp, src)
+    t.add_bytes(os.path.getsize(src), os.path.getsize(dst))
+
+def write_format(src: str, dst: str, out_format: str, keep_text: bool = False,
+                 timer: Optional[PhaseTimer] = None) -> Optional[str]:
+    """Convert `src` to `dst` in `out_format`; returns the text2qti text when `keep_text` is set."""
+    if out_format == OUT_ZIP:
+        zip_file(src, dst, timer)
+    elif out_format == OUT_QTI:
+        qti_file(src, dst, timer)
+    else:
+        return convert_file(src, dst, keep_text, timer)
+    return None
+
+# ------------------------------ Rebuild cache ------------------------------
+
+CACHE_FILENAME = ".md2t2qti-cache.json"
+DEFAULT_CACHE_MB = 64
+
+def referenced_images(md: str, base_dir: str) -> List[str]:
+    """Local files a quiz may embed as images: Markdown image links and <img src> attributes,
+    resolved against `base_dir`, minus URLs. Code is not excluded; a spare hash is harmless."""
+    paths = set()
+    for m in T2Q_IMAGE_RE.finditer(md):
+        if m.group(4) is not None:
+            paths.add(m.group(4)[1:-1] if m.group(4).startswith("<") else m.group(4))
+    paths.update(html.unescape(m.group(3)) for m in IMG_SRC_RE.finditer(md))
+    return sorted(os.path.normpath(os.path.join(base_dir, urllib.parse.unquote(p))) for p in paths
+                  if p and not URL_SCHEME_RE.match(p) and not p.startswith("#"))
+
+def converter_fingerprint() -> str:
+    """Version string plus a hash of this script, so edited converters never reuse stale output."""
+    with open(os.path.abspath(__file__), "rb") as f:
+        return f"{__version__}:{hashlib.sha256(f.read()).hexdigest()[:16]}"
+
+class ConversionCache:
+    """JSON manifest mapping (converter fingerprint, input content hash) to emitted output.
+
+    - `entries`: content key -> emitted text, evicted least-recently-used first once the
+      stored text exceeds `max_bytes`.
+    - `outputs`: output path -> (content key, size, mtime) of the file last written there,
+      so an unchanged input whose output is still on disk is skipped without rewriting it.
+    A manifest written by a different converter fingerprint is discarded on load."""
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_CACHE_MB * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.fingerprint = converter_fingerprint()
+        self.clock = 0
+        self.entries: Dict[str, Dict[str, object]] = {}
+        self.outputs: Dict[str, Dict[str, object]] = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("converter") == self.fingerprint:
+            self.clock = data.get("clock", 0)
+            self.entries = data.get("entries", {})
+            self.outputs = data.get("outputs", {})
+
+    @staticmethod
+    def key(content: bytes, out_format: str = OUT_TEXT, chain_text2qti: bool = False,
+            base_dir: Optional[str] = None) -> str:
+        """Hash of an input's content and of what is built from it. A ZIP (the ZIP formats,
+        or the one text2qti builds from the text) embeds the quiz's images, so when `base_dir`
+        is given their content under it is hashed too and editing one invalidates the ZIP."""
+        h = hashlib.sha256(content)
+        if out_format != OUT_TEXT:
+            h.update(b"\0" + out_format.encode())  # --zip and --qti both write .zip files
+        elif chain_text2qti:
+            h.update(b"\0text2qti")
+        else:
+            return h.hexdigest()
+        if base_dir is not None:
+            for path in referenced_images(content.decode("utf-8", "replace"), base_dir):
+                h.update(b"\0" + path.encode())
+                try:
+                    with open(path, "rb") as f:
+                        h.update(hashlib.sha256(f.read()).digest())
+                except OSError:
+                    h.update(b"\0missing")
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.clock += 1
+        entry["used"] = self.clock
+        return entry["text"]
+
+    def put(self, key: str, text: str) -> None:
+        self.clock += 1
+        self.entries[key] = {"text": text, "size": len(text), "used": self.clock}
+
+    def is_current(self, dst: str, key: str) -> bool:
+        """True if `dst` still holds exactly what was last written there for `key`."""
+        rec = self.outputs.get(os.path.abspath(dst))
+        if rec is None or rec["key"] != key:
+            return False
+        try:
+            st = os.stat(dst)
+        except OSError:
+            return False
+        return st.st_size == rec["size"] and st.st_mtime_ns == rec["mtime_ns"]
+
+    def record_output(self, dst: str, key: str) -> None:
+        st = os.stat(dst)
+        self.outputs[os.path.abspath(dst)] = {"key": key, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    def save(self) -> None:
+        total = sum(e["size"] for e in self.entries.values())
+        if total > self.max_bytes:
+            for key in sorted(self.entries, key=lambda k: self.entries[k]["used"]):
+                total -= self.entries.pop(key)["size"]
+                if total <= self.max_bytes:
+                    break
+        self.outputs = {dst: rec for dst, rec in self.outputs.items() if os.path.exists(dst)}
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"converter": self.fingerprint, "clock": self.clock,
+                       "entries": self.entries, "outputs": self.outputs}, f)
+        os.replace(tmp, self.path)
+
+# ------------------------------ Batch conversion ------------------------------
+
+INPUT_EXT = ".md"
+OUTPUT_EXT = ".txt"
+# shared:begin batch-paths
+GLOB_MAGIC_RE = re.compile(r'[*?[]')
+
+def is_glob(path: str) -> bool:
+    """True if `path` is to be expanded as a glob pattern: an existing file is always taken
+    literally, so a quiz named "Quiz [v2]" or "q?" is not mistaken for a pattern."""
+    return GLOB_MAGIC_RE.search(path) is not None and not os.path.isfile(path)
+
+def find_inputs(paths: List[str], ext: str = INPUT_EXT) -> List[Tuple[str, str]]:
+    """Expand files, directories, and glob patterns into (path, relative_path) pairs.
+    Directories are walked recursively for files ending in `ext`; relative paths are
+    taken from the directory (or from the non-glob prefix of a pattern)."""
+    found: List[Tuple[str, str]] = []
+    seen = set()
+
+    def add(path: str, root: str) -> None:
+        key = os.path.abspath(path)
+        if key in seen:
+            return
+        seen.add(key)
+        found.append((path, os.path.relpath(path, root) if root else os.path.basename(path)))
+
+    for p in paths:
+        if os.path.isdir(p):
+            for dirpath, dirnames, filenames in os.walk(p):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    if name.lower().endswith(ext):
+                        add(os.path.join(dirpath, name), p)
+        elif is_glob(p):
+            prefix = []
+            for part in p.replace(os.sep, "/").split("/"):
+                if GLOB_MAGIC_RE.search(part):
+                    break
+                prefix.append(part)
+            root = "/".join(prefix) or os.curdir
+            for match in sorted(glob.glob(p, recursive=True)):
+                if os.path.isfile(match):
+                    add(match, root)
+        else:
+            add(p, "")
+    return found
+
+def output_path(src: str, rel: str, outdir: Optional[str], ext: str = OUTPUT_EXT) -> str:
+    """Output file for `src`: next to it, or at `rel` under `outdir`, with extension `ext`."""
+    base = os.path.join(outdir, rel) if outdir else src
+    return os.path.splitext(base)[0] + ext
+
+def duplicate_outputs(jobs: List[Tuple[str, str]]) -> Dict[str, List[str]]:
+    """Output paths that more than one (src, dst) job would write, each with its inputs.
+    Inputs under different roots (or two files with the same name) can map to the same
+    output under --outdir; converting them all would silently keep only the last."""
+    by_dst: Dict[str, List[str]] = {}
+    for src, dst in jobs:
+        by_dst.setdefault(os.path.normcase(os.path.abspath(dst)), []).append(src)
+    return {dst: srcs for dst, srcs in by_dst.items() if len(srcs) > 1}
+# shared:end batch-paths
+
+def default_cache_path(inputs: List[Tuple[str, str]], outdir: Optional[str]) -> str:
+    """Where the cache manifest goes by default: next to the outputs, that is in `outdir`,
+    or else in the deepest directory containing every input's root (a directory argument,
+    a file's own directory, or a pattern's non-glob prefix; see find_inputs)."""
+    if outdir:
+        return os.path.join(outdir, CACHE_FILENAME)
+    roots = []
+    for src, rel in inputs:
+        root = os.path.abspath(src)
+        for _ in os.path.normpath(rel).split(os.sep):
+            root = os.path.dirname(root)
+        roots.append(root)
+    return os.path.join(os.path.commonpath(roots), CACHE_FILENAME)
+
+def _chain_text2qti(dst: str, text: Optional[str], timer: Optional[PhaseTimer]) -> Optional[str]:
+    """Run text2qti on a text output just written; returns the error message if it fails."""
+    try:
+        with (timer or NO_TIMER).phase("text2qti"):
+            run_text2qti(dst, text)
+    except RuntimeError as e:
+        return f"text2qti: {e}"
+    return None
+
+def _convert_job(job: Tuple[str, str, bool, str, bool, bool]) -> Dict[str, object]:
+    """Process-pool worker: convert one file to the given output format, then run text2qti on it
+    if `chain_text2qti` is set, and report the outcome instead of raising. The emitted text is
+    returned under "text" when the caller asks for it (for caching), and a PhaseTimer record
+    under "timings" when `timings` is set (for a failure, of the phases it reached)."""
+    src, dst, keep_text, out_format, timings, chain_text2qti = job
+    timer = PhaseTimer() if timings else None
+    try:
+        with profiling(src):
+            text = write_format(src, dst, out_format, keep_text, timer)
+        error = _chain_text2qti(dst, text, timer) if chain_text2qti else None
+        rec: Dict[str, object] = {"input": src, "output": dst, "ok": error is None, "cached": False,
+                                  "error": error}
+    except Exception as e:  # report every failure; one bad quiz must not stop the batch
+        rec = {"input": src, "output": dst, "ok": False, "cached": False, "error": f"{type(e).__name__}: {e}"}
+    if keep_text and rec["ok"]:
+        rec["text"] = text
+    if timer is not None:
+        rec["timings"] = timer.record()
+    return rec
+
+def batch_convert(jobs: List[Tuple[str, str]], workers: Optional[int] = None,
+                  cache: Optional[ConversionCache] = None, out_format: str = OUT_TEXT,
+                  timings: bool = False, chain_text2qti: bool = False) -> List[Dict[str, object]]:
+    """Convert (src, dst) pairs in a process pool; return one result record per job, in order.
+    `workers` defaults to the number of CPUs; 1 converts in this process.
+    With `chain_text2qti`, text2qti builds a QTI ZIP from every text output that is written.
+    With a cache, inputs whose content is unchanged are resolved here without parsing:
+    their output is left alone if still current, or rewritten from the cached text.
+    For the ZIP formats (OUT_ZIP, OUT_QTI) the cache only skips inputs whose ZIP is still
+    current, as ZIPs are not stored in it. The cache key covers `chain_text2qti` and, when
+    a ZIP is built, the images the quiz refers to (see ConversionCache.key). With `timings`, every record carries a PhaseTimer
+    record under "timings" (see aggregate_timings): a cached one times reading and hashing
+    the input ("read", "hash") and any rewrite ("write")."""
+    results: List[Optional[Dict[str, object]]] = [None] * len(jobs)
+    keys: Dict[int, str] = {}
+    pending: List[int] = []
+
+    def cached(src: str, dst: str, timer: Optional[PhaseTimer]) -> Dict[str, object]:
+        rec: Dict[str, object] = {"input": src, "output": dst, "ok": True, "cached": True, "error": None}
+        if timer is not None:
+            rec["timings"] = timer.record()
+        return rec
+
+    for idx, (src, dst) in enumerate(jobs):
+        if cache is None:
+            pending.append(idx)
+            continue
+        timer = PhaseTimer() if timings else None
+        t = timer or NO_TIMER
+        try:
+            with t.phase("read"):
+                with open(src, "rb") as f:
+                    data = f.read()
+        except OSError:
+            pending.append(idx)  # let the worker report the read error
+            continue
+        with t.phase("hash"):
+            key = cache.key(data, out_format, chain_text2qti, os.path.dirname(os.path.abspath(src)))
+        keys[idx] = key
+        t.add_bytes(len(data))
+        if cache.is_current(dst, key) and (not chain_text2qti
+                                           or os.path.exists(os.path.splitext(dst)[0] + ".zip")):
+            cache.get(key)  # refresh recency
+            results[idx] = cached(src, dst, timer)
+            continue
+        text = cache.get(key) if out_format == OUT_TEXT else None
+        if text is None:
+            pending.append(idx)
+            continue
+        with t.phase("write"):
+            write_output(dst, text)
+        t.add_bytes(bytes_out=os.path.getsize(dst))
+        error = _chain_text2qti(dst, text, timer) if chain_text2qti else None
+        results[idx] = cached(src, dst, timer)
+        if error is not None:
+            results[idx].update(ok=False, cached=False, error=error)
+            continue
+        cache.record_output(dst, key)
+
+    work = [(jobs[idx][0], jobs[idx][1], idx in keys and out_format == OUT_TEXT, out_format, timings,
+             chain_text2qti) for idx in pending]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(work)))
+    if workers == 1:
+        done = [_convert_job(job) for job in work]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(_convert_job, work, chunksize=max(1, len(work) // (workers * 4))))
+
+    for idx, rec in zip(pending, done):
+        text = rec.pop("text", None)
+        if rec["ok"] and idx in keys:
+            if text is not None:
+                cache.put(keys[idx], text)
+            cache.record_output(jobs[idx][1], keys[idx])
+        results[idx] = rec
+    if cache is not None:
+        cache.save()
+    return results
+
+def report_batch(results: List[Dict[str, object]], summary_path: Optional[str] = None) -> int:
+    """Print a per-file line and a total to stderr, optionally write a JSON summary.
+    Returns the number of failures."""
+    failed = 0
+    for r in results:
+        if r["ok"]:
+            status = "cached" if r.get("cached") else "ok"
+            print(f"{status:<7}{r['input']} -> {r['output']}", file=sys.stderr)
+        else:
+            failed += 1
+            print(f"FAIL   {r['input']}: {r['error']}", file=sys.stderr)
+    print(f"Converted {len(results) - failed} of {len(results)} file(s); {failed} failed.", file=sys.stderr)
+    if summary_path:
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump({"converted": len(results) - failed, "failed": failed, "files": results}, f, indent=2)
+            f.write("\n")
+    return failed
+
+
+# ------------------------------ Watch mode ------------------------------
+
+WATCH_RESCAN_SECS = 2.0  # how often directory/glob inputs are re-expanded to pick up new files
+
+# shared:begin file-signature
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+# shared:end file-signature
+
+def watch(find_jobs: Callable[[], List[Tuple[str, str]]], interval: float = 0.1,
+          debounce: float = 0.2, chain_text2qti: bool = False, out_format: str = OUT_TEXT) -> None:
+    """Keep converting (src, dst) pairs as their sources change, until interrupted.
+
+    Sources are polled every `interval` seconds; a changed file is reconverted once its
+    size and mtime have been stable for `debounce` seconds, so a burst of saves costs one
+    conversion. Each source keeps an IncrementalConverter, so only edited questions are
+    reparsed, and the output is rewritten only when its text changes (for the ZIP formats,
+    the ZIP is rebuilt instead). `find_jobs` is called again every WATCH_RESCAN_SECS to
+    pick up new files."""
+    converters: Dict[str, IncrementalConverter] = {}
+    written: Dict[str, str] = {}
+    done: Dict[str, Optional[Tuple[int, int]]] = {}     # signature last converted
+    pending: Dict[str, Tuple[Tuple[int, int], float]] = {}  # signature, first seen
+    jobs = find_jobs()
+    rescanned = time.monotonic()
+
+    def convert(src: str, dst: str) -> None:
+        t0 = time.perf_counter()
+        try:
+            with open(src, "r", encoding="utf-8") as f:
+                md = f.read()
+            conv = converters.setdefault(src, IncrementalConverter())
+            out = conv.convert(md)
+            if written.get(dst) != out:
+                if out_format == OUT_ZIP:
+                    write_qti_zip(conv.quiz, dst, seed=content_digest(md),
+                                  base_dir=os.path.dirname(os.path.abspath(src)))
+                elif out_format == OUT_QTI:
+                    with atomic_output(dst) as tmp:
+                        build_qti(out, tmp, src)
+                else:
+                    write_output(dst, out)
+                    if chain_text2qti:
+                        run_text2qti(dst, out)
+                written[dst] = out
+        except Exception as e:  # keep watching; the author fixes the file and saves again
+            print(f"FAIL   {src}: {type(e).__name__}: {e}", file=sys.stderr)
+            return
+        ms = (time.perf_counter() - t0) * 1000
+        print(f"ok     {src} -> {dst} ({conv.reparsed} of {conv.reparsed + conv.reused} "
+              f"question(s) reparsed, {ms:.0f} ms)", file=sys.stderr)
+
+    for src, dst in jobs:
+        done[src] = _file_signature(src)
+        convert(src, dst)
+    print(f"Watching {len(jobs)} file(s); press Ctrl-C to stop.", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(interval)
+            now = time.monotonic()
+            if now - rescanned >= WATCH_RESCAN_SECS:
+                jobs = find_jobs()
+                rescanned = now
+            for src, dst in jobs:
+                sig = _file_signature(src)
+                if sig is None or sig == done.get(src):
+                    pending.pop(src, None)
+                    continue
+                seen = pending.get(src)
+                if seen is None or seen[0] != sig:
+                    pending[src] = (sig, now)  # new change: (re)start the debounce window
+                    continue
+                if now - seen[1] >= debounce:
+                    del pending[src]
+                    done[src] = sig
+                    convert(src, dst)
+    except KeyboardInterrupt:
+        pass
 
 def main():
     ap = argparse.ArgumentParser(description="Convert Markdown quiz to text2qti plaintext.")
-    ap.add_argument("input", help="Input Markdown file")
+    ap.add_argument("input", nargs="+",
+                    help="Input Markdown file; several files, directories, or glob patterns convert in batch mode")
     ap.add_argument("-o", "--output", help="Output text2qti plaintext file (default: stdout)")
+    ap.add_argument("--outdir", help="Batch mode: write outputs here, mirroring the input tree (default: next to each input)")
+    ap.add_argument("-j", "--jobs", type=int, default=None, help="Batch mode: worker processes (default: CPU count)")
+    ap.add_argument("--summary", help="Batch mode: write a JSON per-file success/failure summary here")
+    ap.add_argument("--cache", help=f"Rebuild cache manifest (batch default: {CACHE_FILENAME} in --outdir, or else next to the inputs)")
+    ap.add_argument("--cache-size", type=float, default=DEFAULT_CACHE_MB, help="Maximum cached output in MB (default: %(default)s)")
+    ap.add_argument("--no-cache", action="store_true", help="Always reconvert; neither read nor update the cache")
+    ap.add_argument("--watch", action="store_true", help="Stay running and reconvert inputs whenever they change")
+    ap.add_argument("--debounce", type=float, default=0.2,
+                    help="Watch mode: seconds a file must stay unchanged before reconverting (default: %(default)s)")
+    ap.add_argument("--text2qti", action="store_true",
+                    help="Run text2qti on each output file to build the QTI ZIP (in-process if the package is importable)")
+    ap.add_argument("--zip", action="store_true",
+                    help="Write a QTI ZIP directly instead of text2qti plaintext (text2qti not needed); "
+                         "a single input defaults to INPUT.zip")
+    ap.add_argument("--qti", action="store_true",
+                    help="Build the QTI ZIP with the text2qti Python package in-process, without an "
+                         "intermediate .txt file; a single input defaults to INPUT.zip")
+    ap.add_argument("--timings", nargs="?", const="-", metavar="PATH",
+                    help="Record wall/CPU time per phase, item counts, and sizes as JSON on stderr, or in PATH; "
+                         "batch mode aggregates them and lists the slowest files. Files the cache "
+                         "resolves are timed for reading and hashing (counted as 'cached'), failed "
+                         "files up to the failure (counted as 'failed')")
     args = ap.parse_args()
-
-    with open(args.input, "r", encoding="utf-8") as f:
-        md = f.read()
-    quiz = parse_quiz(md)
-    out = emit_text2qti(quiz)
-    if args.output:
-        with open(args.output, "w", encoding="utf-8") as f:
-            f.write(out)
-    else:
-        print(out)
+    if args.timings and args.watch:
+        ap.error("--timings is not available with --watch")
+    if args.zip + args.qti + args.text2qti > 1:
+        ap.error("--zip, --qti, and --text2qti are alternatives; pick one")
+    if args.qti and text2qti_api() is None:
+        ap.error("--qti needs the text2qti package (pip install text2qti); --zip uses the built-in QTI writer")
+    out_format = OUT_ZIP if args.zip else OUT_QTI if args.qti else OUT_TEXT
+    ext = ".txt" if out_format == OUT_TEXT else ".zip"
+
+    batch = (len(args.input) > 1 or args.outdir is not None
+             or any(os.path.isdir(p) or is_glob(p) for p in args.input))
+    if batch:
+        if args.output:
+            ap.error("-o/--output takes a single input file; use --outdir in batch mode")
+        inputs = find_inputs(args.input)
+        if not inputs:
+            ap.error("no Markdown (.md) files found")
+        jobs = [(src, output_path(src, rel, args.outdir, ext)) for src, rel in inputs]
+        dups = duplicate_outputs(jobs)
+        if dups:
+            ap.error("several inputs would write the same output:\n" + "\n".join(
+                f"  {dst} <- {', '.join(srcs)}" for dst, srcs in dups.items()))
+        if args.watch:
+            watch(lambda: [(src, output_path(src, rel, args.outdir, ext)) for src, rel in find_inputs(args.input)],
+                  debounce=args.debounce, chain_text2qti=args.text2qti, out_format=out_format)
+            return
+        cache = None
+        if not args.no_cache:
+            cache_path = args.cache or default_cache_path(inputs, args.outdir)
+            cache = ConversionCache(cache_path, int(args.cache_size * 1024 * 1024))
+        results = batch_convert(jobs, args.jobs, cache, out_format, timings=bool(args.timings),
+                                chain_text2qti=args.text2qti)
+        failed = report_batch(results, args.summary)
+        if args.timings:
+            write_timings(aggregate_timings(results), args.timings)
+        sys.exit(1 if failed else 0)
+
+    if out_format != OUT_TEXT and not args.output:
+        args.output = output_path(args.input[0], "", None, ext)
+    if args.watch:
+        if not args.output:
+            ap.error("--watch needs -o/--output for a single input file")
+        watch(lambda: [(args.input[0], args.output)], debounce=args.debounce,
+              chain_text2qti=args.text2qti, out_format=out_format)
+        return
+    if args.text2qti and not args.output:
+        ap.error("--text2qti needs -o/--output for a single input file")
+
+    if args.output and args.cache and not args.no_cache:
+        # Single file with an explicit cache: same skip/reuse rules as batch mode
+        cache = ConversionCache(args.cache, int(args.cache_size * 1024 * 1024))
+        rec = batch_convert([(args.input[0], args.output)], 1, cache, out_format, timings=bool(args.timings),
+                            chain_text2qti=args.text2qti)[0]
+        if not rec["ok"]:
+            sys.exit(f"{args.input[0]}: {rec['error']}")
+        if args.timings and rec.get("timings"):
+            write_timings(dict(input=rec["input"], output=rec["output"], **rec["timings"]), args.timings)
+        return
+
+    timer = PhaseTimer() if args.timings else None
+    t = timer or NO_TIMER
+    with profiling(args.input[0]):
+        if out_format != OUT_TEXT:
+            write_format(args.input[0], args.output, out_format, timer=timer)
+        elif args.output:
+            stream_file(args.input[0], args.output, timer)
+            if args.text2qti:
+                with t.phase("text2qti"):
+                    run_text2qti(args.output)
+        else:
+            with open(args.input[0], "r", encoding="utf-8") as f:
+                quiz, items = stream_quiz(f, timer)
+                write_text2qti(quiz, sys.stdout, items, timer)
+            t.add_bytes(os.path.getsize(args.input[0]))
+    if timer is not None:
+        write_timings(dict(input=args.input[0], output=args.output or "-", **timer.record()), args.timings)
 
 if __name__ == "__main__":
     main()
@@ -4,40 +4,109 @@ t2qti2md.py — Convert text2qti plaintext back into our Markdown-only quiz sche
 
 Usage:
     python t2qti2md.py input.txt [-o output.md]
+    python t2qti2md.py input.txt -o output.md --watch
+    python t2qti2md.py input.txt -o output.md --timings [timings.json]
+    python t2qti2md.py legacy/ 'more/**/*.txt' --outdir converted/ [-j N] [--summary manifest.json]
+
+Set MD2QTI_PROFILE=cpu or MD2QTI_PROFILE=mem to write a cProfile .prof file or a
+tracemalloc snapshot of the conversion (to MD2QTI_PROFILE_DIR, default: the
+current directory), with a short summary on stderr.
 """
 import argparse
+import array
+import collections.abc
+import concurrent.futures
+import contextlib
+import cProfile
+import functools
+import glob
+import itertools
+import json
+import linecache
+import mmap
+import os
+import pstats
 import re
-from dataclasses import dataclass, field
-from typing import List, Optional, Tuple
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+# Blocks between "# shared:begin NAME" and "# shared:end NAME" also appear in md2t2qti.py,
+# as each script ships on its own; tools/check_shared.py fails if the two copies differ.
 
 # ---------- Data Models ----------
-@dataclass
-class QLevelFB:
-    general: List[str] = field(default_factory=list)
-    correct: List[str] = field(default_factory=list)
-    incorrect: List[str] = field(default_factory=list)
-    information: List[str] = field(default_factory=list)
+# The per-item classes keep their fields in __slots__ (no per-instance __dict__), and list
+# fields left empty all share the EMPTY tuple (items without question-level feedback share
+# NO_FEEDBACK) instead of each holding new lists: assign a new list (or QLevelFB) to such a
+# field before appending to it. Short choice texts and fill answers are interned.
 
-@dataclass
-class Choice:
-    text: List[str]
-    correct: bool
-    per_feedback: List[str] = field(default_factory=list)
+# shared:begin records
+EMPTY: tuple = ()
+INTERN_MAX = 16
 
-@dataclass
-class Item:
-    kind: str  # mc, ma, num, fill, essay, file, text
-    title: str
-    points: Optional[float]
-    stem: List[str]
-    qfb: QLevelFB = field(default_factory=QLevelFB)
-    qnum: Optional[int] = None  # original text2qti question number, if present
-    pre_comments: List[str] = field(default_factory=list)   # HTML comments that precede this item
-    # type-specific
-    choices: List[Choice] = field(default_factory=list)     # mc/ma
-    numeric_spec: Optional[str] = None                      # num
-    fill_answers: List[str] = field(default_factory=list)   # fill
-    post_comments: List[str] = field(default_factory=list)   # comments after this item
+def intern_short(text: str) -> str:
+    """`text`, interned if at most INTERN_MAX characters long."""
+    return sys.intern(text) if len(text) <= INTERN_MAX else text
+
+class Record:
+    """Base for the slotted model classes: dataclass-style repr and equality."""
+    __slots__ = ()
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{k}={getattr(self, k)!r}" for k in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+# shared:end records
+
+class QLevelFB(Record):
+    __slots__ = ("general", "correct", "incorrect", "information")
+
+    def __init__(self, general: Sequence[str] = EMPTY, correct: Sequence[str] = EMPTY,
+                 incorrect: Sequence[str] = EMPTY, information: Sequence[str] = EMPTY):
+        self.general = general or EMPTY
+        self.correct = correct or EMPTY
+        self.incorrect = incorrect or EMPTY
+        self.information = information or EMPTY
+
+NO_FEEDBACK = QLevelFB()
+
+class Choice(Record):
+    __slots__ = ("text", "correct", "per_feedback")
+
+    def __init__(self, text: List[str], correct: bool, per_feedback: Sequence[str] = EMPTY):
+        self.text = text
+        self.correct = correct
+        self.per_feedback = per_feedback or EMPTY
+
+class Item(Record):
+    __slots__ = ("kind", "title", "points", "stem", "qfb", "qnum", "pre_comments", "choices",
+                 "numeric_spec", "fill_answers", "post_comments")
+
+    def __init__(self, kind: str, title: str, points: Optional[float], stem: List[str],
+                 qfb: QLevelFB = NO_FEEDBACK, qnum: Optional[int] = None,
+                 pre_comments: Sequence[str] = EMPTY, choices: Sequence[Choice] = EMPTY,
+                 numeric_spec: Optional[str] = None, fill_answers: Sequence[str] = EMPTY,
+                 post_comments: Sequence[str] = EMPTY):
+        self.kind = kind  # mc, ma, num, fill, essay, file, text
+        self.title = title
+        self.points = points
+        self.stem = stem
+        self.qfb = qfb
+        self.qnum = qnum  # original text2qti question number, if present
+        self.pre_comments = pre_comments or EMPTY    # HTML comments that precede this item
+        # type-specific
+        self.choices = choices or EMPTY              # mc/ma
+        self.numeric_spec = numeric_spec             # num
+        self.fill_answers = fill_answers or EMPTY    # fill
+        self.post_comments = post_comments or EMPTY  # comments after this item
 
 @dataclass
 class Quiz:
@@ -77,30 +146,255 @@ RE_FILL = re.compile(r'^\s*\*\s+(.*)\s*$')
 RE_ESSAY = re.compile(r'^\s*____\s*$')
 RE_FILE = re.compile(r'^\s*\^\^\^\^\s*$')
 
-# Quiz-level options (7 supported)
-RE_OPT = re.compile(r'^\s*(feedback is solution|solutions sample groups|solutions randomize groups|shuffle answers|show correct answers|one question at a time|can\'?t go back)\s*:\s*(true|false)\s*$', re.IGNORECASE)
+# Quiz-level options: text2qti label -> Quiz field, in emission order.
+# shared:begin quiz-options
+QUIZ_OPTIONS = (
+    ("feedback is solution", "feedback_is_solution"),
+    ("solutions sample groups", "solutions_sample_groups"),
+    ("solutions randomize groups", "solutions_randomize_groups"),
+    ("shuffle answers", "shuffle_answers"),
+    ("show correct answers", "show_correct_answers"),
+    ("one question at a time", "one_question_at_a_time"),
+    ("can't go back", "cant_go_back"),
+)
+OPTION_FIELDS = {label.replace("'", ""): fld for label, fld in QUIZ_OPTIONS}  # keys without apostrophes
+# shared:end quiz-options
+RE_OPT = re.compile(r'^\s*(' + "|".join(label.replace("'", "'?") for label, _ in QUIZ_OPTIONS) +
+                    r')\s*:\s*(true|false)\s*$', re.IGNORECASE)
+
+def _option_field(key: str) -> str:
+    return OPTION_FIELDS[key.lower().replace("'", "")]
 
 def _parse_bool(val: str) -> bool:
     return val.strip().lower() == 'true'
 
 
+# ---------- Memory-mapped input ----------
+LINE_BREAKS = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"  # what str.splitlines() splits at
+RE_BREAK = re.compile(rb'\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]')  # the same, in UTF-8
+RE_RARE_BREAK = re.compile(rb'[\x0b\x0c\x1c\x1d\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]')
+MAP_BLOCK = 1 << 24  # bytes split per step while indexing lines
+MAP_MIN_SIZE = 1 << 24  # parse_file maps files this large; smaller ones are read whole (faster)
+ITER_LINES = 4096    # lines decoded per step when iterating
+
+
+def line_starts(data: bytes) -> "array.array[int]":
+    """Offset of each line of UTF-8 `data` (split like str.splitlines()), then len(data)."""
+    starts = array.array('Q', [0])
+    n = len(data)
+    if RE_RARE_BREAK.search(data) is not None:
+        starts.extend(m.end() for m in RE_BREAK.finditer(data))
+    else:
+        # only \n, \r\n, and \r: bytes.splitlines() splits at exactly those, a block at a time
+        pos, size = 0, MAP_BLOCK
+        while pos < n:
+            lines = data[pos:pos + size].splitlines(True)
+            if pos + size < n:
+                lines.pop()  # may be incomplete, or a "\r" whose "\n" is in the next block
+                if not lines:
+                    size *= 2
+                    continue
+            ends = itertools.accumulate(map(len, lines), initial=pos)
+            next(ends)
+            starts.extend(ends)
+            pos = starts[-1]
+    if starts[-1] != n:
+        starts.append(n)
+    return starts
+
+
+class MappedLines(collections.abc.Sequence):
+    """The lines of a UTF-8 file as a sequence of str, like f.read().splitlines(), without
+    reading the file: it is memory-mapped, indexed once by an array of line start offsets
+    (8 bytes per line), and each line is decoded only when read. Close it (or use it as a
+    context manager) when done."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # an empty file cannot be mapped
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.starts = line_starts(self.data)
+
+    def __len__(self) -> int:
+        return len(self.starts) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self.starts) - 1))]
+        if i < 0:
+            i += len(self.starts) - 1
+        if not 0 <= i < len(self.starts) - 1:
+            raise IndexError("MappedLines index out of range")
+        return self.line(i)
+
+    def line(self, i: int) -> str:
+        """Line i, for 0 <= i < len(self) (unchecked)."""
+        line = self.data[self.starts[i]:self.starts[i + 1]].decode("utf-8")
+        if line and line[-1] in LINE_BREAKS:
+            line = line[:-2] if line.endswith("\r\n") else line[:-1]
+        return line
+
+    def __iter__(self) -> Iterator[str]:
+        # decode ITER_LINES lines at a time; each block ends at a line start, so it splits
+        # into exactly those lines
+        starts, n = self.starts, len(self.starts) - 1
+        for i in range(0, n, ITER_LINES):
+            j = min(i + ITER_LINES, n)
+            yield from self.data[starts[i]:starts[j]].decode("utf-8").splitlines()
+
+    def close(self) -> None:
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self) -> "MappedLines":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+# ---------- Line classification ----------
+# Every line is classified once, up front: the first non-blank character picks the few
+# patterns that could possibly match it, and the parser then branches on the cached kind
+# (and reads groups from the cached match) instead of re-probing each pattern per branch.
+T_BLANK = "blank"
+T_OTHER = "other"
+T_COMMENT = "comment"          # % line comment
+T_BLOCK = "block"              # COMMENT ... END_COMMENT opener
+T_QTITLE, T_QDESC, T_OPT = "qtitle", "qdesc", "opt"
+T_TEXT_TITLE, T_TEXT = "text_title", "text"
+T_TITLE, T_POINTS, T_STEM = "title", "points", "stem"
+T_GEN, T_COR, T_INC, T_INFO = "general", "correct", "incorrect", "information"  # also QLevelFB fields
+T_MC, T_MA, T_NUM, T_FILL, T_ESSAY, T_FILE = "mc", "ma", "num", "fill", "essay", "file"
+
+LINE_PATTERNS: Dict[str, Tuple[Tuple[str, "re.Pattern[str]"], ...]] = {
+    '.': ((T_GEN, RE_QFB_GEN),),       # also RE_PER_CHOICE_FB (the same pattern)
+    '+': ((T_COR, RE_QFB_COR),),
+    '-': ((T_INC, RE_QFB_INC),),
+    '!': ((T_INFO, RE_QFB_INFO),),
+    '=': ((T_NUM, RE_NUM),),
+    '*': ((T_FILL, RE_FILL), (T_MC, RE_MC_CHOICE)),
+    '[': ((T_MA, RE_MA_CHOICE),),
+    '_': ((T_ESSAY, RE_ESSAY),),
+    '^': ((T_FILE, RE_FILE),),
+    'T': ((T_TITLE, RE_TITLE), (T_TEXT_TITLE, RE_TEXT_TITLE), (T_TEXT, RE_TEXT)),
+    'P': ((T_POINTS, RE_POINTS),),
+    'Q': ((T_QTITLE, RE_QTITLE), (T_QDESC, RE_QDESC)),
+}
+for _ch in "0123456789":
+    LINE_PATTERNS[_ch] = ((T_STEM, RE_STEM_FIRST),)
+for _ch in "abcdefghijklmnopqrstuvwxyz":
+    LINE_PATTERNS[_ch] = ((T_MC, RE_MC_CHOICE),)
+for _label, _ in QUIZ_OPTIONS:  # options are case-insensitive
+    for _ch in (_label[0].lower(), _label[0].upper()):
+        LINE_PATTERNS[_ch] = LINE_PATTERNS.get(_ch, ()) + ((T_OPT, RE_OPT),)
+del _ch, _label
+
+LineClass = Tuple[str, Optional["re.Match[str]"], Optional[str]]
+
+
+def classify_line(line: str) -> LineClass:
+    """Return (kind, match, cont) for one line. `match` is the kind's own RE_* match, if it
+    has one; `cont` is the RE_CONT text of a line indented 4+ spaces, else None."""
+    s = line.lstrip()
+    cont = s if len(line) - len(s) >= 4 else None
+    if not s:
+        return T_BLANK, None, cont
+    if s[0] == '%':
+        return T_COMMENT, None, cont
+    if s.startswith('COMMENT'):
+        return T_BLOCK, None, cont
+    for kind, rx in LINE_PATTERNS.get(s[0], ()):
+        m = rx.match(line)
+        if m:
+            return kind, m, cont
+    return T_OTHER, None, cont
+
+
+KIND_PATTERNS = {kind: rx for patterns in LINE_PATTERNS.values() for kind, rx in patterns}
+CLASSIFY_CACHE = 1024  # distinct lines remembered while classifying (repeats share one result)
+
+
+class LazyMatches:
+    """classify_lines' matches for lines not held in memory: re-run on access."""
+    __slots__ = ("line", "kinds")
+
+    def __init__(self, lines: Sequence[str], kinds: List[str]):
+        self.line = getattr(lines, "line", lines.__getitem__)
+        self.kinds = kinds
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, i: int) -> Optional["re.Match[str]"]:
+        rx = KIND_PATTERNS.get(self.kinds[i])
+        return rx.match(self.line(i)) if rx is not None else None
+
+
+class LazyConts:
+    """classify_lines' continuation texts for lines not held in memory: derived on access
+    from the lines flagged (during classification) as indented 4+ spaces."""
+    __slots__ = ("line", "flags")
+
+    def __init__(self, lines: Sequence[str], flags: bytearray):
+        self.line = getattr(lines, "line", lines.__getitem__)
+        self.flags = flags
+
+    def __len__(self) -> int:
+        return len(self.flags)
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        return self.line(i).lstrip() if self.flags[i] else None
+
+
+def classify_lines(lines: Sequence[str]) -> Tuple[List[str], Sequence[Optional["re.Match[str]"]], Sequence[Optional[str]]]:
+    """Classify every line once (a line repeated within the last CLASSIFY_CACHE distinct
+    lines only once); returns parallel sequences of kinds, matches, and continuation texts.
+    For lines that are not a list (such as MappedLines, which decodes each line on access)
+    only the kinds are kept; matches and continuation texts are recomputed when read, so
+    no line stays in memory."""
+    classify = functools.lru_cache(maxsize=CLASSIFY_CACHE)(classify_line)
+    if not isinstance(lines, list):
+        kinds: List[str] = []
+        flags = bytearray()
+        for ln in lines:
+            kind, _, cont = classify(ln)
+            kinds.append(kind)
+            flags.append(cont is not None)
+        return kinds, LazyMatches(lines, kinds), LazyConts(lines, flags)
+    classes = list(map(classify, lines))
+    return [c[0] for c in classes], [c[1] for c in classes], [c[2] for c in classes]
+
+
 # ---------- Strict parse error helper ----------
+RE_PERR = re.compile(r'^Parse error near line (\d+): (.*)$', re.DOTALL)  # what _perr raises
+
 def _perr(i: int, msg: str) -> None:
     raise ValueError(f"Parse error near line {i+1}: {msg}")
 
 
+def error_record(src: str, err: Exception) -> Dict[str, object]:
+    """Structured form of a conversion failure: {"file", "line", "message"}. `line` is the
+    1-based source line of a parse error, None for other failures (e.g. unreadable files)."""
+    m = RE_PERR.match(str(err)) if isinstance(err, ValueError) else None
+    if m:
+        return {"file": src, "line": int(m.group(1)), "message": m.group(2)}
+    return {"file": src, "line": None, "message": f"{type(err).__name__}: {err}"}
+
+
 def _dedent_lines(lines: List[str]) -> List[str]:
-    # Remove single leading 4-space continuation indent from lines that have it
+    # Drop leading/trailing blank lines by scanning indices (a line is blank before
+    # dedenting iff it is blank after), then remove the 4-space continuation indent
+    start, end = 0, len(lines)
+    while start < end and lines[start].strip() == '':
+        start += 1
+    while end > start and lines[end-1].strip() == '':
+        end -= 1
     out = []
-    for ln in lines:
-        m = RE_CONT.match(ln)
-        out.append(m.group(1) if m else ln.rstrip())
-    # drop trailing blanks
-    while out and out[-1].strip() == '':
-        out.pop()
-    # drop leading blanks
-    while out and out[0].strip() == '':
-        out.pop(0)
+    for k in range(start, end):
+        m = RE_CONT.match(lines[k])
+        out.append(m.group(1) if m else lines[k].rstrip())
     return out
 
 # Convert a single text2qti line comment (starting with '%') to an HTML comment line
@@ -163,490 +457,537 @@ def _consume_trailing_comments(lines: List[str], i: int) -> Tuple[List[str], int
     return out, j
 
 
-def parse_text2qti(lines: List[str]) -> Quiz:
-    i = 0
-    title = ""      # Default title string
-    description_accum: List[str] = []
-    items: List[Item] = []
-    pending_html_comments: List[str] = []
+# ---------- text2qti parser ----------
+# parse_text2qti runs a state machine over the classified lines. Each state is one section
+# of the quiz; its handler consumes the run of lines that belong to that section and picks
+# the next state from the kind of the first line it leaves. Every line is consumed by
+# exactly one handler, and a handler that consumes nothing only moves on along
+#     between -> head -> stem -> qfb -> body (num/terminator/choices/fill) -> trailing,
+# so a parse of n lines runs O(n) handler steps (at most 3n + 1: a question is six steps
+# over two or more lines, a choice two over one), and each step does O(1) work per line it
+# consumes (blank lines look ahead through the precomputed next_nonblank index).
+S_PREAMBLE = "preamble"        # Quiz title:, description, options
+S_BETWEEN = "between"          # blanks, comments, and stray options between items
+S_TEXT = "text"                # Text title: / Text: region
+S_HEAD = "head"                # Title:, Points:, and the numbered stem line
+S_STEM = "stem"                # stem continuation lines and the comments after them
+S_QFB = "qfb"                  # question-level feedback
+S_NUM = "num"                  # '= ...' numeric answer
+S_TERMINATOR = "terminator"    # essay '____' / file '^^^^'
+S_CHOICES = "choices"          # one MC/MA choice and its continuation lines
+S_CHOICE_FB = "choice_fb"      # '... ' feedback for the choice just read
+S_FILL = "fill"                # '* ' acceptable answers
+S_TRAILING = "trailing"        # comments after an item body
+S_END = "end"
 
-    # Expect Quiz title first
-    if i < len(lines) and RE_QTITLE.match(lines[i]):
-        title = RE_QTITLE.match(lines[i]).group(1)
-        i += 1
+# Transitions keyed on the kind of the next line: between items, and after the question-level
+# feedback (anything else there is a parse error).
+ITEM_STATES = {T_TEXT_TITLE: S_TEXT, T_TITLE: S_HEAD, T_POINTS: S_HEAD, T_STEM: S_HEAD}
+BODY_STATES = {T_NUM: S_NUM, T_ESSAY: S_TERMINATOR, T_FILE: S_TERMINATOR,
+               T_MC: S_CHOICES, T_MA: S_CHOICES, T_FILL: S_FILL}
 
-    # collect any leading comments before description
-    while i < len(lines):
-        s = lines[i].lstrip()
-        if s.startswith('%'):
-            description_accum.append(_t2qti_line_to_html(lines[i]))
-            i += 1
-        elif s.startswith('COMMENT'):
-            html_block, i = _consume_block_comment(lines, i)
-            description_accum.extend(html_block)
-        else:
-            break
 
-    # Optional description
-    if i < len(lines) and RE_QDESC.match(lines[i]):
-        first = RE_QDESC.match(lines[i]).group(1)
-        desc = [first]
-        i += 1
-        # collect continuation lines (4-space indent), allowing blank lines to be preserved
-        while i < len(lines):
-            m = RE_CONT.match(lines[i])
-            if m:
-                desc.append(m.group(1))
+def next_nonblank(kinds: List[str]) -> "array.array[int]":
+    """For each line, the index of the first non-blank line after it (len(kinds) if none);
+    one reverse pass, so blank-run lookahead is O(1) instead of a rescan per blank line."""
+    n = len(kinds)
+    nxt = array.array('Q', [n]) * n
+    j = n
+    for k in range(n - 1, -1, -1):
+        nxt[k] = j
+        if kinds[k] != T_BLANK:
+            j = k
+    return nxt
+
+
+def _take_cont(kinds: List[str], conts: Sequence[Optional[str]], nxt: Sequence[int], i: int, out: List[str]) -> int:
+    """Append the 4-space continuation lines starting at i to `out`, keeping a blank line only
+    when more continuation follows it; return the index of the first line not taken."""
+    n = len(kinds)
+    while i < n:
+        c = conts[i]
+        if c is not None:
+            out.append(c)
+            i += 1
+            continue
+        if kinds[i] == T_BLANK:
+            j = nxt[i]
+            if j < n and conts[j] is not None:
+                out.append('')
                 i += 1
                 continue
-            if lines[i].strip() == '':
-                # include a blank only if the next nonblank is another continuation line
-                j = i + 1
-                while j < len(lines) and lines[j].strip() == '':
-                    j += 1
-                if j < len(lines) and RE_CONT.match(lines[j]):
-                    desc.append('')
-                    i += 1
-                    continue
-                break
-            break
-        description_accum.extend(_dedent_lines(desc))
-
-        # optionally gather any immediate comments following description
-        while i < len(lines):
-            s = lines[i].lstrip()
-            if s.startswith('%'):
-                description_accum.append(_t2qti_line_to_html(lines[i]))
+        break
+    return i
+
+
+# Lines that may directly follow a stem, and lines that end a run of MC/MA choices.
+STEM_FOLLOWERS = frozenset({T_GEN, T_COR, T_INC, T_INFO, T_NUM, T_ESSAY, T_FILE, T_MC, T_MA, T_FILL})
+_CHOICES_END = frozenset({T_BLANK, T_GEN, T_COR, T_INC, T_NUM, T_ESSAY, T_FILE, T_FILL,
+                          T_TITLE, T_TEXT_TITLE, T_STEM, T_COMMENT, T_BLOCK})
+CHOICES_END = {T_MC: _CHOICES_END | {T_MA}, T_MA: _CHOICES_END | {T_MC}}
+QFB_KINDS = frozenset({T_GEN, T_COR, T_INC, T_INFO})
+
+
+class Text2QTIParser:
+    """One parse of a text2qti file; see the state list above. Use parse_text2qti()."""
+
+    def __init__(self, lines: Sequence[str]):
+        self.lines = lines
+        self.kinds, self.hits, self.conts = classify_lines(lines)
+        self.nxt = next_nonblank(self.kinds)
+        self.n = len(lines)
+        self.title = ""     # Default title string
+        self.description: List[str] = []
+        self.options: Dict[str, bool] = {}
+        self.items: List[Item] = []
+        self.pending_html_comments: List[str] = []
+        self.item: Optional[Item] = None     # item being read
+        self.choices_start = 0               # first choice line of the current MC/MA item
+        self.handlers: Dict[str, Callable[[int], Tuple[str, int]]] = {
+            S_PREAMBLE: self.preamble, S_BETWEEN: self.between, S_TEXT: self.text,
+            S_HEAD: self.head, S_STEM: self.stem, S_QFB: self.qfb,
+            S_NUM: self.num, S_TERMINATOR: self.terminator, S_CHOICES: self.choices,
+            S_CHOICE_FB: self.choice_fb, S_FILL: self.fill, S_TRAILING: self.trailing,
+        }
+
+    def parse(self) -> Quiz:
+        handlers = self.handlers
+        state, i = S_PREAMBLE, 0
+        while state != S_END:
+            state, i = handlers[state](i)
+        return Quiz(title=self.title, description=self.description, items=self.items, **self.options)
+
+    def _comments(self, i: int, out: List[str]) -> int:
+        """Append the % and COMMENT ... END_COMMENT comments starting at i to `out` as HTML."""
+        kinds, lines = self.kinds, self.lines
+        while i < self.n:
+            if kinds[i] == T_COMMENT:
+                out.append(_t2qti_line_to_html(lines[i]))
                 i += 1
-            elif s.startswith('COMMENT'):
+            elif kinds[i] == T_BLOCK:
                 html_block, i = _consume_block_comment(lines, i)
-                description_accum.extend(html_block)
+                out.extend(html_block)
             else:
                 break
+        return i
 
-    # Optional quiz-level options (one per line, no indent) — tolerate leading blanks
-    opt_fis = opt_ssg = opt_srg = opt_shuffle = opt_show = opt_one = opt_cant = None
-    while i < len(lines):
-        if lines[i].strip() == '':
+    def preamble(self, i: int) -> Tuple[str, int]:
+        kinds, hits, n = self.kinds, self.hits, self.n
+        # Expect Quiz title first
+        if i < n and kinds[i] == T_QTITLE:
+            self.title = hits[i].group(1)
             i += 1
-            continue
-        mopt = RE_OPT.match(lines[i])
-        if not mopt:
-            break
-        key = mopt.group(1).lower()
-        val = _parse_bool(mopt.group(2))
-        if key == 'feedback is solution':
-            opt_fis = val
-        elif key == 'solutions sample groups':
-            opt_ssg = val
-        elif key == 'solutions randomize groups':
-            opt_srg = val
-        elif key == 'shuffle answers':
-            opt_shuffle = val
-        elif key == 'show correct answers':
-            opt_show = val
-        elif key == 'one question at a time':
-            opt_one = val
-        elif key.startswith("can"):
-            opt_cant = val
-        i += 1
+        # collect any leading comments before description
+        i = self._comments(i, self.description)
 
-    # Now parse items
-    while i < len(lines):
-        ln = lines[i]
-        # Skip blanks
-        if ln.strip() == '':
-            i += 1
-            continue
-        # Capture standalone comments between items; attach to next item’s stem
-        sln = ln.lstrip()
-        if sln.startswith('%'):
-            # Preserve a single blank line before the comment if present in the source
-            if i > 0 and lines[i-1].strip() == '' and (not pending_html_comments or pending_html_comments[-1] != ''):
-                pending_html_comments.append('')
-            pending_html_comments.append(_t2qti_line_to_html(ln))
-            i += 1
-            continue
-        if sln.startswith('COMMENT'):
-            # Preserve a single blank line before the block comment if present in the source
-            if i > 0 and lines[i-1].strip() == '' and (not pending_html_comments or pending_html_comments[-1] != ''):
-                pending_html_comments.append('')
-            html_block, i2 = _consume_block_comment(lines, i)
-            pending_html_comments.extend(html_block)
-            i = i2
-            continue
-        # Handle stray quiz-level options that appear here
-        mopt_inline = RE_OPT.match(ln)
-        if mopt_inline:
-            key = mopt_inline.group(1).lower()
-            val = _parse_bool(mopt_inline.group(2))
-            if key == 'feedback is solution':
-                opt_fis = val
-            elif key == 'solutions sample groups':
-                opt_ssg = val
-            elif key == 'solutions randomize groups':
-                opt_srg = val
-            elif key == 'shuffle answers':
-                opt_shuffle = val
-            elif key == 'show correct answers':
-                opt_show = val
-            elif key == 'one question at a time':
-                opt_one = val
-            elif key.startswith('can'):
-                opt_cant = val
-            i += 1
-            continue
-
-        # Reject anything that’s not a valid item starter at this point
-        if not (RE_TEXT_TITLE.match(ln) or RE_TITLE.match(ln) or RE_POINTS.match(ln) or RE_STEM_FIRST.match(ln)):
-            _perr(i, "Unexpected content between items; expected 'Text title:', 'Title:', 'Points:', or a numbered stem")
+        # Optional description
+        if i < n and kinds[i] == T_QDESC:
+            desc = [hits[i].group(1)]
+            # collect continuation lines (4-space indent), allowing blank lines to be preserved
+            i = _take_cont(kinds, self.conts, self.nxt, i + 1, desc)
+            self.description.extend(_dedent_lines(desc))
+            # optionally gather any immediate comments following description
+            i = self._comments(i, self.description)
 
-        # Text region
-        mtt = RE_TEXT_TITLE.match(ln)
-        if mtt:
-            t_title = mtt.group(1).strip()
+        # Optional quiz-level options (one per line, no indent) — tolerate leading blanks
+        while i < n:
+            if kinds[i] == T_BLANK:
+                i += 1
+                continue
+            if kinds[i] != T_OPT:
+                break
+            self.options[_option_field(hits[i].group(1))] = _parse_bool(hits[i].group(2))
             i += 1
-            # Expect Text line
-            if i < len(lines) and RE_TEXT.match(lines[i]):
-                first = RE_TEXT.match(lines[i]).group(1)
+        return S_BETWEEN, i
+
+    def between(self, i: int) -> Tuple[str, int]:
+        kinds, pending = self.kinds, self.pending_html_comments
+        while i < self.n:
+            kind = kinds[i]
+            # Skip blanks
+            if kind == T_BLANK:
                 i += 1
-                text_lines = [first]
-                while i < len(lines):
-                    m = RE_CONT.match(lines[i])
-                    if m:
-                        text_lines.append(m.group(1))
-                        i += 1
-                        continue
-                    if lines[i].strip() == '':
-                        j = i + 1
-                        while j < len(lines) and lines[j].strip() == '':
-                            j += 1
-                        if j < len(lines) and RE_CONT.match(lines[j]):
-                            text_lines.append('')
-                            i += 1
-                            continue
-                        break
-                    break
-            else:
-                _perr(i, "Expected 'Text:' line after 'Text title:'")
+                continue
+            # Capture standalone comments between items; attach to next item’s stem
+            if kind == T_COMMENT or kind == T_BLOCK:
+                # Preserve a single blank line before the comment if present in the source
+                if i > 0 and kinds[i-1] == T_BLANK and (not pending or pending[-1] != ''):
+                    pending.append('')
+                if kind == T_COMMENT:
+                    pending.append(_t2qti_line_to_html(self.lines[i]))
+                    i += 1
+                else:
+                    html_block, i = _consume_block_comment(self.lines, i)
+                    pending.extend(html_block)
+                continue
+            # Handle stray quiz-level options that appear here
+            if kind == T_OPT:
+                mopt = self.hits[i]
+                self.options[_option_field(mopt.group(1))] = _parse_bool(mopt.group(2))
+                i += 1
+                continue
+            state = ITEM_STATES.get(kind)
+            if state is None:
+                _perr(i, "Unexpected content between items; expected 'Text title:', 'Title:', 'Points:', or a numbered stem")
+            return state, i
+        return S_END, i
 
-            # capture any comments immediately following the text block as post-comments
-            post_comments, i = _consume_trailing_comments(lines, i)
-            items.append(Item(kind='text', title=t_title, points=None,
-                              stem=_dedent_lines(text_lines), post_comments=post_comments))
-            continue
+    def text(self, i: int) -> Tuple[str, int]:
+        t_title = self.hits[i].group(1).strip()
+        i += 1
+        # Expect Text line
+        if not (i < self.n and self.kinds[i] == T_TEXT):
+            _perr(i, "Expected 'Text:' line after 'Text title:'")
+        text_lines = [self.hits[i].group(1)]
+        i = _take_cont(self.kinds, self.conts, self.nxt, i + 1, text_lines)
+        # comments immediately following the text block become its post-comments
+        self.item = Item(kind='text', title=t_title, points=None, stem=_dedent_lines(text_lines))
+        return S_TRAILING, i
 
+    def head(self, i: int) -> Tuple[str, int]:
         # Regular question: optional Title, optional Points, then mandatory numbered Stem
-        if not (RE_TITLE.match(ln) or RE_POINTS.match(ln) or RE_STEM_FIRST.match(ln)):
-            _perr(i, "Expected 'Title:', 'Points:', or a numbered stem like '1. ...'")
+        kinds, hits, n = self.kinds, self.hits, self.n
         q_title = ""    # Default title string
-        mt = RE_TITLE.match(ln)
-        if mt:
-            q_title = mt.group(1).strip()
+        if kinds[i] == T_TITLE:
+            q_title = hits[i].group(1).strip()
             i += 1
-            ln = lines[i] if i < len(lines) else ''
-
         # Points are optional in this reverse pass; default to 1.0 if absent
-        if i < len(lines) and RE_POINTS.match(lines[i]):
-            pts = float(RE_POINTS.match(lines[i]).group(1))
+        pts = 1.0
+        if i < n and kinds[i] == T_POINTS:
+            pts = float(hits[i].group(1))
             i += 1
-        else:
-            pts = 1.0
-
         # Stem first line (capture explicit question number if present)
-        qnum = None
-        if i < len(lines) and RE_STEM_FIRST.match(lines[i]):
-            m_stem = RE_STEM_FIRST.match(lines[i])
-            try:
-                qnum = int(m_stem.group(1))
-            except Exception:
-                qnum = None
-            stem_first = m_stem.group(2)
-            i += 1
-        else:
+        if not (i < n and kinds[i] == T_STEM):
             _perr(i, "Expected a numbered stem like 'N. <prompt>' after Title/Points")
-        stem_cont = []
-        while i < len(lines):
-            m = RE_CONT.match(lines[i])
-            if m:
-                stem_cont.append(m.group(1))
-                i += 1
-                continue
-            if lines[i].strip() == '':
-                j = i + 1
-                while j < len(lines) and lines[j].strip() == '':
-                    j += 1
-                if j < len(lines) and RE_CONT.match(lines[j]):
-                    stem_cont.append('')
-                    i += 1
-                    continue
-                break
-            # Non-blank and not an indented continuation: only allowed if it begins a valid section
-            next_ln = lines[i]
-            allowed = (
-                RE_QFB_GEN.match(next_ln) or RE_QFB_COR.match(next_ln) or RE_QFB_INC.match(next_ln) or
-                RE_QFB_INFO.match(next_ln) or
-                RE_NUM.match(next_ln) or RE_ESSAY.match(next_ln) or RE_FILE.match(next_ln) or
-                RE_MC_CHOICE.match(next_ln) or RE_MA_CHOICE.match(next_ln) or RE_FILL.match(next_ln)
-            )
-            if not allowed:
-                _perr(i, "Unindented line encountered inside stem; continuation lines must be indented 4+ spaces")
-            break
-        stem = [stem_first] + stem_cont
-        stem = _dedent_lines(stem)
+        m_stem = hits[i]
+        try:
+            qnum = int(m_stem.group(1))
+        except Exception:
+            qnum = None
+        self.item = Item(kind='', title=q_title, points=pts, stem=[m_stem.group(2)], qnum=qnum,
+                         pre_comments=self.pending_html_comments)
+        if self.pending_html_comments:
+            self.pending_html_comments = []
+        return S_STEM, i + 1
 
+    def stem(self, i: int) -> Tuple[str, int]:
+        item, kinds = self.item, self.kinds
+        i = _take_cont(kinds, self.conts, self.nxt, i, item.stem)
+        # Non-blank and not an indented continuation: only allowed if it begins a valid section
+        if i < self.n and kinds[i] != T_BLANK and kinds[i] not in STEM_FOLLOWERS:
+            _perr(i, "Unindented line encountered inside stem; continuation lines must be indented 4+ spaces")
+        item.stem = _dedent_lines(item.stem)
         # collect any comments immediately after the stem (before feedback/answers)
-        while i < len(lines):
-            s = lines[i].lstrip()
-            if s.startswith('%'):
-                stem.append(_t2qti_line_to_html(lines[i]))
-                i += 1
-                continue
-            if s.startswith('COMMENT'):
-                html_block, i = _consume_block_comment(lines, i)
-                stem.extend(html_block)
-                continue
-            break
+        return S_QFB, self._comments(i, item.stem)
 
+    def qfb(self, i: int) -> Tuple[str, int]:
         # Question-level feedback BEFORE answers (may be none)
-        qfb = QLevelFB()
-        last_kind: Optional[str] = None
-        while i < len(lines):
-            line = lines[i]
-            m_gen = RE_QFB_GEN.match(line)
-            m_cor = RE_QFB_COR.match(line)
-            m_inc = RE_QFB_INC.match(line)
-            m_inf = RE_QFB_INFO.match(line)
-            m_cont = RE_CONT.match(line)
-
-            if m_gen:
-                qfb.general.append(m_gen.group(1))
-                last_kind = "general"
-                i += 1
-            elif m_cor:
-                qfb.correct.append(m_cor.group(1))
-                last_kind = "correct"
-                i += 1
-            elif m_inc:
-                qfb.incorrect.append(m_inc.group(1))
-                last_kind = "incorrect"
-                i += 1
-            elif m_inf:
-                qfb.information.append(m_inf.group(1))
-                last_kind = "information"
-                i += 1
-            elif m_cont and last_kind is not None:
+        kinds, hits, conts, n = self.kinds, self.hits, self.conts, self.n
+        qfb = self.item.qfb
+        target: Optional[List[str]] = None
+        while i < n:
+            kind = kinds[i]
+            if kind in QFB_KINDS:
+                if qfb is NO_FEEDBACK:
+                    qfb = self.item.qfb = QLevelFB()
+                target = getattr(qfb, kind)
+                if target is EMPTY:
+                    target = []
+                    setattr(qfb, kind, target)
+                target.append(hits[i].group(1))
+            elif target is not None and conts[i] is not None:
                 # Continuation line for the previous feedback block; attach to that block
-                cont = m_cont.group(1)
-                target_list = getattr(qfb, last_kind)
-                target_list.append(cont)
-                i += 1
+                target.append(conts[i])
             else:
                 break
+            i += 1
+        state = BODY_STATES.get(kinds[i]) if i < n else None
+        if state is None:
+            _perr(i, "Unrecognized question body: expected choices, numeric '=', fill answers '*', essay '____', or file '^^^^'")
+        self.item.kind = kinds[i]
+        return state, i
 
-        # NUMERIC: question-level feedback before the numeric spec
-        if i < len(lines) and (RE_QFB_GEN.match(lines[i]) or RE_QFB_COR.match(lines[i]) or
-                               RE_QFB_INC.match(lines[i]) or RE_QFB_INFO.match(lines[i]) or RE_NUM.match(lines[i])):
-            # consume feedback first
-            while i < len(lines):
-                if RE_QFB_GEN.match(lines[i]):
-                    qfb.general.append(RE_QFB_GEN.match(lines[i]).group(1)); i += 1; continue
-                if RE_QFB_COR.match(lines[i]):
-                    qfb.correct.append(RE_QFB_COR.match(lines[i]).group(1)); i += 1; continue
-                if RE_QFB_INC.match(lines[i]):
-                    qfb.incorrect.append(RE_QFB_INC.match(lines[i]).group(1)); i += 1; continue
-                if RE_QFB_INFO.match(lines[i]):
-                    qfb.information.append(RE_QFB_INFO.match(lines[i]).group(1)); i += 1; continue
-                break
-            # now the spec is required
-            if i < len(lines) and RE_NUM.match(lines[i]):
-                numeric_spec = RE_NUM.match(lines[i]).group(1).strip()
-                i += 1
-            else:
-                _perr(i, "Expected numeric answer line '= ...' after question-level feedback.")
-            post_comments, i = _consume_trailing_comments(lines, i)
-            items.append(Item(kind='num', title=q_title, points=pts, stem=stem, qfb=qfb, qnum=qnum,
-                              pre_comments=pending_html_comments, numeric_spec=numeric_spec, post_comments=post_comments))
-            pending_html_comments = []
-            continue
+    def num(self, i: int) -> Tuple[str, int]:
+        self.item.numeric_spec = self.hits[i].group(1).strip()
+        return S_TRAILING, i + 1
 
-        # ESSAY: feedback/information before the terminator
-        if i < len(lines):
-            while i < len(lines) and (RE_QFB_GEN.match(lines[i]) or RE_QFB_COR.match(lines[i]) or
-                                      RE_QFB_INC.match(lines[i]) or RE_QFB_INFO.match(lines[i])):
-                if RE_QFB_GEN.match(lines[i]):    qfb.general.append(RE_QFB_GEN.match(lines[i]).group(1)); i += 1; continue
-                if RE_QFB_COR.match(lines[i]):    qfb.correct.append(RE_QFB_COR.match(lines[i]).group(1)); i += 1; continue
-                if RE_QFB_INC.match(lines[i]):    qfb.incorrect.append(RE_QFB_INC.match(lines[i]).group(1)); i += 1; continue
-                if RE_QFB_INFO.match(lines[i]):   qfb.information.append(RE_QFB_INFO.match(lines[i]).group(1)); i += 1; continue
-            if i < len(lines) and RE_ESSAY.match(lines[i]):
-                i += 1
-                post_comments, i = _consume_trailing_comments(lines, i)
-                items.append(Item(kind='essay', title=q_title, points=pts, stem=stem, qfb=qfb, qnum=qnum,
-                                  pre_comments=pending_html_comments, post_comments=post_comments))
-                pending_html_comments = []
-                continue
+    def terminator(self, i: int) -> Tuple[str, int]:
+        return S_TRAILING, i + 1
 
-        # FILE
-        if i < len(lines):
-            while i < len(lines) and (RE_QFB_GEN.match(lines[i]) or RE_QFB_COR.match(lines[i]) or
-                                      RE_QFB_INC.match(lines[i]) or RE_QFB_INFO.match(lines[i])):
-                if RE_QFB_GEN.match(lines[i]):    qfb.general.append(RE_QFB_GEN.match(lines[i]).group(1)); i += 1; continue
-                if RE_QFB_COR.match(lines[i]):    qfb.correct.append(RE_QFB_COR.match(lines[i]).group(1)); i += 1; continue
-                if RE_QFB_INC.match(lines[i]):    qfb.incorrect.append(RE_QFB_INC.match(lines[i]).group(1)); i += 1; continue
-                if RE_QFB_INFO.match(lines[i]):   qfb.information.append(RE_QFB_INFO.match(lines[i]).group(1)); i += 1; continue
-            if i < len(lines) and RE_FILE.match(lines[i]):
-                i += 1
-                post_comments, i = _consume_trailing_comments(lines, i)
-                items.append(Item(kind='file', title=q_title, points=pts, stem=stem, qfb=qfb, qnum=qnum,
-                                  pre_comments=pending_html_comments, post_comments=post_comments))
-                pending_html_comments = []
-                continue
+    def choices(self, i: int) -> Tuple[str, int]:
+        item, kinds = self.item, self.kinds
+        if not item.choices:
+            self.choices_start = i
+            item.choices = []
+        mode = item.kind
+        if i < self.n and kinds[i] == mode:
+            m = self.hits[i]
+            if mode == T_MC:
+                correct, first = m.group(1) == '*', m.group(3)
+            else:
+                correct, first = m.group(1) == '[*]', m.group(2)
+            text = [intern_short(first)]
+            item.choices.append(Choice(text=text, correct=correct))
+            # capture continuation lines for the choice text (≥4 spaces) and preserve blank lines
+            return S_CHOICE_FB, _take_cont(kinds, self.conts, self.nxt, i + 1, text)
+        # allow transition to the other choice kind (shouldn't happen), feedback,
+        # numeric/essay/file/fill, comments (% or COMMENT...), blank, or next item
+        if i < self.n and kinds[i] not in CHOICES_END[mode]:
+            _perr(i, f"Unrecognized line after {mode.upper()} choice; expected next choice, feedback, comment, or next section")
+        # Validate MC has exactly one correct answer
+        if mode == T_MC:
+            n_correct = sum(1 for ch in item.choices if ch.correct)
+            if n_correct != 1:
+                _perr(self.choices_start, f"Multiple-choice question must have exactly one correct answer; found {n_correct}.")
+        return S_TRAILING, i
 
-        # Multiple-choice or multiple-answer
-        choices: List[Choice] = []
-        if i < len(lines) and (RE_MC_CHOICE.match(lines[i]) or RE_MA_CHOICE.match(lines[i])):
-            mode = 'mc' if RE_MC_CHOICE.match(lines[i]) else 'ma'
-            choices_start_i = i
-            while i < len(lines):
-                if mode == 'mc':
-                    mmc = RE_MC_CHOICE.match(lines[i])
-                    if not mmc:
-                        # allow transition to MA choice (shouldn't happen), feedback, numeric/essay/file/fill,
-                        # comments (% or COMMENT...), blank, or next item
-                        nxt = lines[i]
-                        sln = nxt.lstrip()
-                        if (nxt.strip() == '' or RE_QFB_GEN.match(nxt) or RE_QFB_COR.match(nxt) or RE_QFB_INC.match(nxt) or
-                            RE_NUM.match(nxt) or RE_ESSAY.match(nxt) or RE_FILE.match(nxt) or RE_MA_CHOICE.match(nxt) or RE_FILL.match(nxt) or
-                            RE_TITLE.match(nxt) or RE_TEXT_TITLE.match(nxt) or RE_STEM_FIRST.match(nxt) or
-                            sln.startswith('%') or sln.startswith('COMMENT')):
-                            break
-                        _perr(i, "Unrecognized line after MC choice; expected next choice, feedback, comment, or next section")
-                    correct = (mmc.group(1) == '*')
-                    text = [mmc.group(3)]
-                    i += 1
-                    # capture continuation lines for the choice text (≥4 spaces) and preserve blank lines
-                    while i < len(lines):
-                        mcont = RE_CONT.match(lines[i])
-                        if mcont:
-                            text.append(mcont.group(1))
-                            i += 1
-                            continue
-                        if lines[i].strip() == '':
-                            j = i + 1
-                            while j < len(lines) and lines[j].strip() == '':
-                                j += 1
-                            if j < len(lines) and RE_CONT.match(lines[j]):
-                                text.append('')
-                                i += 1
-                                continue
-                            break
-                        break
-                    # per-choice feedback lines (leading '... ')
-                    pc_fb = []
-                    while i < len(lines) and RE_PER_CHOICE_FB.match(lines[i]):
-                        pc_fb.append(RE_PER_CHOICE_FB.match(lines[i]).group(1))
-                        i += 1
-                    # consume continuation lines for multi-line per-choice feedback
-                    while i < len(lines) and RE_CONT.match(lines[i]) and pc_fb:
-                        pc_fb.append(RE_CONT.match(lines[i]).group(1))
-                        i += 1
-                    choices.append(Choice(text=text, correct=correct, per_feedback=pc_fb))
-                else:
-                    mma = RE_MA_CHOICE.match(lines[i])
-                    if not mma:
-                        nxt = lines[i]
-                        sln = nxt.lstrip()
-                        if (nxt.strip() == '' or RE_QFB_GEN.match(nxt) or RE_QFB_COR.match(nxt) or RE_QFB_INC.match(nxt) or
-                            RE_NUM.match(nxt) or RE_ESSAY.match(nxt) or RE_FILE.match(nxt) or RE_MC_CHOICE.match(nxt) or RE_FILL.match(nxt) or
-                            RE_TITLE.match(nxt) or RE_TEXT_TITLE.match(nxt) or RE_STEM_FIRST.match(nxt) or
-                            sln.startswith('%') or sln.startswith('COMMENT')):
-                            break
-                        _perr(i, "Unrecognized line after MA choice; expected next choice, feedback, comment, or next section")
-                    correct = (mma.group(1) == '[*]')
-                    text = [mma.group(2)]
-                    i += 1
-                    # capture continuation lines for the choice text (≥4 spaces) and preserve blank lines
-                    while i < len(lines):
-                        mcont = RE_CONT.match(lines[i])
-                        if mcont:
-                            text.append(mcont.group(1))
-                            i += 1
-                            continue
-                        if lines[i].strip() == '':
-                            j = i + 1
-                            while j < len(lines) and lines[j].strip() == '':
-                                j += 1
-                            if j < len(lines) and RE_CONT.match(lines[j]):
-                                text.append('')
-                                i += 1
-                                continue
-                            break
-                        break
-                    pc_fb = []
-                    while i < len(lines) and RE_PER_CHOICE_FB.match(lines[i]):
-                        pc_fb.append(RE_PER_CHOICE_FB.match(lines[i]).group(1))
-                        i += 1
-                    # consume continuation lines for multi-line per-choice feedback
-                    while i < len(lines) and RE_CONT.match(lines[i]) and pc_fb:
-                        pc_fb.append(RE_CONT.match(lines[i]).group(1))
-                        i += 1
-                    choices.append(Choice(text=text, correct=correct, per_feedback=pc_fb))
-
-            # Validate MC has exactly one correct answer
-            if mode == 'mc':
-                n_correct = sum(1 for ch in choices if ch.correct)
-                if n_correct != 1:
-                    _perr(choices_start_i, f"Multiple-choice question must have exactly one correct answer; found {n_correct}.")
-            kind = 'mc' if mode == 'mc' else 'ma'
-            # Capture any trailing comments immediately following this item
-            post_comments, i = _consume_trailing_comments(lines, i)
-            items.append(Item(kind=kind, title=q_title, points=pts, stem=stem, qfb=qfb, qnum=qnum,
-                              pre_comments=pending_html_comments, choices=choices, post_comments=post_comments))
-            pending_html_comments = []
-            continue
+    def choice_fb(self, i: int) -> Tuple[str, int]:
+        kinds, conts, n = self.kinds, self.conts, self.n
+        if not (i < n and kinds[i] == T_GEN):
+            return S_CHOICES, i
+        pc_fb = self.item.choices[-1].per_feedback = []
+        # per-choice feedback lines (leading '... ')
+        while i < n and kinds[i] == T_GEN:
+            pc_fb.append(self.hits[i].group(1))
+            i += 1
+        # consume continuation lines for multi-line per-choice feedback
+        while i < n and conts[i] is not None:
+            pc_fb.append(conts[i])
+            i += 1
+        return S_CHOICES, i
 
-        # FILL: feedback block first, then acceptable answers
-        fill_answers: List[str] = []
-        consumed_fb = False
-        while i < len(lines) and (RE_QFB_GEN.match(lines[i]) or RE_QFB_COR.match(lines[i]) or RE_QFB_INC.match(lines[i]) or RE_QFB_INFO.match(lines[i])):
-            consumed_fb = True
-            if RE_QFB_GEN.match(lines[i]):     qfb.general.append(RE_QFB_GEN.match(lines[i]).group(1)); i += 1; continue
-            if RE_QFB_COR.match(lines[i]):     qfb.correct.append(RE_QFB_COR.match(lines[i]).group(1)); i += 1; continue
-            if RE_QFB_INC.match(lines[i]):     qfb.incorrect.append(RE_QFB_INC.match(lines[i]).group(1)); i += 1; continue
-            if RE_QFB_INFO.match(lines[i]):    qfb.information.append(RE_QFB_INFO.match(lines[i]).group(1)); i += 1; continue
-        while i < len(lines) and RE_FILL.match(lines[i]):
-            fill_answers.append(RE_FILL.match(lines[i]).group(1))
+    def fill(self, i: int) -> Tuple[str, int]:
+        kinds, answers = self.kinds, []
+        while i < self.n and kinds[i] == T_FILL:
+            answers.append(intern_short(self.hits[i].group(1)))
             i += 1
-        if fill_answers or consumed_fb:
-            post_comments, i = _consume_trailing_comments(lines, i)
-            items.append(Item(kind='fill', title=q_title, points=pts, stem=stem, qfb=qfb, qnum=qnum,
-                              pre_comments=pending_html_comments, fill_answers=fill_answers, post_comments=post_comments))
-            pending_html_comments = []
-            continue
+        self.item.fill_answers = answers or EMPTY
+        return S_TRAILING, i
 
-        # Nothing matched for this question body — this is malformed
-        _perr(i, "Unrecognized question body: expected choices, numeric '=', fill answers '*', essay '____', or file '^^^^'")
+    def trailing(self, i: int) -> Tuple[str, int]:
+        # Capture any trailing comments immediately following this item
+        comments, i = _consume_trailing_comments(self.lines, i)
+        self.item.post_comments = comments or EMPTY
+        self.items.append(self.item)
+        self.item = None
+        return S_BETWEEN, i
 
-    return Quiz(title=title, description=description_accum, items=items,
-                feedback_is_solution=opt_fis, solutions_sample_groups=opt_ssg,
-                solutions_randomize_groups=opt_srg,
-                shuffle_answers=opt_shuffle, show_correct_answers=opt_show,
-                one_question_at_a_time=opt_one, cant_go_back=opt_cant)
 
+def parse_text2qti(lines: Sequence[str]) -> Quiz:
+    parser = Text2QTIParser(lines)
+    quiz = parser.parse()
+    profile_checkpoint("parse")  # while the parser's per-line tables are still alive
+    return quiz
+
+
+def parse_file(src: str, timer: Optional["PhaseTimer"] = None) -> Quiz:
+    """Parse a text2qti file. A file of MAP_MIN_SIZE bytes or more is parsed through
+    MappedLines, so no more than a line of it is decoded at a time (peak memory is the
+    Quiz plus about 16 bytes per line); a smaller one is read and split, which is faster."""
+    t = timer or NO_TIMER
+    if os.path.getsize(src) < MAP_MIN_SIZE:
+        with t.phase("read"):
+            with open(src, "r", encoding="utf-8") as f:
+                text = f.read()
+        with t.phase("parse_text2qti"):
+            quiz = parse_text2qti(text.splitlines())
+    else:
+        with t.phase("read"):
+            lines = MappedLines(src)
+        with lines, t.phase("parse_text2qti"):
+            quiz = parse_text2qti(lines)
+    for item in quiz.items:
+        t.count(item.kind)
+    return quiz
+
+
+# ---------- Timings ----------
+# shared:begin timings
+class PhaseTimer:
+    """Wall-clock and CPU seconds per conversion phase, item counts, and sizes (--timings).
+
+    Use `with timer.phase(name):` around each phase. Phases may nest; time spent in an
+    inner phase is charged to it alone, so the phase totals never double count."""
+
+    def __init__(self):
+        self.started = (time.perf_counter(), time.process_time())
+        self.phases: Dict[str, List[float]] = {}  # name -> [wall, cpu]
+        self.items: Dict[str, int] = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._stack: List[list] = []  # [name, wall mark, cpu mark] of open phases
+        self._next = ''
+
+    def phase(self, name: str) -> "PhaseTimer":
+        self._next = name
+        return self
+
+    def __enter__(self) -> None:
+        wall, cpu = time.perf_counter(), time.process_time()
+        if self._stack:
+            self._charge(self._stack[-1], wall, cpu)
+        self._stack.append([self._next, wall, cpu])
+
+    def __exit__(self, *exc) -> None:
+        wall, cpu = time.perf_counter(), time.process_time()
+        self._charge(self._stack.pop(), wall, cpu)
+        if self._stack:
+            self._stack[-1][1:] = (wall, cpu)
+
+    def _charge(self, frame: list, wall: float, cpu: float) -> None:
+        acc = self.phases.setdefault(frame[0], [0.0, 0.0])
+        acc[0] += wall - frame[1]
+        acc[1] += cpu - frame[2]
+        frame[1:] = (wall, cpu)
+
+    def count(self, kind: str) -> None:
+        self.items[kind] = self.items.get(kind, 0) + 1
+
+    def add_bytes(self, bytes_in: int = 0, bytes_out: int = 0) -> None:
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+
+    def record(self) -> Dict[str, object]:
+        """JSON-ready summary: totals and per-phase seconds since the timer was created."""
+        return {
+            "wall_s": round(time.perf_counter() - self.started[0], 6),
+            "cpu_s": round(time.process_time() - self.started[1], 6),
+            "phases": {name: {"wall_s": round(w, 6), "cpu_s": round(c, 6)} for name, (w, c) in self.phases.items()},
+            "items": dict(self.items),
+            "questions": sum(n for kind, n in self.items.items() if kind != 'text'),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+
+class NullTimer:
+    """PhaseTimer stand-in used when timings are off; every call is a no-op."""
+
+    def phase(self, name: str) -> "NullTimer":
+        return self
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+    def count(self, kind: str) -> None:
+        pass
+
+    def add_bytes(self, bytes_in: int = 0, bytes_out: int = 0) -> None:
+        pass
+
+
+NO_TIMER = NullTimer()
+
+
+def aggregate_timings(records: List[Dict[str, object]], top: int = 10) -> Dict[str, object]:
+    """Combine per-file batch records (those carrying "timings") into phase and item totals,
+    plus the `top` slowest files with their slowest phase. Files resolved from a cache
+    (timed for reading and hashing them) and failed files (timed up to the failure) are
+    included, and counted under "cached" and "failed"."""
+    files = [dict(input=r["input"], ok=r["ok"], cached=bool(r.get("cached")), **r["timings"])
+             for r in records if r.get("timings")]
+    phases: Dict[str, Dict[str, float]] = {}
+    items: Dict[str, int] = {}
+    for f in files:
+        for name, p in f["phases"].items():
+            acc = phases.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0})
+            acc["wall_s"] = round(acc["wall_s"] + p["wall_s"], 6)
+            acc["cpu_s"] = round(acc["cpu_s"] + p["cpu_s"], 6)
+        for kind, n in f["items"].items():
+            items[kind] = items.get(kind, 0) + n
+    slowest = sorted(files, key=lambda f: f["wall_s"], reverse=True)[:top]
+    return {
+        "files": len(files),
+        "cached": sum(1 for f in files if f["cached"]),
+        "failed": sum(1 for f in files if not f["ok"]),
+        "wall_s": round(sum(f["wall_s"] for f in files), 6),
+        "cpu_s": round(sum(f["cpu_s"] for f in files), 6),
+        "phases": phases,
+        "items": items,
+        "questions": sum(f["questions"] for f in files),
+        "bytes_in": sum(f["bytes_in"] for f in files),
+        "bytes_out": sum(f["bytes_out"] for f in files),
+        "slowest": [{"input": f["input"], "wall_s": f["wall_s"],
+                     "slowest_phase": max(f["phases"], key=lambda n: f["phases"][n]["wall_s"], default=None)}
+                    for f in slowest],
+        "per_file": files,
+    }
+
+
+def write_timings(record: Dict[str, object], dest: str) -> None:
+    """Write a timings record as one JSON line on stderr (dest "-") or as a JSON file."""
+    if dest == "-":
+        print(json.dumps(record), file=sys.stderr)
+        return
+    with open(dest, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+        f.write("\n")
+# shared:end timings
+
+
+def convert_text(text: str, timer: Optional[PhaseTimer] = None) -> str:
+    """Markdown for text2qti plaintext, timing the parse and emit phases."""
+    t = timer or NO_TIMER
+    with t.phase("parse_text2qti"):
+        quiz = parse_text2qti(text.splitlines())
+    for item in quiz.items:
+        t.count(item.kind)
+    return "".join(iter_markdown(quiz, None, timer))
 
- # Ensure exactly one blank line before the next emitted section
-def _ensure_blank(out: List[str]):
-    if out and out[-1] != "":
-        out.append("")
 
-# Collapse trailing blank lines to exactly one
-def _collapse_trailing_blanks(out: List[str]):
-    # Remove extra blank lines at the end, keeping at most one
-    while len(out) >= 2 and out[-1] == "" and out[-2] == "":
-        out.pop()
+# ---------- Markdown emission ----------
+class MarkdownLines:
+    """Line sink for the Markdown emitter. Lines are joined with newlines as they arrive,
+    but trailing blank lines are only counted, so keeping exactly one blank line between
+    sections needs no look at the output; take() returns the text produced so far."""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.started = False    # a non-blank line has been produced
+        self.blanks = 0         # trailing blank lines not yet produced
+
+    def append(self, line: str) -> None:
+        if line == "":
+            self.blanks += 1
+            return
+        self.parts.append("\n" * (self.blanks + self.started) + line)
+        self.started = True
+        self.blanks = 0
+
+    def extend(self, lines: Iterable[str]) -> None:
+        # append() inlined: stems and comment blocks can be long
+        parts, blanks, started = self.parts, self.blanks, self.started
+        for line in lines:
+            if line == "":
+                blanks += 1
+                continue
+            parts.append("\n" * (blanks + started) + line)
+            started = True
+            blanks = 0
+        self.blanks, self.started = blanks, started
+
+    def ensure_blank(self) -> None:
+        """Ensure exactly one blank line before the next emitted section."""
+        if self.started and not self.blanks:
+            self.blanks = 1
+
+    def collapse_blanks(self) -> None:
+        """Collapse trailing blank lines to exactly one."""
+        if self.blanks > 1:
+            self.blanks = 1
+
+    def take(self) -> str:
+        """Text produced since the last call. Pending trailing blanks are held back until more
+        text follows, so the document ends without trailing newlines."""
+        text = "".join(self.parts)
+        self.parts = []
+        return text
 
 # Emit question-level feedback in canonical order with labels only on the first line of each block
-def _emit_qfb(out: List[str], qfb: QLevelFB):
+def _emit_qfb(out: MarkdownLines, qfb: QLevelFB):
     """
     Emit question‑level feedback in the canonical order with labels only
     on the first line of each block. Continuation lines are plain blockquotes.
@@ -663,8 +1004,7 @@ def _emit_qfb(out: List[str], qfb: QLevelFB):
             else:
                 out.append(f"> {ln}")
 
-def emit_markdown(q: Quiz) -> str:
-    out = []
+def _emit_preamble(out: MarkdownLines, q: Quiz) -> None:
     # Title
     out.append(f"# {q.title}")
     out.append("")
@@ -674,175 +1014,569 @@ def emit_markdown(q: Quiz) -> str:
         out.append("")
     # Optional quiz-level options as readable blockquotes after description
     opts = []
-    if q.feedback_is_solution is not None:
-        opts.append(f"> feedback is solution: {'true' if q.feedback_is_solution else 'false'}")
-    if q.solutions_sample_groups is not None:
-        opts.append(f"> solutions sample groups: {'true' if q.solutions_sample_groups else 'false'}")
-    if q.solutions_randomize_groups is not None:
-        opts.append(f"> solutions randomize groups: {'true' if q.solutions_randomize_groups else 'false'}")
-    if q.shuffle_answers is not None:
-        opts.append(f"> shuffle answers: {'true' if q.shuffle_answers else 'false'}")
-    if q.show_correct_answers is not None:
-        opts.append(f"> show correct answers: {'true' if q.show_correct_answers else 'false'}")
-    if q.one_question_at_a_time is not None:
-        opts.append(f"> one question at a time: {'true' if q.one_question_at_a_time else 'false'}")
-    if q.cant_go_back is not None:
-        opts.append(f"> can't go back: {'true' if q.cant_go_back else 'false'}")
+    for label, fld in QUIZ_OPTIONS:
+        val = getattr(q, fld)
+        if val is not None:
+            opts.append(f"> {label}: {'true' if val else 'false'}")
     if opts:
         out.extend(opts)
         out.append("")
-    # Items
-    for it in q.items:
-        if it.kind == 'text':
-            out.append(f"## {it.title} {{type=text}}")
-            out.append("")  # blank line after heading
-            out.extend(it.stem)
-            if getattr(it, 'post_comments', None):
-                # Emit post-comments directly; if the source had a blank before the comment,
-                # the first element will be '' and will render as a blank line.
-                for ln in it.post_comments:
-                    out.append(ln)
-                # After comments, ensure exactly one blank line before the next header
-                _ensure_blank(out)
-                _collapse_trailing_blanks(out)
-            else:
-                # No comments; ensure exactly one blank after the text region
-                _ensure_blank(out)
-                _collapse_trailing_blanks(out)
-            continue
 
-        # Any comments that precede this item appear before the header
-        if getattr(it, "pre_comments", None):
-            if it.pre_comments:
-                # Pre-comments may include explicit '' entries to represent a preserved blank line.
-                # Extend directly without forcing an extra blank.
-                out.extend(it.pre_comments)
-        _collapse_trailing_blanks(out)
-        # Header
-        pts = it.points if it.points is not None else 0
-        pts_str = int(pts) if float(pts).is_integer() else pts
-        if it.title:
-            header_title = f"{it.title} "
-        else:
-            header_title = ""
-        if getattr(it, "qnum", None) is not None:
-            header_title = f"{it.qnum}. {header_title}"
-        out.append(f"## {header_title}(points: {pts_str}) " + "{type=" + it.kind + "}")
-        out.append("")
-        # Stem
+
+def _emit_item(out: MarkdownLines, it: Item) -> None:
+    if it.kind == 'text':
+        out.append(f"## {it.title} {{type=text}}")
+        out.append("")  # blank line after heading
         out.extend(it.stem)
-        out.append("")
+        if getattr(it, 'post_comments', None):
+            # Emit post-comments directly; if the source had a blank before the comment,
+            # the first element will be '' and will render as a blank line.
+            for ln in it.post_comments:
+                out.append(ln)
+            # After comments, ensure exactly one blank line before the next header
+            out.ensure_blank()
+            out.collapse_blanks()
+        else:
+            # No comments; ensure exactly one blank after the text region
+            out.ensure_blank()
+            out.collapse_blanks()
+        return
 
-        # Type-specific
-        if it.kind in {'mc', 'ma'}:
-            for ch in it.choices:
-                box = "[x]" if ch.correct else "[ ]"
-                out.append(f"- {box} {ch.text[0]}")
-                # emit continuation lines of choice text, preserving blanks
-                for ln in ch.text[1:]:
-                    out.append(f"  {ln}")
-                # per-choice feedback as indented blockquotes
-                for fb in ch.per_feedback:
-                    out.append(f"  > {fb}")
-            # Add a single blank line before feedback (avoid double blanks)
-            if it.qfb.general or it.qfb.incorrect or it.qfb.correct or it.qfb.information:
-                _ensure_blank(out)
-            # All question-level feedback AFTER answers/specs — order: Correct, Incorrect, General, Information
-            _emit_qfb(out, it.qfb)
-            # Emit comments that followed this question in the source
-            if getattr(it, 'post_comments', None):
-                # Do NOT force a blank here; if the source had a blank before the comment,
-                # the first element of post_comments will be '' and will render as a blank line.
-                for ln in it.post_comments:
-                    out.append(ln)
-                # After comments, ensure exactly one blank line before the next header
-                _ensure_blank(out)
-                _collapse_trailing_blanks(out)
-            else:
-                out.append("")
-                _collapse_trailing_blanks(out)
-            continue
-        elif it.kind == 'num':
-            _ensure_blank(out)           # one blank line before heading
-            out.append("### Answer")
-            out.append("")              # one blank after heading
-            out.append(f"= {it.numeric_spec}")
-            # Add a single blank line before feedback (avoid double blanks)
-            if it.qfb.general or it.qfb.incorrect or it.qfb.correct or it.qfb.information:
-                _ensure_blank(out)
-            # All question-level feedback AFTER answers/specs — order: Correct, Incorrect, General, Information
-            _emit_qfb(out, it.qfb)
-            if getattr(it, 'post_comments', None):
-                for ln in it.post_comments:
-                    out.append(ln)
-                _ensure_blank(out)
-                _collapse_trailing_blanks(out)
-            else:
-                out.append("")
-                _collapse_trailing_blanks(out)
-            continue
-        elif it.kind == 'fill':
-            _ensure_blank(out)           # one blank line before heading
-            out.append("### Answers")
-            out.append("")              # one blank after heading
-            for ans in it.fill_answers:
-                out.append(f"- {ans}")
-            # Add a single blank line before feedback (avoid double blanks)
-            if it.qfb.general or it.qfb.incorrect or it.qfb.correct or it.qfb.information:
-                _ensure_blank(out)
-            # All question-level feedback AFTER answers/specs — order: Correct, Incorrect, General, Information
-            _emit_qfb(out, it.qfb)
-            if getattr(it, 'post_comments', None):
-                for ln in it.post_comments:
-                    out.append(ln)
-                _ensure_blank(out)
-                _collapse_trailing_blanks(out)
-            else:
-                out.append("")
-                _collapse_trailing_blanks(out)
-            continue
-        elif it.kind == 'essay':
-            # Feedback after stem
-            if it.qfb.correct or it.qfb.incorrect or it.qfb.general or it.qfb.information:
-                _ensure_blank(out)
-                _emit_qfb(out, it.qfb)
-        elif it.kind == 'file':
-            if it.qfb.correct or it.qfb.incorrect or it.qfb.general or it.qfb.information:
-                _ensure_blank(out)
-                _emit_qfb(out, it.qfb)
-        # For essay/file and any other fallthrough, emit post_comments if present
+    # Any comments that precede this item appear before the header
+    if getattr(it, "pre_comments", None):
+        if it.pre_comments:
+            # Pre-comments may include explicit '' entries to represent a preserved blank line.
+            # Extend directly without forcing an extra blank.
+            out.extend(it.pre_comments)
+    out.collapse_blanks()
+    # Header
+    pts = it.points if it.points is not None else 0
+    pts_str = int(pts) if float(pts).is_integer() else pts
+    if it.title:
+        header_title = f"{it.title} "
+    else:
+        header_title = ""
+    if getattr(it, "qnum", None) is not None:
+        header_title = f"{it.qnum}. {header_title}"
+    out.append(f"## {header_title}(points: {pts_str}) " + "{type=" + it.kind + "}")
+    out.append("")
+    # Stem
+    out.extend(it.stem)
+    out.append("")
+
+    # Type-specific
+    if it.kind in {'mc', 'ma'}:
+        for ch in it.choices:
+            box = "[x]" if ch.correct else "[ ]"
+            out.append(f"- {box} {ch.text[0]}")
+            # emit continuation lines of choice text, preserving blanks
+            for ln in ch.text[1:]:
+                out.append(f"  {ln}")
+            # per-choice feedback as indented blockquotes
+            for fb in ch.per_feedback:
+                out.append(f"  > {fb}")
+        # Add a single blank line before feedback (avoid double blanks)
+        if it.qfb.general or it.qfb.incorrect or it.qfb.correct or it.qfb.information:
+            out.ensure_blank()
+        # All question-level feedback AFTER answers/specs — order: Correct, Incorrect, General, Information
+        _emit_qfb(out, it.qfb)
+        # Emit comments that followed this question in the source
         if getattr(it, 'post_comments', None):
+            # Do NOT force a blank here; if the source had a blank before the comment,
+            # the first element of post_comments will be '' and will render as a blank line.
             for ln in it.post_comments:
                 out.append(ln)
-            _ensure_blank(out)
-            _collapse_trailing_blanks(out)
+            # After comments, ensure exactly one blank line before the next header
+            out.ensure_blank()
+            out.collapse_blanks()
         else:
-            # For essay/file and any other fallthrough, ensure exactly one blank between items
-            _ensure_blank(out)
-            _collapse_trailing_blanks(out)
+            out.append("")
+            out.collapse_blanks()
+        return
+    elif it.kind == 'num':
+        out.ensure_blank()           # one blank line before heading
+        out.append("### Answer")
+        out.append("")              # one blank after heading
+        out.append(f"= {it.numeric_spec}")
+        # Add a single blank line before feedback (avoid double blanks)
+        if it.qfb.general or it.qfb.incorrect or it.qfb.correct or it.qfb.information:
+            out.ensure_blank()
+        # All question-level feedback AFTER answers/specs — order: Correct, Incorrect, General, Information
+        _emit_qfb(out, it.qfb)
+        if getattr(it, 'post_comments', None):
+            for ln in it.post_comments:
+                out.append(ln)
+            out.ensure_blank()
+            out.collapse_blanks()
+        else:
+            out.append("")
+            out.collapse_blanks()
+        return
+    elif it.kind == 'fill':
+        out.ensure_blank()           # one blank line before heading
+        out.append("### Answers")
+        out.append("")              # one blank after heading
+        for ans in it.fill_answers:
+            out.append(f"- {ans}")
+        # Add a single blank line before feedback (avoid double blanks)
+        if it.qfb.general or it.qfb.incorrect or it.qfb.correct or it.qfb.information:
+            out.ensure_blank()
+        # All question-level feedback AFTER answers/specs — order: Correct, Incorrect, General, Information
+        _emit_qfb(out, it.qfb)
+        if getattr(it, 'post_comments', None):
+            for ln in it.post_comments:
+                out.append(ln)
+            out.ensure_blank()
+            out.collapse_blanks()
+        else:
+            out.append("")
+            out.collapse_blanks()
+        return
+    elif it.kind == 'essay':
+        # Feedback after stem
+        if it.qfb.correct or it.qfb.incorrect or it.qfb.general or it.qfb.information:
+            out.ensure_blank()
+            _emit_qfb(out, it.qfb)
+    elif it.kind == 'file':
+        if it.qfb.correct or it.qfb.incorrect or it.qfb.general or it.qfb.information:
+            out.ensure_blank()
+            _emit_qfb(out, it.qfb)
+    # For essay/file and any other fallthrough, emit post_comments if present
+    if getattr(it, 'post_comments', None):
+        for ln in it.post_comments:
+            out.append(ln)
+        out.ensure_blank()
+        out.collapse_blanks()
+    else:
+        # For essay/file and any other fallthrough, ensure exactly one blank between items
+        out.ensure_blank()
+        out.collapse_blanks()
+
+
+def iter_markdown(quiz: Quiz, items: Optional[Iterable[Item]] = None,
+                  timer: Optional[PhaseTimer] = None) -> Iterator[str]:
+    """Yield the Markdown document in chunks (preamble, then one per item) as each is complete.
+    `items` defaults to quiz.items; pass any iterable (e.g. a generator) to stream them.
+    The chunks concatenate to exactly emit_markdown(quiz)."""
+    t = timer or NO_TIMER
+    out = MarkdownLines()
+    with t.phase("emit_markdown"):
+        _emit_preamble(out, quiz)
+    yield out.take()
+    for it in quiz.items if items is None else items:
+        with t.phase("emit_markdown"):
+            _emit_item(out, it)
+            chunk = out.take()
+        profile_checkpoint("emit")
+        if chunk:
+            yield chunk
+
+
+def write_markdown(quiz: Quiz, fp: TextIO, items: Optional[Iterable[Item]] = None,
+                   timer: Optional[PhaseTimer] = None) -> None:
+    """Write the Markdown document to a file object one item at a time."""
+    t = timer or NO_TIMER
+    for chunk in iter_markdown(quiz, items, timer):
+        with t.phase("write"):
+            fp.write(chunk)
+
+
+def emit_markdown(q: Quiz) -> str:
+    return "".join(iter_markdown(q))
+
+
+# ---------- Profiling ----------
+
+# Allocation groups in the MD2QTI_PROFILE=mem summary (see profile_checkpoint): what was
+# allocated under these functions (streamed conversions emit through iter_markdown, not
+# emit_markdown).
+PROFILE_FOCUS = {
+    "parse": ("parse_file", "parse_text2qti"),
+    "emit": ("emit_markdown", "iter_markdown"),
+}
+
+# shared:begin profiling
+PROFILE_ENV = "MD2QTI_PROFILE"          # "cpu" (cProfile .prof) or "mem" (tracemalloc snapshot)
+PROFILE_DIR_ENV = "MD2QTI_PROFILE_DIR"  # where profiles are written (default: current directory)
+PROFILE_FRAMES = 25                     # traceback depth kept by tracemalloc
+PROFILE_TOP = 10                        # functions (cpu) or sites per group (mem) listed on stderr
+PROFILE_GROWTH = 1.1                    # profile_checkpoint() re-snapshots on this much growth
+_profile_lock = threading.Lock()        # cProfile and tracemalloc are process-wide: one profile at a time
+_profile_snapshots: Optional[Dict[str, list]] = None  # group -> [traced bytes, Snapshot] during "mem"
+
+
+def profile_checkpoint(group: str) -> None:
+    """While a "mem" profile runs, keep a snapshot for PROFILE_FOCUS `group` if traced memory
+    grew by PROFILE_GROWTH since that group's last one. The parser calls this after each
+    question ("parse") and the emitters after each item ("emit"), while that item and its
+    output are alive: a streamed conversion has released nearly everything by its end."""
+    snaps = _profile_snapshots
+    if snaps is not None:
+        current = tracemalloc.get_traced_memory()[0]
+        last = snaps.get(group)
+        if last is None or current > last[0] * PROFILE_GROWTH:
+            snaps[group] = [current, tracemalloc.take_snapshot()]
+
+
+def profile_sites(snap: "tracemalloc.Snapshot") -> Dict[str, Dict[Tuple[str, int], List[int]]]:
+    """PROFILE_FOCUS group -> {(focus function, line of this file): [bytes, blocks]} for the
+    allocations in `snap`. Each allocation goes to the innermost focus function on its
+    traceback, at the newest line of this file; allocations under none of them go to the
+    group "elsewhere" (function ""). The checkpoints' own snapshots are left out."""
+    code = profile_checkpoint.__code__
+    here = code.co_filename  # as tracemalloc records it (the path may not be normalized)
+    own = range(code.co_firstlineno, max(ln for _, _, ln in code.co_lines() if ln) + 1)
+    ranges = []
+    for group, names in PROFILE_FOCUS.items():
+        for name in names:
+            code = globals()[name].__code__
+            ranges.append((group, name, code.co_firstlineno, max(ln for _, _, ln in code.co_lines() if ln)))
+    sites: Dict[str, Dict[Tuple[str, int], List[int]]] = {}
+    for stat in snap.statistics("traceback"):
+        lines = [f.lineno for f in stat.traceback if f.filename == here]  # oldest first
+        if not lines or lines[-1] in own:
+            continue
+        group, name = next(((g, fn) for ln in reversed(lines) for g, fn, lo, hi in ranges if lo <= ln <= hi),
+                           ("elsewhere", ""))
+        site = sites.setdefault(group, {}).setdefault((name, lines[-1]), [0, 0])
+        site[0] += stat.size
+        site[1] += stat.count
+    return sites
+
+
+def print_mem_summary(group: str, size: int, snap: "tracemalloc.Snapshot") -> None:
+    """The largest allocation sites of `group` in `snap` (taken at `size` traced bytes)."""
+    here = profile_checkpoint.__code__.co_filename
+    by_site = profile_sites(snap).get(group, {})
+    names = ", ".join(PROFILE_FOCUS.get(group, ()))
+    print(f"  {group}{f' ({names})' if names else ''}: {sum(s[0] for s in by_site.values()) / 1e6:.2f} MB "
+          f"live, snapshot at {size / 1e6:.1f} MB", file=sys.stderr)
+    if not by_site:
+        print("    (nothing live in the snapshot)", file=sys.stderr)
+    for (name, ln), (nbytes, count) in sorted(by_site.items(), key=lambda kv: kv[1][0], reverse=True)[:PROFILE_TOP]:
+        under = f" (under {name})" if name else ""
+        print(f"    {nbytes / 1e6:8.3f} MB {count:>9,} blocks  {os.path.basename(here)}:{ln}{under}  "
+              f"{linecache.getline(here, ln).strip()}", file=sys.stderr)
+
+
+@contextlib.contextmanager
+def profiling(label: str) -> Iterator[None]:
+    """Profile the enclosed conversion when MD2QTI_PROFILE is set, without touching the code
+    path otherwise. "cpu" writes a cProfile .prof file and lists this script's busiest
+    functions on stderr. "mem" writes the largest tracemalloc snapshot (.tracemalloc) of
+    this script's allocations, from a profile_checkpoint() or the end, and lists the peak
+    and each PROFILE_FOCUS group's largest sites, as of that group's largest checkpoint.
+    A call made while another profile is running (nested, or in another thread) is not
+    profiled."""
+    global _profile_snapshots
+    mode = os.environ.get(PROFILE_ENV, "").strip().lower()
+    if not mode:
+        yield
+        return
+    if mode not in ("cpu", "mem"):
+        print(f"profile: ignoring {PROFILE_ENV}={mode!r} (expected 'cpu' or 'mem')", file=sys.stderr)
+        yield
+        return
+    if not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    try:
+        here = profile_checkpoint.__code__.co_filename  # as cProfile and tracemalloc record it
+        script = os.path.splitext(os.path.basename(here))[0]
+        stem = os.path.splitext(os.path.basename(label))[0] or "quiz"
+        base = os.path.join(os.environ.get(PROFILE_DIR_ENV) or os.curdir,
+                            f"{script}-{stem}-{os.getpid()}-{time.time_ns() // 1000000}")
+        if mode == "cpu":
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except ValueError:  # another profiler is active
+                yield
+                return
+            try:
+                yield
+            finally:
+                prof.disable()
+                prof.dump_stats(base + ".prof")
+                print(f"profile: wrote {base}.prof (cpu)", file=sys.stderr)
+                pstats.Stats(prof, stream=sys.stderr).sort_stats("tottime").print_stats(
+                    re.escape(os.path.basename(here)), PROFILE_TOP)
+        elif tracemalloc.is_tracing():  # someone else's trace; stopping it would break theirs
+            yield
+        else:
+            tracemalloc.start(PROFILE_FRAMES)
+            _profile_snapshots = {}
+            try:
+                yield
+            finally:
+                snaps, _profile_snapshots = _profile_snapshots, None
+                current, peak = tracemalloc.get_traced_memory()
+                end = [current, tracemalloc.take_snapshot()]
+                tracemalloc.stop()
+                ours = [tracemalloc.Filter(True, here, all_frames=True)]
+                snaps = {group: [size, snap.filter_traces(ours)] for group, (size, snap) in snaps.items()}
+                end[1] = end[1].filter_traces(ours)
+                size, snap = max([end, *snaps.values()], key=lambda s: s[0])
+                snap.dump(base + ".tracemalloc")
+                print(f"profile: wrote {base}.tracemalloc (mem, snapshot at {size / 1e6:.1f} MB, "
+                      f"peak {peak / 1e6:.1f} MB)", file=sys.stderr)
+                for group in PROFILE_FOCUS:
+                    print_mem_summary(group, *snaps.get(group, end))
+                print_mem_summary("elsewhere", size, snap)
+    finally:
+        _profile_lock.release()
+# shared:end profiling
+
 
-    # Strip all trailing newlines
-    text = "\n".join(out)
-    text = text.rstrip("\n")
-    return text
+# ---------- Watch mode ----------
+# shared:begin file-signature
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+# shared:end file-signature
+
+
+def convert_file(src: str, dst: str, timer: Optional[PhaseTimer] = None) -> None:
+    """Convert one text2qti file into a Markdown quiz file, writing each item's Markdown
+    as soon as it is emitted."""
+    t = timer or NO_TIMER
+    quiz = parse_file(src, timer)
+    parent = os.path.dirname(dst)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with open(dst, "w", encoding="utf-8") as f:
+        write_markdown(quiz, f, None, timer)
+    t.add_bytes(os.path.getsize(src), os.path.getsize(dst))
+
+
+def watch(find_jobs: Callable[[], List[Tuple[str, str]]], interval: float = 0.1, debounce: float = 0.2) -> None:
+    """Keep converting (src, dst) pairs as their sources change, until interrupted.
+
+    Sources are polled every `interval` seconds; a changed file is reconverted once its
+    size and mtime have been stable for `debounce` seconds, so a burst of saves costs one
+    conversion. Parse errors are reported and watching continues."""
+    done: Dict[str, Optional[Tuple[int, int]]] = {}
+    pending: Dict[str, Tuple[Tuple[int, int], float]] = {}
+    jobs = find_jobs()
+
+    def convert(src: str, dst: str) -> None:
+        t0 = time.perf_counter()
+        try:
+            convert_file(src, dst)
+        except Exception as e:
+            print(f"FAIL   {src}: {type(e).__name__}: {e}", file=sys.stderr)
+            return
+        print(f"ok     {src} -> {dst} ({(time.perf_counter() - t0) * 1000:.0f} ms)", file=sys.stderr)
+
+    for src, dst in jobs:
+        done[src] = _file_signature(src)
+        convert(src, dst)
+    print(f"Watching {len(jobs)} file(s); press Ctrl-C to stop.", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(interval)
+            now = time.monotonic()
+            for src, dst in jobs:
+                sig = _file_signature(src)
+                if sig is None or sig == done.get(src):
+                    pending.pop(src, None)
+                    continue
+                seen = pending.get(src)
+                if seen is None or seen[0] != sig:
+                    pending[src] = (sig, now)
+                    continue
+                if now - seen[1] >= debounce:
+                    del pending[src]
+                    done[src] = sig
+                    convert(src, dst)
+    except KeyboardInterrupt:
+        pass
+
+
+# ---------- Batch conversion ----------
+INPUT_EXT = ".txt"
+OUTPUT_EXT = ".md"
+
+# shared:begin batch-paths
+GLOB_MAGIC_RE = re.compile(r'[*?[]')
+
+
+def is_glob(path: str) -> bool:
+    """True if `path` is to be expanded as a glob pattern: an existing file is always taken
+    literally, so a quiz named "Quiz [v2]" or "q?" is not mistaken for a pattern."""
+    return GLOB_MAGIC_RE.search(path) is not None and not os.path.isfile(path)
+
+
+def find_inputs(paths: List[str], ext: str = INPUT_EXT) -> List[Tuple[str, str]]:
+    """Expand files, directories, and glob patterns into (path, relative_path) pairs.
+    Directories are walked recursively for files ending in `ext`; relative paths are
+    taken from the directory (or from the non-glob prefix of a pattern)."""
+    found: List[Tuple[str, str]] = []
+    seen = set()
+
+    def add(path: str, root: str) -> None:
+        key = os.path.abspath(path)
+        if key in seen:
+            return
+        seen.add(key)
+        found.append((path, os.path.relpath(path, root) if root else os.path.basename(path)))
+
+    for p in paths:
+        if os.path.isdir(p):
+            for dirpath, dirnames, filenames in os.walk(p):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    if name.lower().endswith(ext):
+                        add(os.path.join(dirpath, name), p)
+        elif is_glob(p):
+            prefix = []
+            for part in p.replace(os.sep, "/").split("/"):
+                if GLOB_MAGIC_RE.search(part):
+                    break
+                prefix.append(part)
+            root = "/".join(prefix) or os.curdir
+            for match in sorted(glob.glob(p, recursive=True)):
+                if os.path.isfile(match):
+                    add(match, root)
+        else:
+            add(p, "")
+    return found
+
+
+def output_path(src: str, rel: str, outdir: Optional[str], ext: str = OUTPUT_EXT) -> str:
+    """Output file for `src`: next to it, or at `rel` under `outdir`, with extension `ext`."""
+    base = os.path.join(outdir, rel) if outdir else src
+    return os.path.splitext(base)[0] + ext
+
+
+def duplicate_outputs(jobs: List[Tuple[str, str]]) -> Dict[str, List[str]]:
+    """Output paths that more than one (src, dst) job would write, each with its inputs.
+    Inputs under different roots (or two files with the same name) can map to the same
+    output under --outdir; converting them all would silently keep only the last."""
+    by_dst: Dict[str, List[str]] = {}
+    for src, dst in jobs:
+        by_dst.setdefault(os.path.normcase(os.path.abspath(dst)), []).append(src)
+    return {dst: srcs for dst, srcs in by_dst.items() if len(srcs) > 1}
+# shared:end batch-paths
+
+
+def _convert_job(job: Tuple[str, str, bool]) -> Dict[str, object]:
+    """Process-pool worker: convert one file and report the outcome instead of raising.
+    A failure carries an error_record() under "error"; a PhaseTimer record is returned
+    under "timings" when `timings` is set (for a failure, of the phases it reached)."""
+    src, dst, timings = job
+    timer = PhaseTimer() if timings else None
+    try:
+        with profiling(src):
+            convert_file(src, dst, timer)
+        rec: Dict[str, object] = {"input": src, "output": dst, "ok": True, "error": None}
+    except Exception as e:  # report every failure; one bad file must not stop the batch
+        rec = {"input": src, "output": dst, "ok": False, "error": error_record(src, e)}
+    if timer is not None:
+        rec["timings"] = timer.record()
+    return rec
+
+
+def batch_convert(jobs: List[Tuple[str, str]], workers: Optional[int] = None,
+                  timings: bool = False) -> List[Dict[str, object]]:
+    """Convert (src, dst) pairs in a process pool; return one result record per job, in order.
+    `workers` defaults to the number of CPUs; 1 converts in this process."""
+    work = [(src, dst, timings) for src, dst in jobs]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(work)))
+    if workers == 1:
+        return [_convert_job(job) for job in work]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_convert_job, work, chunksize=max(1, len(work) // (workers * 4))))
+
+
+def report_batch(results: List[Dict[str, object]], summary_path: Optional[str] = None) -> int:
+    """Print a per-file line and a total to stderr, optionally write a JSON manifest of every
+    file's outcome plus the list of errors (file, line, message). Returns the number of failures."""
+    errors = [r["error"] for r in results if not r["ok"]]
+    for r in results:
+        if r["ok"]:
+            print(f"ok     {r['input']} -> {r['output']}", file=sys.stderr)
+        else:
+            err = r["error"]
+            where = f"{err['file']}:{err['line']}" if err["line"] is not None else err["file"]
+            print(f"FAIL   {where}: {err['message']}", file=sys.stderr)
+    print(f"Converted {len(results) - len(errors)} of {len(results)} file(s); {len(errors)} failed.", file=sys.stderr)
+    if summary_path:
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump({"converted": len(results) - len(errors), "failed": len(errors),
+                       "errors": errors, "files": results}, f, indent=2)
+            f.write("\n")
+    return len(errors)
 
 
 def main():
     ap = argparse.ArgumentParser(description="Convert text2qti plaintext to Markdown quiz format.")
-    ap.add_argument("input", help="Input text2qti plaintext file")
+    ap.add_argument("input", nargs="+",
+                    help="Input text2qti plaintext file; several files, directories, or glob patterns convert in batch mode")
     ap.add_argument("-o", "--output", help="Output Markdown file (default: stdout)")
+    ap.add_argument("--outdir", help="Batch mode: write outputs here, mirroring the input tree (default: next to each input)")
+    ap.add_argument("-j", "--jobs", type=int, default=None, help="Batch mode: worker processes (default: CPU count)")
+    ap.add_argument("--summary", help="Batch mode: write a JSON manifest of per-file results and parse errors here")
+    ap.add_argument("--watch", action="store_true", help="Stay running and reconvert the input whenever it changes (requires -o)")
+    ap.add_argument("--debounce", type=float, default=0.2,
+                    help="Watch mode: seconds the input must stay unchanged before reconverting (default: %(default)s)")
+    ap.add_argument("--timings", nargs="?", const="-", metavar="PATH",
+                    help="Record wall/CPU time per phase, item counts, and sizes as JSON on stderr, or in PATH; "
+                         "batch mode aggregates them and lists the slowest files, failed files timed "
+                         "up to the failure (counted as 'failed')")
     args = ap.parse_args()
 
-    with open(args.input, "r", encoding="utf-8") as f:
-        lines = f.read().splitlines()
+    batch = (len(args.input) > 1 or args.outdir is not None
+             or any(os.path.isdir(p) or is_glob(p) for p in args.input))
+    if batch:
+        if args.output:
+            ap.error("-o/--output takes a single input file; use --outdir in batch mode")
+        if args.watch:
+            ap.error("--watch takes a single input file")
+        inputs = find_inputs(args.input)
+        if not inputs:
+            ap.error("no text2qti (.txt) files found")
+        jobs = [(src, output_path(src, rel, args.outdir)) for src, rel in inputs]
+        dups = duplicate_outputs(jobs)
+        if dups:
+            ap.error("several inputs would write the same output:\n" + "\n".join(
+                f"  {dst} <- {', '.join(srcs)}" for dst, srcs in dups.items()))
+        results = batch_convert(jobs, args.jobs, timings=bool(args.timings))
+        failed = report_batch(results, args.summary)
+        if args.timings:
+            write_timings(aggregate_timings(results), args.timings)
+        sys.exit(1 if failed else 0)
+    args.input = args.input[0]
 
-    quiz = parse_text2qti(lines)
-    md = emit_markdown(quiz)
-    if args.output:
-        with open(args.output, "w", encoding="utf-8") as f:
-            f.write(md)
-    else:
-        print(md)
+    if args.watch:
+        if not args.output:
+            ap.error("--watch needs -o/--output")
+        if args.timings:
+            ap.error("--timings is not available with --watch")
+        watch(lambda: [(args.input, args.output)], debounce=args.debounce)
+        return
+
+    timer = PhaseTimer() if args.timings else None
+    t = timer or NO_TIMER
+    with profiling(args.input):
+        if args.output:
+            convert_file(args.input, args.output, timer)
+        else:
+            quiz = parse_file(args.input, timer)
+            size = 0
+            for chunk in iter_markdown(quiz, None, timer):
+                with t.phase("write"):
+                    sys.stdout.write(chunk)
+                size += len(chunk.encode("utf-8"))
+            print()
+            t.add_bytes(os.path.getsize(args.input), size + 1)
+    if timer is not None:
+        write_timings(dict(input=args.input, output=args.output or "-", **timer.record()), args.timings)
 
 
 if __name__ == "__main__":
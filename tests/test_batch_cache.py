@@ -0,0 +1,52 @@
+"""The batch rebuild cache keys ZIP outputs on the images a quiz embeds."""
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+import md2t2qti  # noqa: E402
+
+QUIZ = """# Quiz
+
+## 1. Picture (points: 1) {type=mc}
+What colour is ![dot](dot.png)?
+
+- [x] Red
+- [ ] Blue
+"""
+
+
+def batch_zip(tmp):
+    """stderr of converting `tmp`/in to ZIPs in `tmp`/out."""
+    proc = subprocess.run([sys.executable, os.path.join(ROOT, "md2t2qti.py"), os.path.join(tmp, "in"),
+                           "--outdir", os.path.join(tmp, "out"), "--zip"],
+                          capture_output=True, text=True, check=True)
+    return proc.stderr
+
+
+class BatchCache(unittest.TestCase):
+    def test_edited_image_rebuilds_zip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.mkdir(os.path.join(tmp, "in"))
+            with open(os.path.join(tmp, "in", "quiz.md"), "w", encoding="utf-8") as f:
+                f.write(QUIZ)
+            with open(os.path.join(tmp, "in", "dot.png"), "wb") as f:
+                f.write(b"red")
+            self.assertIn("ok     ", batch_zip(tmp))
+            self.assertIn("cached ", batch_zip(tmp))
+            with open(os.path.join(tmp, "in", "dot.png"), "wb") as f:
+                f.write(b"blue")
+            self.assertIn("ok     ", batch_zip(tmp))
+
+    def test_key_covers_text2qti(self):
+        content = QUIZ.encode()
+        self.assertNotEqual(md2t2qti.ConversionCache.key(content),
+                            md2t2qti.ConversionCache.key(content, chain_text2qti=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""Batch --timings records cover files resolved from the cache and files that failed."""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+GOOD = """# Quiz
+
+## 1. Sum (points: 1) {type=mc}
+What is 1 + 1?
+
+- [x] 2
+- [ ] 3
+"""
+
+BAD = """# Quiz
+
+## 1. Broken {type=nope}
+What?
+"""
+
+
+def batch_timings(tmp, name):
+    """The aggregate --timings record of converting `tmp`/in in batch mode."""
+    dest = os.path.join(tmp, name)
+    subprocess.run([sys.executable, os.path.join(ROOT, "md2t2qti.py"), os.path.join(tmp, "in"),
+                    "--outdir", os.path.join(tmp, "out"), "--timings", dest],
+                   capture_output=True, text=True)
+    with open(dest, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class BatchTimings(unittest.TestCase):
+    def test_cached_and_failed_files_are_reported(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.mkdir(os.path.join(tmp, "in"))
+            for name, text in (("a.md", GOOD), ("b.md", GOOD), ("bad.md", BAD)):
+                with open(os.path.join(tmp, "in", name), "w", encoding="utf-8") as f:
+                    f.write(text)
+            first = batch_timings(tmp, "first.json")
+            self.assertEqual((first["files"], first["cached"], first["failed"]), (3, 0, 1))
+            second = batch_timings(tmp, "second.json")
+            self.assertEqual((second["files"], second["cached"], second["failed"]), (3, 2, 1))
+            self.assertIn("hash", second["phases"])
+            failed = [f for f in second["per_file"] if not f["ok"]]
+            self.assertEqual(len(failed), 1)
+            self.assertIn("parse_question", failed[0]["phases"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""MD2QTI_PROFILE=mem summaries name allocation sites in the parse and emit functions."""
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+MD_QUESTION = """## {n}. Question {n} (points: 1) {{type=mc}}
+What is {n} + 1?
+
+- [x] {m}
+  > Right.
+- [ ] {n}
+  > Off by one.
+
+> Correct: Well done.
+"""
+
+TXT_QUESTION = """{n}.  What is {n} + 1?
+... Well done.
+*a)  {m}
+... Right.
+b)  {n}
+... Off by one.
+"""
+
+
+def profile_summary(script, name, text, output):
+    """stderr of `script name -o output` run under MD2QTI_PROFILE=mem."""
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, name)
+        with open(src, "w", encoding="utf-8") as f:
+            f.write(text)
+        env = dict(os.environ, MD2QTI_PROFILE="mem", MD2QTI_PROFILE_DIR=tmp)
+        proc = subprocess.run([sys.executable, os.path.join(ROOT, script), src, "-o", os.path.join(tmp, output)],
+                              env=env, capture_output=True, text=True, check=True)
+        return proc.stderr
+
+
+class MemProfileSummary(unittest.TestCase):
+    def test_md2t2qti_names_parse_and_emit(self):
+        text = "# Quiz\n\n" + "\n".join(MD_QUESTION.format(n=n, m=n + 1) for n in range(1, 501))
+        summary = profile_summary("md2t2qti.py", "quiz.md", text, "quiz.txt")
+        self.assertIn("parse (parse_question", summary)
+        self.assertIn("emit (emit_text2qti", summary)
+        self.assertIn("(under parse_question)", summary)
+        self.assertIn("(under iter_text2qti)", summary)
+
+    def test_t2qti2md_names_parse_and_emit(self):
+        text = "Quiz title: Quiz\n\n" + "\n".join(TXT_QUESTION.format(n=n, m=n + 1) for n in range(1, 501))
+        summary = profile_summary("t2qti2md.py", "quiz.txt", text, "quiz.md")
+        self.assertIn("parse (parse_file, parse_text2qti)", summary)
+        self.assertIn("emit (emit_markdown", summary)
+        self.assertIn("(under parse_text2qti)", summary)
+        self.assertIn("(under iter_markdown)", summary)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+check_shared.py — Check that the code duplicated between md2t2qti.py and t2qti2md.py matches.
+
+Each converter ships as a single standalone script (the macOS droplets bundle one each), so
+a few helpers (timings, profiling, batch input discovery, the model base class, ...) are
+carried by both. Every such block is delimited in both files by
+
+    # shared:begin NAME
+    ...
+    # shared:end NAME
+
+and the two copies of each NAME must be identical apart from blank lines (the scripts
+space their definitions differently).
+
+Usage:
+    python tools/check_shared.py
+
+Prints a unified diff for each mismatch and exits non-zero if any block differs, is
+missing from one file, or is left unterminated.
+"""
+import difflib
+import os
+import re
+import sys
+from typing import Dict, List
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+FILES = ("md2t2qti.py", "t2qti2md.py")
+MARKER_RE = re.compile(r'^# shared:(begin|end) (\S+)\s*$')
+
+
+def shared_blocks(path: str) -> Dict[str, List[str]]:
+    """NAME -> nonblank lines of each shared block in `path`."""
+    blocks: Dict[str, List[str]] = {}
+    name = None
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            m = MARKER_RE.match(line)
+            if m:
+                kind, tag = m.groups()
+                if kind == "begin" and name is None and tag not in blocks:
+                    name = tag
+                    blocks[name] = []
+                elif kind == "end" and tag == name:
+                    name = None
+                else:
+                    sys.exit(f"{path}:{lineno}: unexpected '# shared:{kind} {tag}'")
+            elif name is not None and line.strip():
+                blocks[name].append(line.rstrip())
+    if name is not None:
+        sys.exit(f"{path}: '# shared:begin {name}' is never ended")
+    return blocks
+
+
+def main():
+    (a_name, a), (b_name, b) = ((fn, shared_blocks(os.path.join(ROOT, fn))) for fn in FILES)
+    failed = False
+    for name in sorted(a.keys() | b.keys()):
+        if name not in a or name not in b:
+            print(f"shared block '{name}' is only in {a_name if name in a else b_name}")
+            failed = True
+        elif a[name] != b[name]:
+            print(f"shared block '{name}' differs:")
+            sys.stdout.writelines(line + "\n" for line in difflib.unified_diff(
+                a[name], b[name], a_name, b_name, lineterm=""))
+            failed = True
+    if failed:
+        sys.exit(1)
+    print(f"{len(a)} shared blocks match: {', '.join(sorted(a))}")
+
+
+if __name__ == "__main__":
+    main()